@@ -0,0 +1,101 @@
+"""
+Generates a synthetic data tree in the layout the README describes, for benchmarking.
+
+Sources alternate between OncoDB style gene expression (tab separated data.txt) and UALCAN style protein
+expression (Highcharts data.json), e.g. 3 sources give ONCODB, UALCAN and ONCODB3. Every gene of every
+cancer type gets a normal and a tumour series of 'samples' values each. The same arguments and seed
+always give byte for byte the same tree.
+"""
+import os
+import sys
+import json
+import argparse
+from typing import NamedTuple
+import numpy as np
+
+
+class TreeSpec(NamedTuple):
+    genes: int = 5
+    cancer_types: int = 2
+    sources: int = 2
+    samples: int = 100
+    seed: int = 0
+
+
+def source_names(count: int) -> list[tuple[str, bool]]:
+    """
+    Returns (name, is_gene) for 'count' sources, alternating OncoDB TXT and UALCAN JSON.
+    """
+    names = []
+    for index in range(count):
+        is_gene = index % 2 == 0
+        name = "ONCODB" if is_gene else "UALCAN"
+        names.append((name if index < 2 else f"{name}{index + 1}", is_gene))
+    return names
+
+
+def write_oncodb(path: str, gene: str, cancer_code: str, samples: int, rng: np.random.Generator) -> None:
+    normal = rng.lognormal(3.0, 1.0, samples)
+    tumour = rng.lognormal(3.5, 1.2, samples)
+    with open(path, "w", newline="") as txt_file:
+        txt_file.write(f"Sample\tType\t{gene}_expression_value\n")
+        for name, values in (("normal", normal), (cancer_code, tumour)):
+            txt_file.writelines(f"{name}\t{name}-{index}\t{value:.3f}\n" for index, value in enumerate(values))
+
+
+def write_ualcan(path: str, samples: int, rng: np.random.Generator) -> None:
+    series = [{"name": "box", "data": []}]
+    for name, mean in (("Normal", 0.0), ("Primary tumor", 0.4)):
+        values = rng.normal(mean, 1.0, samples)
+        series.append({"name": name, "data": [{"x": 0, "y": round(float(value), 6)} for value in values]})
+    with open(path, "w") as json_file:
+        json.dump({"chart": {"type": "boxplot"}, "series": series}, json_file)
+
+
+def generate_tree(root_directory: str, spec: TreeSpec = TreeSpec()) -> dict[str, int]:
+    """
+    Writes the tree described by 'spec' under 'root_directory', returns how many of each file were written.
+    """
+    rng = np.random.default_rng(spec.seed)
+    counts = {"txt": 0, "json": 0}
+    for source, is_gene in source_names(spec.sources):
+        expression = "Gene Expression" if is_gene else "Protein Expression"
+        for cancer_index in range(spec.cancer_types):
+            cancer_type = f"Cancer {cancer_index + 1}"
+            for gene_index in range(spec.genes):
+                gene = f"GENE{gene_index + 1}"
+                folder = os.path.join(root_directory, expression, source, cancer_type, gene)
+                os.makedirs(folder, exist_ok=True)
+                if is_gene:
+                    write_oncodb(os.path.join(folder, "data.txt"), gene, f"C{cancer_index + 1}", spec.samples, rng)
+                    counts["txt"] += 1
+                else:
+                    write_ualcan(os.path.join(folder, "data.json"), spec.samples, rng)
+                    counts["json"] += 1
+    return counts
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = TreeSpec()
+    parser.add_argument("--genes", type=int, default=defaults.genes, help="genes or proteins per cancer type")
+    parser.add_argument("--cancer-types", type=int, default=defaults.cancer_types, help="cancer types per source")
+    parser.add_argument("--sources", type=int, default=defaults.sources, help="sources, alternating TXT and JSON")
+    parser.add_argument("--samples", type=int, default=defaults.samples, help="values in each series")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="random seed")
+
+
+def spec_from_args(args: argparse.Namespace) -> TreeSpec:
+    return TreeSpec(args.genes, args.cancer_types, args.sources, args.samples, args.seed)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root_directory", help="where to write the tree, it is created if it doesn't exist")
+    add_spec_arguments(parser)
+    args = parser.parse_args(argv)
+    counts = generate_tree(args.root_directory, spec_from_args(args))
+    print(f"wrote {counts['txt']} data.txt and {counts['json']} data.json files to {args.root_directory}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
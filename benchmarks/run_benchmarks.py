@@ -0,0 +1,241 @@
+"""
+Times each stage of a jeddinformatics run on a synthetic data tree and writes the timings to a JSON file.
+
+Every repetition runs the stages in order on the same generated tree: starting the command line (`--help`),
+TXT and JSON conversion, loading the converted CSVs, building the per-gene figures, exporting their images,
+the merged plots (built and exported) and writing the all_csv_data aggregate as CSV and as XLSX. Pass
+'--compare' with an earlier results file to print how much each stage changed and '--plotly-io' to also export
+the same images through plotly.io's write_image, for comparison with the ImageExporter.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+from contextlib import contextmanager
+from importlib import metadata
+
+from loguru import logger
+
+import generate_tree
+
+STAGES = (
+    "cli_startup",
+    "renderer_startup",
+    "txt_conversion",
+    "json_conversion",
+    "csv_load",
+    "figure_build",
+    "image_export",
+    "image_export_plotly_io",
+    "merged_plots",
+    "aggregate_csv",
+    "aggregate_xlsx",
+)
+RESULTS_VERSION = 1
+
+
+@contextmanager
+def timer(timings: dict[str, float], stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+class RecordingExporter:
+    """
+    Stands in for an ImageExporter and keeps the figures instead of exporting them.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def export(self, *job, **options) -> None:
+        from jeddinformatics import plot_data
+
+        self.jobs.append(plot_data.ExportJob(*job, **options))
+
+    def replay(self, exporter) -> None:
+        for job in self.jobs:
+            exporter.export(*job)
+
+
+def version_of(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def run_stages(
+    root_directory: str, layout: str = "long", plotly_io: bool = False
+) -> tuple[dict[str, float], dict[str, int]]:
+    """
+    Runs every stage once on the tree under 'root_directory', returns the seconds and items per stage.
+    """
+    # imported here so the import time isn't charged to the first stage
+    import plotly.graph_objects as go
+    from jeddinformatics import aggregate, convert_and_plot, highchart_json_to_csv, oncodb_to_csv, plot_data
+
+    config = convert_and_plot.load_config(os.path.join(os.path.dirname(convert_and_plot.__file__), "config.json"))
+    leaves, merged_cancer_sources = convert_and_plot.find_leaves(root_directory, [], [])
+    txt_leaves = [leaf for leaf in leaves if leaf.file_path.endswith(".txt")]
+    json_leaves = [leaf for leaf in leaves if leaf.file_path.endswith(".json")]
+    timings: dict[str, float] = {}
+    with timer(timings, "cli_startup"):
+        subprocess.run([sys.executable, "-m", "jeddinformatics", "--help"], capture_output=True, check=True)
+    exporter = plot_data.ImageExporter()
+    # keeps the figures instead of exporting them, so building and exporting are timed apart
+    recorder = RecordingExporter()
+
+    with timer(timings, "renderer_startup"):
+        if exporter.scope:
+            exporter.scope.transform(go.Figure().to_plotly_json(), format="png", width=10, height=10)
+    with timer(timings, "txt_conversion"):
+        for leaf in txt_leaves:
+            oncodb_to_csv.convert_onco_to_csv(input=leaf.file_path, output=leaf.output_path("csv"))
+    with timer(timings, "json_conversion"):
+        for leaf in json_leaves:
+            highchart_json_to_csv.convert_highchart_to_csv(input=leaf.file_path, output=leaf.output_path("csv"))
+    with timer(timings, "csv_load"):
+        datasets = [plot_data.read_dataset(leaf.output_path("csv")) for leaf in leaves]
+    with timer(timings, "figure_build"):
+        for leaf, dataset in zip(leaves, datasets):
+            plot_data.plot_formatted_csv(
+                config=config,
+                input=leaf.output_path("csv"),
+                output=leaf.output_path("png"),
+                translation_func=convert_and_plot.translate_in_mapping,
+                cancer_type=leaf.cancer_type,
+                is_gene=leaf.is_gene,
+                exporter=recorder,
+                data=dataset,
+            )
+    with timer(timings, "image_export"):
+        recorder.replay(exporter)
+    if plotly_io:
+        # plotly.io keeps its own renderer running too, so this is after its startup like the exporter's
+        go.Figure().write_image(os.path.join(root_directory, "warm_up.png"), width=10, height=10)
+        os.remove(os.path.join(root_directory, "warm_up.png"))
+        with timer(timings, "image_export_plotly_io"):
+            for job in recorder.jobs:
+                job.figure.write_image(
+                    file=job.output, format=job.format, width=job.width, height=job.height, scale=job.scale
+                )
+    by_csv = {leaf.output_path("csv"): dataset for leaf, dataset in zip(leaves, datasets)}
+    with timer(timings, "merged_plots"):
+        for source, inputs in merged_cancer_sources.items():
+            convert_and_plot.process_merged(source, inputs, config, [by_csv.get(csv) for csv in inputs])
+    for format in ("csv", "xlsx"):
+        with timer(timings, f"aggregate_{format}"):
+            writer = aggregate.AggregateWriter(root_directory, layout, [format])
+            for index, (leaf, dataset) in enumerate(zip(leaves, datasets)):
+                writer.add(index, dataset, leaf.gene_or_protein, leaf.cancer_type, leaf.source_database)
+            writer.close()
+    exporter.close()
+
+    rows = sum(len(dataset) for dataset in datasets)
+    items = {
+        "cli_startup": 1,
+        "renderer_startup": 1,
+        "txt_conversion": len(txt_leaves),
+        "json_conversion": len(json_leaves),
+        "csv_load": len(leaves),
+        "figure_build": len(leaves),
+        "image_export": len(leaves),
+        "image_export_plotly_io": len(leaves),
+        "merged_plots": len(merged_cancer_sources),
+        "aggregate_csv": rows,
+        "aggregate_xlsx": rows,
+    }
+    return timings, items
+
+
+def summarise(runs: list[dict[str, float]], items: dict[str, int]) -> dict[str, dict]:
+    summary = {}
+    for stage in STAGES:
+        seconds = [run[stage] for run in runs if stage in run]
+        if seconds:
+            summary[stage] = {
+                "median": statistics.median(seconds),
+                "min": min(seconds),
+                "runs": seconds,
+                "items": items.get(stage, 0),
+            }
+    return summary
+
+
+def compare(previous: dict, current: dict) -> str:
+    """
+    Returns a table of each stage's median against the one in 'previous', a ratio above 1 is slower.
+    """
+    lines = [f"{'stage':<24}{'before':>10}{'after':>10}{'ratio':>8}"]
+    if previous and previous.get("tree") != current["tree"]:
+        lines.insert(0, f"note: the trees differ, {previous.get('tree')} before and {current['tree']} after")
+    for stage, result in current["stages"].items():
+        before = previous.get("stages", {}).get(stage, {}).get("median")
+        after = result["median"]
+        if before:
+            lines.append(f"{stage:<24}{before:>9.3f}s{after:>9.3f}s{after / before:>8.2f}")
+        else:
+            lines.append(f"{stage:<24}{'-':>10}{after:>9.3f}s{'-':>8}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    generate_tree.add_spec_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="times to run every stage (default: 3)")
+    parser.add_argument("--layout", choices=("long", "wide"), default="long", help="all_csv_data layout")
+    parser.add_argument(
+        "--output", default="benchmark_results.json", help="results file (default: benchmark_results.json)"
+    )
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument(
+        "--plotly-io", action="store_true", help="also time exporting the images through plotly.io's write_image"
+    )
+    parser.add_argument("--keep-tree", help="generate the tree here and keep it instead of in a temporary folder")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    spec = generate_tree.spec_from_args(args)
+    with tempfile.TemporaryDirectory(prefix="jeddinformatics-benchmark-") as temporary_directory:
+        root_directory = args.keep_tree or temporary_directory
+        generate_tree.generate_tree(root_directory, spec)
+        runs = []
+        for repetition in range(args.repeat):
+            timings, items = run_stages(root_directory, args.layout, args.plotly_io)
+            runs.append(timings)
+            print(f"run {repetition + 1}/{args.repeat}: {sum(timings.values()):.2f}s", file=sys.stderr)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "jeddinformatics": version_of("jeddinformatics"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {package: version_of(package) for package in ("pandas", "numpy", "plotly", "kaleido", "openpyxl")},
+        "tree": spec._asdict(),
+        "layout": args.layout,
+        "repeat": args.repeat,
+        "stages": summarise(runs, items),
+    }
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"wrote {args.output}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare, "r") as previous_file:
+            print(compare(json.load(previous_file), results))
+    else:
+        print(compare({}, results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
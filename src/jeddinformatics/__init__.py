@@ -0,0 +1,9 @@
+def open_tree(root_directory: str = ".", **options):
+    """
+    Returns the tree.ExpressionTree of 'root_directory', see tree.open_tree for the options.
+
+    Imported on first use so importing the package (and starting the command line) stays cheap.
+    """
+    from jeddinformatics import tree
+
+    return tree.open_tree(root_directory, **options)
@@ -1,3 +1,3 @@
-from jeddinformatics import convert_and_plot
+from jeddinformatics import cli
 
-convert_and_plot.main()
+cli.main()
@@ -0,0 +1,309 @@
+import os
+import shutil
+from urllib.parse import quote
+from loguru import logger
+import pandas as pd
+from jeddinformatics import profiling
+
+BASE_NAME = "all_csv_data"
+LAYOUTS = ("long", "wide")
+FORMATS = ("csv", "xlsx", "parquet")
+DEFAULT_FORMATS = ("csv", "xlsx")
+LONG_COLUMNS = ["gene", "cancer", "source", "series", "value"]
+# the most rows a worksheet can hold, the header included
+XLSX_MAX_ROWS = 1 << 20
+PARQUET_ROW_GROUP = 1 << 16
+
+
+def output_paths(root_directory: str, formats: list[str] = DEFAULT_FORMATS, base_name: str = BASE_NAME) -> list[str]:
+    """
+    Returns the aggregate file (or directory, for parquet) written for each of 'formats'.
+    """
+    return [os.path.join(root_directory, f"{base_name}.{format}") for format in formats]
+
+
+def wide_columns(dataset: pd.DataFrame, cancer_type: str = "", gene_or_protein: str = "") -> pd.DataFrame:
+    """
+    Returns 'dataset' with its columns renamed to how they appear in the wide layout.
+    """
+    return dataset.set_axis(
+        [f"{cancer_type} {gene_or_protein} {'X' if (col == 'Series Name') else 'Y'}" for col in dataset.columns],
+        axis=1,
+    )
+
+
+def long_rows(dataset: pd.DataFrame, gene_or_protein: str, cancer_type: str, source_database: str) -> pd.DataFrame:
+    """
+    Returns 'dataset' as rows of the long layout, one per value.
+    """
+    return pd.DataFrame(
+        {
+            "gene": gene_or_protein,
+            "cancer": cancer_type,
+            "source": source_database,
+            "series": dataset.iloc[:, 0].astype(str).to_numpy(),
+            "value": pd.to_numeric(dataset.iloc[:, 1], errors="coerce").to_numpy(dtype="float64"),
+        },
+        columns=LONG_COLUMNS,
+    )
+
+
+def temporary_path(path: str) -> str:
+    # keeps the extension so writers that go by it still recognise the format
+    base, extension = os.path.splitext(path)
+    return f"{base}.tmp{extension}"
+
+
+def remove_path(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class CsvSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w", newline="")
+        self.header = True
+
+    def write(self, rows: pd.DataFrame) -> None:
+        rows.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class XlsxSink:
+    """
+    Appends rows to a write-only workbook, which streams each worksheet to disk instead of holding every cell.
+
+    Once a worksheet is full the rows carry on in the next one.
+    """
+
+    def __init__(self, path: str):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.columns = None
+
+    def new_sheet(self) -> None:
+        self.sheet = self.workbook.create_sheet(f"Sheet{len(self.workbook.worksheets) + 1}")
+        self.sheet.append(self.columns)
+        self.sheet_rows = 1
+
+    def write(self, rows: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = [str(column) for column in rows.columns]
+            self.new_sheet()
+        # empty cells rather than NaN, like DataFrame.to_excel
+        cells = rows.astype(object).where(rows.notna(), None)
+        for row in cells.itertuples(index=False, name=None):
+            if self.sheet_rows == XLSX_MAX_ROWS:
+                self.new_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self) -> None:
+        if self.sheet is None:
+            self.workbook.create_sheet("Sheet1")
+        self.workbook.save(self.path)
+
+
+class ParquetSink:
+    """
+    Writes the long layout as a parquet dataset partitioned by source and cancer type.
+
+    Rows are buffered per partition and written out in row groups of PARQUET_ROW_GROUP, the partitions are
+    hive style directories ('source=UALCAN/cancer=Ovarian Cancer/part-0.parquet') so the whole aggregate
+    can be read back with pandas.read_parquet or filtered to a partition without opening the others.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            logger.error(
+                "writing the aggregate as parquet needs pyarrow, install the 'parquet' extra with"
+                " 'pip install jeddinformatics[parquet]'"
+            )
+            raise e
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.schema = pyarrow.schema(
+            [("gene", pyarrow.string()), ("series", pyarrow.string()), ("value", pyarrow.float64())]
+        )
+        self.path = path
+        os.makedirs(path)
+        self.buffers: dict[tuple[str, str], list[pd.DataFrame]] = {}
+        self.buffered_rows: dict[tuple[str, str], int] = {}
+        self.writers = {}
+
+    def write(self, rows: pd.DataFrame) -> None:
+        for (source, cancer), partition in rows.groupby(["source", "cancer"], sort=False):
+            key = (source, cancer)
+            self.buffers.setdefault(key, []).append(partition[["gene", "series", "value"]])
+            self.buffered_rows[key] = self.buffered_rows.get(key, 0) + len(partition)
+            if self.buffered_rows[key] >= PARQUET_ROW_GROUP:
+                self.flush(key)
+
+    def flush(self, key: tuple[str, str]) -> None:
+        frames = self.buffers.pop(key, [])
+        self.buffered_rows.pop(key, None)
+        if not frames:
+            return
+        if key not in self.writers:
+            source, cancer = key
+            directory = os.path.join(self.path, f"source={quote(source, safe=' ')}", f"cancer={quote(cancer, safe=' ')}")
+            os.makedirs(directory, exist_ok=True)
+            self.writers[key] = self.parquet.ParquetWriter(os.path.join(directory, "part-0.parquet"), self.schema)
+        table = self.pyarrow.Table.from_pandas(pd.concat(frames), schema=self.schema, preserve_index=False)
+        self.writers[key].write_table(table)
+
+    def close(self) -> None:
+        for key in list(self.buffers):
+            self.flush(key)
+        for writer in self.writers.values():
+            writer.close()
+
+
+SINKS = {"csv": CsvSink, "xlsx": XlsxSink, "parquet": ParquetSink}
+
+
+class AggregateWriter:
+    """
+    Writes every leaf's dataset into the all_csv_data aggregate as it is produced.
+
+    The 'long' layout has one row per value with the columns in LONG_COLUMNS and is streamed straight to
+    each of 'formats', so only the datasets that arrive out of order are held in memory. Datasets are
+    written in the order of their 'index' whatever order they arrive in, which keeps parallel runs identical
+    to serial ones. The 'wide' layout is the original one, a column pair per leaf side by side, and can only
+    be written once every dataset is in so it keeps them all until close.
+
+    Everything is written to temporary paths that replace the real outputs on close, abort removes them
+    and leaves the previous aggregate in place.
+    """
+
+    def __init__(
+        self,
+        root_directory: str,
+        layout: str = "wide",
+        formats: list[str] = DEFAULT_FORMATS,
+        base_name: str = BASE_NAME,
+    ):
+        if layout not in LAYOUTS:
+            raise ValueError(f"unknown aggregate layout '{layout}', expected one of {', '.join(LAYOUTS)}")
+        unknown = [format for format in formats if format not in FORMATS]
+        if unknown:
+            raise ValueError(f"unknown aggregate format(s) {unknown}, expected some of {', '.join(FORMATS)}")
+        if layout == "wide" and "parquet" in formats:
+            raise ValueError("the wide aggregate layout can't be written as parquet, use the long layout")
+        self.layout = layout
+        self.outputs = dict(zip(formats, output_paths(root_directory, formats, base_name)))
+        self.sinks = {}
+        self.waiting: dict[int, pd.DataFrame] = {}
+        self.next_index = 0
+        self.wide: list[pd.DataFrame] = []
+        self.rows = 0
+        self.aborted = False
+        if layout == "long":
+            for format, path in self.outputs.items():
+                remove_path(temporary_path(path))
+                self.sinks[format] = SINKS[format](temporary_path(path))
+
+    def add(
+        self,
+        index: int,
+        dataset: pd.DataFrame,
+        gene_or_protein: str = "",
+        cancer_type: str = "",
+        source_database: str = "",
+    ) -> None:
+        """
+        Adds the dataset of the 'index'th leaf, a None dataset only moves on to the next index.
+        """
+        if self.aborted:
+            return
+        with profiling.span("aggregate"):
+            if dataset is None:
+                rows = None
+            else:
+                rows = self.rows_for(index, dataset, gene_or_protein, cancer_type, source_database)
+            self.waiting[index] = rows
+            while self.next_index in self.waiting:
+                self.write(self.waiting.pop(self.next_index))
+                self.next_index += 1
+
+    def rows_for(
+        self, index: int, dataset: pd.DataFrame, gene_or_protein: str, cancer_type: str, source_database: str
+    ) -> pd.DataFrame:
+        """
+        Returns what the 'index'th leaf's dataset adds to the aggregate in this writer's layout.
+        """
+        if self.layout == "wide":
+            return wide_columns(dataset, cancer_type, gene_or_protein)
+        return long_rows(dataset, gene_or_protein, cancer_type, source_database)
+
+    def write(self, rows: pd.DataFrame) -> None:
+        if rows is None:
+            return
+        self.rows += len(rows)
+        if self.layout == "wide":
+            self.wide.append(rows)
+            return
+        for sink in self.sinks.values():
+            sink.write(rows)
+
+    def close(self) -> None:
+        if self.aborted:
+            return
+        if self.waiting:
+            logger.warning(f"{len(self.waiting)} dataset(s) never made it into the aggregate, missing an index")
+        with profiling.span("aggregate"):
+            try:
+                if self.layout == "wide":
+                    self.write_wide()
+                for sink in self.sinks.values():
+                    sink.close()
+            except BaseException:
+                self.sinks = {}
+                self.abort()
+                raise
+        for path in self.outputs.values():
+            if os.path.exists(temporary_path(path)):
+                remove_path(path)
+                os.replace(temporary_path(path), path)
+                logger.debug(f"wrote {path}")
+        logger.info(f"aggregated {self.rows} rows into {', '.join(self.outputs.values())}")
+
+    def write_wide(self) -> None:
+        if not self.wide:
+            return
+        global_df = pd.concat(self.wide, axis=1)
+        self.wide = []
+        if "csv" in self.outputs:
+            global_df.to_csv(temporary_path(self.outputs["csv"]), index=False)
+        if "xlsx" in self.outputs:
+            global_df.to_excel(temporary_path(self.outputs["xlsx"]), index=False, engine="openpyxl")
+
+    def abort(self) -> None:
+        """
+        Drops everything written so far, the existing aggregate outputs are left untouched.
+        """
+        if self.aborted:
+            return
+        self.aborted = True
+        self.waiting.clear()
+        self.wide = []
+        for sink in self.sinks.values():
+            try:
+                sink.close()
+            except Exception as e:
+                logger.debug(f"closing {sink.path} while aborting failed with {e!r}")
+        for path in self.outputs.values():
+            remove_path(temporary_path(path))
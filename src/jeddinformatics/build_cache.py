@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+from importlib import metadata
+from loguru import logger
+
+CACHE_FILE_NAME = ".jeddinformatics_cache.json"
+
+# config fields that change what gets drawn, "$schema" is left out on purpose
+CONFIG_FIELDS = (
+    "mappings",
+    "colors",
+    "precedence",
+    "jitter",
+    "line_width",
+    "point_size",
+    "plot_height",
+    "plot_width",
+    "box_mode",
+    "render_profile",
+    "render_profiles",
+    "gene_plots",
+    "atlas",
+    "atlas_columns",
+    "stats_annotations",
+)
+
+
+def package_version() -> str:
+    try:
+        return metadata.version("jeddinformatics")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# digests of the files hashed so far in this process, reused while a file's modification time and size match
+_file_digests: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def hash_file_cached(file_path: str) -> str:
+    """
+    Returns hash_file of 'file_path', only reading it again when it changed since it was last hashed.
+
+    A single run hashes every file once anyway, this saves a long running process (like the watch mode)
+    from hashing the whole tree again every time one file changes.
+    """
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    known = _file_digests.get(file_path)
+    if known is not None and known[0] == signature:
+        return known[1]
+    digest = hash_file(file_path)
+    _file_digests[file_path] = (signature, digest)
+    return digest
+
+
+def hash_strings(*values: str) -> str:
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def config_fingerprint(config: dict) -> str:
+    """
+    Returns a hash of the package version and the parts of 'config' that affect the outputs.
+    """
+    relevant = {field: config.get(field) for field in CONFIG_FIELDS}
+    return hash_strings(package_version(), json.dumps(relevant, sort_keys=True))
+
+
+class BuildCache:
+    """
+    Manifest of what was built from what, stored in 'file_name' (CACHE_FILE_NAME by default) at the root of
+    the data tree.
+
+    Each entry maps a path relative to the root (a data file, a cancer directory or the aggregate)
+    to the digest of the inputs it was last built from. An entry is a hit when the digest is unchanged
+    and every output it produced still exists. With 'force' every lookup is a miss but the manifest is
+    still rewritten so the next run can use it.
+    """
+
+    def __init__(self, root_directory: str, config: dict, force: bool = False, file_name: str = CACHE_FILE_NAME):
+        self.root_directory = root_directory
+        self.path = os.path.join(root_directory, file_name)
+        self.fingerprint = config_fingerprint(config)
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self.entries: dict[str, str] = {}
+        if not force:
+            self.entries = self._load()
+
+    def _load(self) -> dict[str, str]:
+        try:
+            with open(self.path, "r") as cache_file:
+                entries = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"build cache '{self.path}' couldn't be read with {e}, rebuilding everything")
+            return {}
+        if not isinstance(entries, dict):
+            logger.warning(f"build cache '{self.path}' is malformed, rebuilding everything")
+            return {}
+        return entries
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(path, self.root_directory)
+
+    def file_digest(self, file_path: str) -> str:
+        """
+        Returns the digest of a data file combined with the config fingerprint.
+        """
+        return hash_strings(self.fingerprint, hash_file_cached(file_path))
+
+    def combined_digest(self, digests: list[str]) -> str:
+        return hash_strings(self.fingerprint, *digests)
+
+    def is_fresh(self, path: str, digest: str, outputs: list[str]) -> bool:
+        fresh = (
+            not self.force
+            and self.entries.get(self.key(path)) == digest
+            and all(os.path.exists(output) for output in outputs)
+        )
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def update(self, path: str, digest: str) -> None:
+        self.entries[self.key(path)] = digest
+
+    def save(self) -> None:
+        try:
+            with open(self.path, "w") as cache_file:
+                json.dump(self.entries, cache_file, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"build cache '{self.path}' couldn't be written with {e}")
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        return f"build cache: {self.hits} hits, {self.misses} misses out of {total} outputs"
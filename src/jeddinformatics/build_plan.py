@@ -0,0 +1,105 @@
+import os
+from typing import NamedTuple
+from jeddinformatics import aggregate, build_cache, intermediate, theming
+
+
+class BuildPlan(NamedTuple):
+    # (leaf, rebuild) pairs, fresh leaves are only loaded for the aggregate and merged plots
+    tasks: list[tuple]
+    leaf_digests: dict[str, str]
+    merged_cancer_sources: dict[str, list[str]]
+    merged_digests: dict[str, str]
+    aggregate_digest: str
+    aggregate_fresh: bool
+    # only set when there are themes besides the plots beside the data
+    theme_plans: list[theming.ThemePlan] = ()
+    targets: theming.Targets = None
+
+
+def plan_build(
+    cache: build_cache.BuildCache,
+    root_directory: str,
+    leaves: list,
+    merged_cancer_sources: dict[str, list[str]],
+    write_csv: bool = True,
+    aggregate_layout: str = "wide",
+    aggregate_formats: list[str] = aggregate.DEFAULT_FORMATS,
+    image_formats: list[str] = ("png",),
+    gene_plots: bool = True,
+    atlas: bool = False,
+    aggregate_outputs: list[str] = None,
+    theme_plans: list[theming.ThemePlan] = (),
+    base_theme: theming.Theme = None,
+) -> BuildPlan:
+    """
+    Works out which leaves, merged plots and aggregate outputs 'cache' says are out of date.
+    """
+    file_digests: dict[str, str] = {}
+    for leaf in leaves:
+        # a wide export is hashed once for all of its genes
+        if leaf.file_path not in file_digests:
+            file_digests[leaf.file_path] = cache.file_digest(leaf.file_path)
+    leaf_digests = [file_digests[leaf.file_path] for leaf in leaves]
+    outputs = list(image_formats) if gene_plots else []
+    if write_csv:
+        outputs.append(intermediate.extension())
+    merged_outputs = ["merged", "atlas"] if atlas else ["merged"]
+    rebuild = [
+        not cache.is_fresh(leaf.key, digest, [leaf.output_path(extension) for extension in outputs])
+        for leaf, digest in zip(leaves, leaf_digests)
+    ]
+    csv_digests = {leaf.data_path: digest for leaf, digest in zip(leaves, leaf_digests)}
+    merged_digests = {
+        source: cache.combined_digest(
+            [f"{cache.key(csv)}={csv_digests.get(csv) or cache.file_digest(csv)}" for csv in inputs]
+        )
+        for source, inputs in merged_cancer_sources.items()
+    }
+    stale_merged = {
+        source: inputs
+        for source, inputs in merged_cancer_sources.items()
+        if not cache.is_fresh(
+            source,
+            merged_digests[source],
+            [os.path.join(source, f"{name}.{format}") for name in merged_outputs for format in image_formats],
+        )
+    }
+    aggregate_digest = cache.combined_digest(
+        [f"layout={aggregate_layout}", f"formats={','.join(aggregate_formats)}"]
+        + [f"{cache.key(leaf.key)}={digest}" for leaf, digest in zip(leaves, leaf_digests)]
+    )
+    digests_by_leaf = {leaf.key: digest for leaf, digest in zip(leaves, leaf_digests)}
+    # the aggregate is stale when one of 'aggregate_outputs' is missing
+    aggregate_fresh = bool(leaves) and cache.is_fresh(
+        root_directory, aggregate_digest, aggregate_outputs or aggregate.output_paths(root_directory, aggregate_formats)
+    )
+    targets = None
+    if theme_plans:
+        # a plot only out of date in a theme is drawn again there alone
+        targets = theming.plan_targets(base_theme, leaves, rebuild, merged_cancer_sources, set(stale_merged), theme_plans)
+        stale_merged = {source: inputs for source, inputs in merged_cancer_sources.items() if targets.merged[source]}
+    tasks = [
+        (leaf, needs_rebuild)
+        for leaf, needs_rebuild in zip(leaves, rebuild)
+        if needs_rebuild
+        or not aggregate_fresh
+        or leaf.merged_source in stale_merged
+        or (targets is not None and targets.leaves[leaf.key])
+    ]
+    return BuildPlan(
+        tasks, digests_by_leaf, stale_merged, merged_digests, aggregate_digest, aggregate_fresh, theme_plans, targets
+    )
+
+
+def update_cache(cache: build_cache.BuildCache, plan: BuildPlan, completed: list[bool], failures: list[str]) -> None:
+    # records every output that was built successfully and saves the cache
+    for (leaf, rebuild), done in zip(plan.tasks, completed):
+        if rebuild and done:
+            cache.update(leaf.key, plan.leaf_digests[leaf.key])
+    if not failures:
+        for source in plan.merged_cancer_sources:
+            cache.update(source, plan.merged_digests[source])
+        cache.update(cache.root_directory, plan.aggregate_digest)
+    cache.save()
+    for theme_plan in plan.theme_plans:
+        theming.update_theme_cache(theme_plan, plan.tasks, completed, failures)
@@ -0,0 +1,348 @@
+import os
+import sys
+import argparse
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parses '--shard i/N', the i'th (from 1) of N slices of the tree.
+    """
+    number, separator, count = value.partition("/")
+    if not separator or not number.isdigit() or not count.isdigit() or not 1 <= int(number) <= int(count):
+        raise argparse.ArgumentTypeError(f"expected i/N with 1 <= i <= N, like 1/4, got '{value}'")
+    return int(number), int(count)
+
+
+def parse_theme(value: str) -> tuple[str, str]:
+    """
+    Parses '--theme [NAME=]PATH', a config drawn into themes/NAME, named after the file when NAME is left out.
+    """
+    name, separator, path = value.partition("=")
+    if not separator:
+        path = value
+        name = os.path.splitext(os.path.basename(value))[0]
+    if not name or name in (".", "..") or "/" in name or os.sep in name:
+        raise argparse.ArgumentTypeError(f"expected [NAME=]PATH with a plain folder name for NAME, got '{value}'")
+    return name, path
+
+
+def add_shared_arguments(parser: argparse.ArgumentParser) -> None:
+    # the arguments a normal run and merge have in common, they have to match between the shards and merge
+    parser.add_argument(
+        "root_directory", nargs="?", default=".", help="root of the data tree (default: current directory)"
+    )
+    parser.add_argument(
+        "--genes",
+        type=lambda value: [gene.strip() for gene in value.split(",") if gene.strip()],
+        default=None,
+        help="comma separated genes to extract from wide OncoDB exports (default: every expression column)",
+    )
+    parser.add_argument(
+        "--aggregate-layout",
+        choices=("long", "wide"),
+        default="wide",
+        help="all_csv_data as the original column pair per leaf, which has to be held in memory until the end, or"
+        " one row per value (gene, cancer, source, series, value) written as the tree is processed (default: wide)",
+    )
+    parser.add_argument(
+        "--aggregate-formats",
+        type=lambda value: [format.strip() for format in value.split(",") if format.strip()],
+        default=["csv", "xlsx"],
+        help="comma separated all_csv_data formats out of csv, xlsx and parquet, parquet is partitioned by source"
+        " and cancer type and needs pyarrow from the parquet extra, pip install jeddinformatics[parquet] (default: csv,xlsx)",
+    )
+    parser.add_argument(
+        "--render-profile",
+        default=None,
+        metavar="NAME",
+        help="render profile to export with, built in are publication (PNG at scale 4), draft (PNG at scale 1 without"
+        " the outlier points), vector (SVG and PDF) and html, config.json can define more (default: the config's"
+        " render_profile, otherwise publication)",
+    )
+    parser.add_argument(
+        "--atlas",
+        action="store_true",
+        default=None,
+        help="also plot every gene or protein of a cancer type into one atlas.png grid, rendered in a single export",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=None,
+        help="test every series against the reference series of its plot (Mann-Whitney U and Welch's t-test with"
+        " FDR corrected q-values, plus the fold change) for every gene, cancer type and source into all_stats.csv",
+    )
+    parser.add_argument(
+        "--theme",
+        dest="themes",
+        type=parse_theme,
+        action="append",
+        default=[],
+        metavar="[NAME=]PATH",
+        help="also draw every plot with the config at PATH into themes/NAME under the root (NAME defaults to the file"
+        " name without .json), can be repeated and every data file is still only parsed once",
+    )
+
+
+def check_shared_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    unknown = sorted(set(args.aggregate_formats) - {"csv", "xlsx", "parquet"})
+    if unknown:
+        parser.error(f"unknown --aggregate-formats {', '.join(unknown)}, expected csv, xlsx or parquet")
+    if args.aggregate_layout == "wide" and "parquet" in args.aggregate_formats:
+        parser.error("parquet can only be written with --aggregate-layout long")
+    names = [name for name, _ in args.themes]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        parser.error(f"--theme names have to be unique, {', '.join(duplicates)} given more than once")
+    missing = [path for _, path in args.themes if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"--theme config {', '.join(missing)} doesn't exist")
+
+
+def parse_merge_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="jeddinformatics merge",
+        description="Combine the partial aggregates of every --shard run into all_csv_data and draw the merged plots",
+    )
+    add_shared_arguments(parser)
+    args = parser.parse_args(argv)
+    check_shared_arguments(parser, args)
+    args.command = "merge"
+    return args
+
+
+def parse_serve_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="jeddinformatics serve",
+        description="Serve plots over HTTP: POST an OncoDB TXT or Highcharts JSON export to /render and get the image"
+        " back, GET /metrics for request latencies and cache counts",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="render processes kept warm, 0 uses one per CPU (default: 2)",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=float,
+        default=128,
+        help="memory budget of the rendered images cache, 0 turns it off (default: 128)",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="renders queued or running at once, more are answered with 503 (default: 64)",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 0 or args.cache_mb < 0 or args.max_pending < 1:
+        parser.error("--workers and --cache-mb must be 0 or more and --max-pending at least 1")
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+    args.command = "serve"
+    return args
+
+
+def parse_to_csv_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="jeddinformatics to-csv",
+        description="Write a data.csv beside every data.jbin written by a --data-format binary run",
+    )
+    parser.add_argument(
+        "paths", nargs="*", default=["."], help="data.jbin files or folders to walk for them (default: current directory)"
+    )
+    args = parser.parse_args(argv)
+    args.command = "to-csv"
+    return args
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["merge"]:
+        return parse_merge_args(argv[1:])
+    if argv[:1] == ["serve"]:
+        return parse_serve_args(argv[1:])
+    if argv[:1] == ["to-csv"]:
+        return parse_to_csv_args(argv[1:])
+    parser = argparse.ArgumentParser(
+        prog="jeddinformatics",
+        description="Convert bioinformatics data to plots",
+        epilog="'jeddinformatics merge --help' describes combining the outputs of --shard runs,"
+        " 'jeddinformatics serve --help' serving plots over HTTP and 'jeddinformatics to-csv --help' turning"
+        " data.jbin files back into CSV",
+    )
+    add_shared_arguments(parser)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to convert and plot with, 0 uses one per CPU (default: 1)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="ignore the build cache and rebuild every output",
+    )
+    parser.add_argument(
+        "--no-csv",
+        dest="write_csv",
+        action="store_false",
+        help="keep converted data in memory instead of also writing a data.csv (or data.jbin) next to each data file",
+    )
+    parser.add_argument(
+        "--data-format",
+        choices=("csv", "binary"),
+        default="csv",
+        help="what each data file is converted into, a data.csv or a data.jbin of label codes and float64 values that"
+        " is memory mapped instead of parsed when it's read back (default: csv)",
+    )
+    parser.add_argument(
+        "--dataset-cache-mb",
+        type=float,
+        default=256,
+        help="memory budget of the parsed dataset cache in each process, 0 turns it off (default: 256)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        metavar="I/N",
+        help="only process the I'th of N slices of the tree and write a partial aggregate instead of all_csv_data,"
+        " every slice can run on a different machine and 'jeddinformatics merge' combines them",
+    )
+    parser.add_argument(
+        "--no-gene-plots",
+        dest="gene_plots",
+        action="store_false",
+        default=None,
+        help="skip the plot of each gene or protein, the merged plots (and atlas) are still drawn",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="jeddinformatics_trace.json",
+        default=None,
+        metavar="TRACE",
+        help="time every stage, log a summary and write a Chrome trace to TRACE (default: jeddinformatics_trace.json)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="with --profile, also run cProfile around parsing, conversion, plotting and export and write the"
+        " merged profile next to the trace as a .prof file",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running after the first build and rebuild whatever a new, changed or removed data file affects",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        metavar="SECONDS",
+        help="with --watch, wait until the tree has been quiet this long before rebuilding (default: 2)",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="with --watch, rescan the tree this often instead of using inotify, which is only available on Linux"
+        " and doesn't see changes made over a network mount (default: inotify when available)",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or more")
+    if args.dataset_cache_mb < 0:
+        parser.error("--dataset-cache-mb must be 0 or more")
+    check_shared_arguments(parser, args)
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile needs --profile")
+    if args.debounce < 0 or (args.poll is not None and args.poll <= 0):
+        parser.error("--debounce must be 0 or more and --poll more than 0")
+    if args.shard and args.watch:
+        parser.error("--shard can't be combined with --watch")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    args.command = "process"
+    return args
+
+
+def main(argv: list[str] = None):
+    # arguments are parsed before anything heavy is imported so --help and usage errors return straight away
+    args = parse_args(argv)
+    from loguru import logger
+
+    with logger.catch(onerror=lambda _: sys.exit(1)):
+        logger.remove(0)
+        logger.add(sys.stdout, level="INFO")
+        logger.success("Starting jeddinformatics.")
+        logger.add("jeddinformatics.log", retention="5 minute", level="DEBUG")
+        themes = None
+        if args.command in ("process", "merge") and args.themes:
+            from jeddinformatics import convert_and_plot
+
+            # every theme is validated against the schema before anything is drawn
+            themes = {name: convert_and_plot.load_config(path) for name, path in args.themes}
+        if args.command == "merge":
+            from jeddinformatics import convert_and_plot
+
+            options = convert_and_plot.BuildOptions(
+                genes=args.genes,
+                aggregate_layout=args.aggregate_layout,
+                aggregate_formats=args.aggregate_formats,
+                render_profile=args.render_profile,
+                atlas=args.atlas,
+                stats=args.stats,
+                themes=themes,
+            )
+            convert_and_plot.merge_shards(args.root_directory, options)
+            return
+        if args.command == "to-csv":
+            from jeddinformatics import convert_and_plot
+
+            convert_and_plot.binary_to_csv(args.paths)
+            return
+        if args.command == "serve":
+            from jeddinformatics import service
+
+            service.serve(args.host, args.port, args.workers, args.cache_mb, args.max_pending)
+            return
+        from jeddinformatics import convert_and_plot
+
+        options = convert_and_plot.BuildOptions(
+            jobs=args.jobs,
+            force=args.force,
+            write_csv=args.write_csv,
+            genes=args.genes,
+            aggregate_layout=args.aggregate_layout,
+            aggregate_formats=args.aggregate_formats,
+            dataset_cache_mb=args.dataset_cache_mb,
+            profile=args.profile,
+            cprofile=args.cprofile,
+            render_profile=args.render_profile,
+            atlas=args.atlas,
+            gene_plots=args.gene_plots,
+            stats=args.stats,
+            themes=themes,
+            data_format=args.data_format,
+        )
+        if args.watch:
+            from jeddinformatics import watch
+
+            watch.watch(args.root_directory, options, debounce=args.debounce, poll_interval=args.poll)
+        else:
+            from jeddinformatics import shards
+
+            shard = shards.Shard(*args.shard) if args.shard else None
+            convert_and_plot.process_files(args.root_directory, options, shard=shard)
+
+
+if __name__ == "__main__":
+    main()
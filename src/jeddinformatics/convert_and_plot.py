@@ -1,27 +1,22 @@
 import os
-import sys
 import json
-import fnmatch
+import functools
+from typing import NamedTuple
 from loguru import logger
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
 import pandas as pd
 from jeddinformatics import generate_types
 
-all_data = []
-
 try:
-    # Attempt to generate and import the model
+    # Import the model, it is only regenerated when the schema has changed since it was last generated
     schema_file_path = "./schema.json"
     if not os.path.exists(schema_file_path):
         schema_file_path = os.path.join(os.path.dirname(__file__), "schema.json")
     if os.path.exists(schema_file_path):
-        generate_types.generate_models_from_schema(
+        schema_model = generate_types.load_schema_model(
             schema_file_path, os.path.join(os.path.dirname(__file__), "schema_model.py")
         )
     else:
         raise FileNotFoundError(filename=schema_file_path)
-    from jeddinformatics import schema_model
 
     MappingsType = schema_model.Model.__annotations__["mappings"]
     ColorsType = schema_model.Model.__annotations__["colors"]
@@ -40,6 +35,17 @@ except Exception as e:
 from jeddinformatics import oncodb_to_csv  # noqa: E402
 from jeddinformatics import highchart_json_to_csv  # noqa: E402
 from jeddinformatics import plot_data  # noqa: E402
+from jeddinformatics import build_cache  # noqa: E402
+from jeddinformatics import build_plan  # noqa: E402
+from jeddinformatics import aggregate  # noqa: E402
+from jeddinformatics import dataset_cache  # noqa: E402
+from jeddinformatics import walker  # noqa: E402
+from jeddinformatics import profiling  # noqa: E402
+from jeddinformatics import shards  # noqa: E402
+from jeddinformatics import significance  # noqa: E402
+from jeddinformatics import scheduler  # noqa: E402
+from jeddinformatics import theming  # noqa: E402
+from jeddinformatics import intermediate  # noqa: E402
 
 
 def translate_in_mapping(input: str, mappings: MappingsType = {}) -> str:
@@ -73,28 +79,60 @@ def replace_file_extension(file_path: str, new_extension: str) -> str:
     return f"{base}.{new_extension}"
 
 
+def process_dataset(
+    dataset: pd.DataFrame,
+    file_path: str,
+    config: schema_model.Model,
+    cancer_type: str = "",
+    is_gene: bool = False,
+    themes: list[theming.Theme] = None,
+) -> pd.DataFrame:
+    """
+    Plots an already parsed dataset next to 'file_path', in each of 'themes' when given, and returns it.
+    """
+    if themes is None:
+        themes = [theming.Theme("", config)]
+    series = plot_data.PreparedSeries(dataset, is_gene)
+    # the series and annotations only depend on the precedence, themes sharing one share them
+    annotations: dict[tuple[str, ...], dict[object, str]] = {}
+    for theme in themes:
+        if not theme.config.get("gene_plots", True):
+            continue
+        precedence = theme.config["precedence"]
+        if theme.config.get("stats_annotations", False) and tuple(precedence) not in annotations:
+            annotations[tuple(precedence)] = significance.leaf_annotations(dataset, precedence, is_gene)
+        plot_data.plot_formatted_csv(
+            config=theme.config,
+            input=file_path,
+            output=theme.output_directory(replace_file_extension(file_path, "png")),
+            translation_func=translate_in_mapping,
+            cancer_type=cancer_type,
+            is_gene=is_gene,
+            data=dataset,
+            annotations=annotations.get(tuple(precedence)) if theme.config.get("stats_annotations", False) else None,
+            series=series,
+        )
+    return dataset
+
+
 def process_csv(
     file_path: str,
     config: schema_model.Model,
     cancer_type: str = "",
     is_gene: bool = False,
-    gene_or_protein=""
-) -> None:
+    plot: bool = True,
+) -> pd.DataFrame:
     if file_path.find("all_csv_data") != -1:
-        return
+        return None
     logger.debug(f"processing CSV file: {file_path}")
-    df = pd.read_csv(file_path)
-    df.columns = [f"{cancer_type} {gene_or_protein} {'X' if (col == 'Series Name') else 'Y'}" for col in df.columns]
-    all_data.append(df)
-
-    plot_data.plot_formatted_csv(
-        config=config,
-        input=file_path,
-        output=replace_file_extension(file_path, "png"),
-        translation_func=translate_in_mapping,
-        cancer_type=cancer_type,
-        is_gene=is_gene,
-    )
+    if intermediate.is_binary(file_path):
+        dataset = intermediate.read_binary(file_path)
+    else:
+        with profiling.span("parse", file=file_path):
+            dataset = pd.read_csv(file_path)
+    if not plot:
+        return dataset
+    return process_dataset(dataset, file_path, config=config, cancer_type=cancer_type, is_gene=is_gene)
 
 
 def process_json(
@@ -102,18 +140,16 @@ def process_json(
     config: schema_model.Model,
     cancer_type: str = "",
     is_gene: bool = False,
-    gene_or_protein=""
-) -> None:
+    write_csv: bool = True,
+    themes: list[theming.Theme] = None,
+) -> pd.DataFrame:
     logger.debug(f"processing JSON file: {file_path}")
-    output_path = replace_file_extension(file_path, "csv")
-    highchart_json_to_csv.convert_highchart_to_csv(input=file_path, output=output_path)
-    process_csv(
-        file_path=output_path,
-        config=config,
-        cancer_type=cancer_type,
-        is_gene=is_gene,
-        gene_or_protein=gene_or_protein
-    )
+    output_path = replace_file_extension(file_path, intermediate.extension())
+    if write_csv:
+        dataset = highchart_json_to_csv.convert_highchart_to_csv(input=file_path, output=output_path)
+    else:
+        dataset = highchart_json_to_csv.read_highchart(input=file_path)
+    return process_dataset(dataset, output_path, config=config, cancer_type=cancer_type, is_gene=is_gene, themes=themes)
 
 
 def process_txt(
@@ -121,36 +157,285 @@ def process_txt(
     config: schema_model.Model,
     cancer_type: str = "",
     is_gene: bool = False,
-    gene_or_protein=""
-) -> None:
+    write_csv: bool = True,
+    gene: str = None,
+    themes: list[theming.Theme] = None,
+) -> pd.DataFrame:
     logger.debug(f"processing TXT file: {file_path}")
-    output_path = replace_file_extension(file_path, "csv")
-    oncodb_to_csv.convert_onco_to_csv(input=file_path, output=output_path)
-    process_csv(
-        file_path=output_path,
-        config=config,
-        cancer_type=cancer_type,
-        is_gene=is_gene,
-        gene_or_protein=gene_or_protein
+    output_path = replace_file_extension(file_path, intermediate.extension())
+    if write_csv:
+        # written a chunk at a time as it's parsed
+        dataset = oncodb_to_csv.convert_onco(input=file_path, output=output_path, gene=gene)
+    else:
+        dataset = oncodb_to_csv.read_onco(input=file_path, gene=gene)
+    return process_dataset(dataset, output_path, config=config, cancer_type=cancer_type, is_gene=is_gene, themes=themes)
+
+
+class Leaf(NamedTuple):
+    """
+    A data.json or data.txt file along with the fields parsed from its path.
+    """
+
+    file_path: str
+    gene_or_protein: str
+    cancer_type: str
+    source_database: str
+    is_gene: bool
+    # gene whose expression column is read from a TXT file, None for the first one
+    gene_column: str = None
+    # one gene of a wide OncoDB export, its outputs go into a '<gene>' folder beside the data.txt
+    wide: bool = False
+
+    def output_path(self, extension: str) -> str:
+        if self.wide:
+            return os.path.join(os.path.dirname(self.file_path), self.gene_or_protein, f"data.{extension}")
+        return replace_file_extension(self.file_path, extension)
+
+    @property
+    def data_path(self) -> str:
+        """The data.csv or data.jbin the leaf is converted into, whichever intermediate.configure picked."""
+        return self.output_path(intermediate.extension())
+
+    @property
+    def merged_source(self) -> str:
+        """The cancer type folder whose merged.png this leaf goes into."""
+        return os.path.dirname(os.path.dirname(self.output_path("csv")))
+
+    @property
+    def key(self) -> str:
+        """Identifies the leaf in the build cache, wide exports hold several leaves per file."""
+        return f"{self.file_path}#{self.gene_or_protein}" if self.wide else self.file_path
+
+    def span(self, name: str):
+        """Times a stage of this leaf when profiling, tagged with its gene, cancer type and source."""
+        return profiling.span(name, gene=self.gene_or_protein, cancer=self.cancer_type, source=self.source_database)
+
+
+def load_leaf(leaf: Leaf) -> pd.DataFrame:
+    """
+    Loads an up to date leaf through the dataset cache, from its CSV if one was written.
+    """
+    data_path = leaf.data_path
+
+    def load() -> pd.DataFrame:
+        if os.path.exists(data_path):
+            return process_csv(data_path, config={}, plot=False)
+        return parse_leaf(leaf)
+
+    return dataset_cache.default_cache.get(leaf.file_path, load, key=leaf.key)
+
+
+def write_data(dataset: pd.DataFrame, output: str) -> None:
+    # a dataset that was still cached is written out as it is instead of being converted from its source again
+    with profiling.span("convert", file=output):
+        intermediate.write_dataset(dataset, output)
+
+
+def parse_leaf(leaf: Leaf) -> pd.DataFrame:
+    if leaf.file_path.endswith(".json"):
+        return highchart_json_to_csv.read_highchart(input=leaf.file_path)
+    if leaf.wide:
+        return oncodb_to_csv.read_onco_genes(input=leaf.file_path, genes=[leaf.gene_or_protein])[leaf.gene_or_protein]
+    return oncodb_to_csv.read_onco(input=leaf.file_path, gene=leaf.gene_column)
+
+
+def process_leaf(
+    leaf: Leaf,
+    config: schema_model.Model,
+    rebuild: bool = True,
+    write_csv: bool = True,
+    themes: list[theming.Theme] = None,
+) -> pd.DataFrame:
+    """
+    Converts and plots a single leaf, only loads it when 'rebuild' is False, and returns its dataset.
+    """
+    if themes is None:
+        themes = [theming.Theme("", config)] if rebuild else []
+    if leaf.wide:
+        return process_unit([(leaf, rebuild)], config, write_csv, [themes])[0]
+    if not rebuild:
+        with leaf.span("load"):
+            dataset = load_leaf(leaf)
+        if themes:
+            with leaf.span("themes"):
+                process_dataset(dataset, leaf.data_path, config, leaf.cancer_type, leaf.is_gene, themes)
+        return dataset
+    with leaf.span("leaf"):
+        return convert_leaf(leaf, config, write_csv, themes)
+
+
+def convert_leaf(
+    leaf: Leaf, config: schema_model.Model, write_csv: bool = True, themes: list[theming.Theme] = None
+) -> pd.DataFrame:
+    """
+    Converts and plots a rebuilt leaf, its source is only parsed when the dataset cache doesn't have it.
+    """
+    dataset = dataset_cache.default_cache.lookup(leaf.file_path, leaf.key)
+    if dataset is not None:
+        if write_csv:
+            write_data(dataset, leaf.data_path)
+        return process_dataset(dataset, leaf.data_path, config, leaf.cancer_type, leaf.is_gene, themes)
+    if leaf.file_path.endswith(".json"):
+        dataset = process_json(
+            file_path=leaf.file_path,
+            config=config,
+            cancer_type=leaf.cancer_type,
+            is_gene=leaf.is_gene,
+            write_csv=write_csv,
+            themes=themes,
+        )
+    else:
+        dataset = process_txt(
+            file_path=leaf.file_path,
+            config=config,
+            cancer_type=leaf.cancer_type,
+            is_gene=leaf.is_gene,
+            write_csv=write_csv,
+            gene=leaf.gene_column,
+            themes=themes,
+        )
+    dataset_cache.default_cache.put(leaf.file_path, dataset, key=leaf.key)
+    return dataset
+
+
+def process_unit(
+    unit: list[tuple[Leaf, bool]],
+    config: schema_model.Model,
+    write_csv: bool = True,
+    themes: list[list[theming.Theme]] = None,
+) -> list[pd.DataFrame]:
+    """
+    Processes the (leaf, rebuild) tasks sharing a data file, a wide OncoDB export is parsed once for all.
+    """
+    if themes is None:
+        themes = [[theming.Theme("", config)] if rebuild else [] for _, rebuild in unit]
+    if not unit[0][0].wide:
+        return [
+            process_leaf(leaf, config, rebuild, write_csv, leaf_themes)
+            for (leaf, rebuild), leaf_themes in zip(unit, themes)
+        ]
+    file_path = unit[0][0].file_path
+    logger.debug(f"processing wide TXT file: {file_path}")
+    parsed = parse_unit(unit, write_csv)
+    datasets = []
+    for (leaf, rebuild), leaf_themes in zip(unit, themes):
+        with leaf.span("leaf" if rebuild else "load"):
+            dataset = parsed[leaf.gene_or_protein] if leaf.gene_or_protein in parsed else load_leaf(leaf)
+            output_path = leaf.data_path
+            if rebuild:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            process_dataset(dataset, output_path, config, leaf.cancer_type, leaf.is_gene, leaf_themes)
+        datasets.append(dataset)
+    return datasets
+
+
+def parse_unit(unit: list[tuple[Leaf, bool]], write_csv: bool = True) -> dict[str, pd.DataFrame]:
+    """
+    Parses the genes of a wide export that are needed in one pass, writing the rebuilt ones as it goes.
+    """
+    file_path = unit[0][0].file_path
+    needed = [leaf for leaf, rebuild in unit if rebuild or not os.path.exists(leaf.data_path)]
+    written = {leaf.gene_or_protein: leaf.data_path for leaf, rebuild in unit if rebuild and write_csv}
+    for data_path in written.values():
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    datasets = cached_genes(file_path, needed)
+    for gene, dataset in datasets.items():
+        if gene in written:
+            write_data(dataset, written[gene])
+    missing = [leaf for leaf in needed if leaf.gene_or_protein not in datasets]
+    if not missing:
+        return datasets
+    genes = [leaf.gene_or_protein for leaf in missing]
+    outputs = {gene: written[gene] for gene in genes if gene in written}
+    if outputs:
+        parsed = oncodb_to_csv.convert_onco_genes(file_path, genes, outputs)
+    else:
+        parsed = oncodb_to_csv.read_onco_genes(input=file_path, genes=genes)
+    for leaf in missing:
+        dataset_cache.default_cache.put(file_path, parsed[leaf.gene_or_protein], key=leaf.key)
+    return {**datasets, **parsed}
+
+
+def cached_genes(file_path: str, leaves: list[Leaf]) -> dict[str, pd.DataFrame]:
+    """
+    Looks up the datasets the dataset cache still has for the genes of 'leaves', all from the wide export 'file_path'.
+    """
+    datasets = {}
+    for leaf in leaves:
+        dataset = dataset_cache.default_cache.lookup(file_path, leaf.key)
+        if dataset is not None:
+            datasets[leaf.gene_or_protein] = dataset
+    return datasets
+
+
+def process_merged(
+    source: str,
+    inputs: list[str],
+    config: schema_model.Model,
+    datasets: list[pd.DataFrame] = None,
+    themes: list[theming.Theme] = None,
+) -> None:
+    """
+    Plots every CSV of a cancer type into merged.png in 'source', and atlas.png with 'atlas'.
+    """
+    if themes is None:
+        themes = [theming.Theme("", config)]
+    # 'datasets' lines up with 'inputs', the ones that are None are read through the dataset cache
+    datasets = [
+        dataset if dataset is not None else dataset_cache.default_cache.get(csv, lambda csv=csv: plot_data.read_dataset(csv))
+        for csv, dataset in zip(inputs, datasets or [None] * len(inputs))
+    ]
+    cancer_type = source.split(os.sep)[-1]
+    source_database = source.split(os.sep)[-2]
+    is_gene = source.split(os.sep)[-3].lower().find("gene") != -1
+    gene_or_protein_expression = "gene" if is_gene else "protein"
+    logger.info(
+        f"starting {gene_or_protein_expression}s for: {cancer_type}, from source: {source_database}"
     )
+    series = [plot_data.PreparedSeries(dataset, is_gene) for dataset in datasets]
+    for theme in themes:
+        with profiling.span("merged_plot", cancer=cancer_type, source=source_database):
+            plot_data.plot_formatted_csvs(
+                config=theme.config,
+                inputs=inputs,
+                output=theme.output_directory(f"{source}/merged.png"),
+                translation_func=translate_in_mapping,
+                cancer_type=cancer_type,
+                is_gene=is_gene,
+                datasets=datasets,
+                series=series,
+            )
+            if theme.config.get("atlas", False):
+                plot_data.plot_atlas(
+                    config=theme.config,
+                    inputs=inputs,
+                    output=theme.output_directory(f"{source}/atlas.png"),
+                    translation_func=translate_in_mapping,
+                    cancer_type=cancer_type,
+                    is_gene=is_gene,
+                    datasets=datasets,
+                    series=series,
+                )
 
 
-def process_files(root_directory: str = ".") -> None:  # noqa: C901
-    config_file_path = "./config.json"
-    if not os.path.exists(config_file_path):
-        config_file_path = os.path.join(os.path.dirname(__file__), "config.json")
+def add_merged_input(merged_cancer_sources: dict[str, list[str]], csv_path: str) -> None:
+    dest = os.path.dirname(os.path.dirname(csv_path))
+    prev = merged_cancer_sources.setdefault(dest, [])
+    if csv_path not in prev:
+        prev.append(csv_path)
 
-    ignored_file_path = "./.fileignore"
-    if not os.path.exists(ignored_file_path):
-        ignored_file_path = os.path.join(os.path.dirname(__file__), ".fileignore")
 
-    ignored_dir_path = "./.dirignore"
-    if not os.path.exists(ignored_dir_path):
-        ignored_dir_path = os.path.join(os.path.dirname(__file__), ".dirignore")
+def local_or_default(file_name: str) -> str:
+    """
+    Returns './file_name' if it exists in the working directory, otherwise the copy shipped with the package.
+    """
+    file_path = os.path.join(".", file_name)
+    if not os.path.exists(file_path):
+        file_path = os.path.join(os.path.dirname(__file__), file_name)
+    return file_path
 
-    count_json = 0
-    count_txt = 0
 
+def load_config(config_file_path: str) -> schema_model.Model:
     try:
         with open(config_file_path, "r") as config_file:
             config: schema_model.Model = json.load(config_file)
@@ -165,6 +450,10 @@ def process_files(root_directory: str = ".") -> None:  # noqa: C901
     logger.debug(f"using colors: {colors}")
     precedence = config["precedence"]
     logger.debug(f"using precedence: {precedence}")
+    # jsonschema is only needed once per run so it isn't imported with the module
+    from jsonschema import validate
+    from jsonschema.exceptions import ValidationError
+
     # validate that the schema matches the config
     try:
         with open(schema_file_path, "r") as schema_file:
@@ -176,121 +465,374 @@ def process_files(root_directory: str = ".") -> None:  # noqa: C901
         raise e
     except Exception as e:
         raise e
+    return config
 
-    try:
-        with open(ignored_file_path, "r") as ignore_file_file:
-            ignored_file_patterns = [line.strip() for line in ignore_file_file]
-    except Exception as e:
-        logger.warning(
-            f"ignored file '{ignored_file_path}' couldn't be parsed with {e}, using default of none"
-        )
-        ignored_file_patterns = []
 
+def load_patterns(pattern_file_path: str) -> list[str]:
     try:
-        with open(ignored_dir_path, "r") as ignore_dir_file:
-            ignored_dir_patterns = [line.strip() for line in ignore_dir_file]
+        with open(pattern_file_path, "r") as pattern_file:
+            return [line.strip() for line in pattern_file]
     except Exception as e:
         logger.warning(
-            f"ignored dirs '{ignored_dir_patterns}' couldn't be parsed with {e}, using default of none"
+            f"ignored patterns '{pattern_file_path}' couldn't be parsed with {e}, using default of none"
         )
-        ignored_dir_patterns = []
-
-    merged_cancer_sources: dict[str: list[str]] = {}
-    for root, _, files in os.walk(root_directory):
-        for file in files:
-            file_path: str = os.path.join(root, file)
-            matching_ignored_file_patterns = [
-                ignored_file_pattern
-                for ignored_file_pattern in ignored_file_patterns
-                if fnmatch.fnmatch(file, ignored_file_pattern)
-            ]
-            plural = "s" if len(matching_ignored_file_patterns) > 1 else ""
-            if matching_ignored_file_patterns:
-                logger.debug(
-                    f"skipping {file_path} because it matched ignored file pattern{plural}: {matching_ignored_file_patterns}"
-                )
-                continue
-            matching_ignored_dir_patterns = [
-                ignored_dir_pattern
-                for ignored_dir_pattern in ignored_dir_patterns
-                if fnmatch.fnmatch(file_path, ignored_dir_pattern)
-            ]
-            if matching_ignored_dir_patterns:
-                logger.debug(
-                    f"""\
-                    skipping {file_path} because it matched ignored dir \
-                    pattern{'s' if len(matching_ignored_dir_patterns) > 1 else ''}: \
-                    {matching_ignored_dir_patterns}\
-                    """
-                )
-                continue
-            # Split the path to extract directory levels
-            path_components = file_path.split(os.sep)
-
-            # Assign variables from the lowest level (nearest the data file) up to the highest known level
-            gene_or_protein_name = path_components[-2]
-            cancer_type = path_components[-3]
-            source_database = path_components[-4]
-            is_gene = path_components[-5].lower().find("gene") != -1
-            gene_or_protein_expression = "gene" if is_gene else "protein"
-            name_string = f"starting {gene_or_protein_expression} with name: {gene_or_protein_name}"
-            logger.info(
-                f"{name_string}, cancer type: {cancer_type}, source: {source_database}"
+        return []
+
+
+def leaves_for_file(data_file: walker.DataFile, genes: list[str] = None) -> list[Leaf]:
+    """
+    Returns the leaves of a data.json or data.txt, one per gene (of 'genes') for a wide export.
+    """
+    file_genes = []
+    if data_file.name == "data.txt":
+        file_genes = oncodb_to_csv.expression_genes(oncodb_to_csv.read_header(data_file.file_path))
+    if len(file_genes) > 1 and data_file.folder not in file_genes:
+        # the file is one level up so every path field moves up one folder
+        return [
+            Leaf(
+                file_path=data_file.file_path,
+                gene_or_protein=gene,
+                cancer_type=data_file.folder,
+                source_database=data_file.cancer_type,
+                is_gene=data_file.source_database.lower().find("gene") != -1,
+                gene_column=gene,
+                wide=True,
             )
+            for gene in file_genes
+            if genes is None or gene in genes
+        ]
+    return [
+        Leaf(
+            file_path=data_file.file_path,
+            gene_or_protein=data_file.folder,
+            cancer_type=data_file.cancer_type,
+            source_database=data_file.source_database,
+            is_gene=data_file.is_gene,
+            gene_column=data_file.folder if data_file.folder in file_genes else None,
+        )
+    ]
 
-            if file == "data.json":
-                process_json(
-                    file_path=file_path,
-                    config=config,
-                    cancer_type=cancer_type,
-                    is_gene=is_gene,
-                    gene_or_protein=gene_or_protein_name
-                )
-                count_json += 1
-            elif file == "data.txt":
-                process_txt(
-                    file_path=file_path,
-                    config=config,
-                    cancer_type=cancer_type,
-                    is_gene=is_gene,
-                    gene_or_protein=gene_or_protein_name
-                )
-                count_txt += 1
 
-            if file == "data.csv":
-                dest = os.sep.join(path_components[0:-2])
-                prev = merged_cancer_sources.get(dest, [])
-                prev.append(file_path)
-                merged_cancer_sources.update({dest: prev})
+def is_standalone_data(file_path: str, output_folders: set[str]) -> bool:
+    """
+    Whether a data.csv or data.jbin is data of its own rather than the output of a data.json or data.txt.
+    """
+    folder = os.path.dirname(file_path)
+    if folder in output_folders:
+        return False
+    return not any(os.path.exists(os.path.join(folder, name)) for name in walker.SOURCE_FILE_NAMES)
+
+
+def find_leaves(
+    root_directory: str, ignored_file_patterns: list[str], ignored_dir_patterns: list[str], genes: list[str] = None
+) -> tuple[list[Leaf], dict[str, list[str]]]:
+    """
+    Walks 'root_directory' for leaves, returns them in a stable order with the inputs of each merged plot.
+    """
+    matcher = walker.IgnoreMatcher(ignored_dir_patterns + ignored_file_patterns)
+    leaves: list[Leaf] = []
+    merged_cancer_sources: dict[str, list[str]] = {}
+    output_folders: set[str] = set()
+    for data_file in walker.walk_data_files(root_directory, matcher):
+        if data_file.name in intermediate.FILE_NAMES:
+            if is_standalone_data(data_file.file_path, output_folders):
+                add_merged_input(merged_cancer_sources, data_file.file_path)
+                output_folders.add(os.path.dirname(data_file.file_path))
+            continue
+        for leaf in leaves_for_file(data_file, genes):
+            gene_or_protein_expression = "gene" if leaf.is_gene else "protein"
+            name_string = f"starting {gene_or_protein_expression} with name: {leaf.gene_or_protein}"
+            logger.info(
+                f"{name_string}, cancer type: {leaf.cancer_type}, source: {leaf.source_database}"
+            )
+            leaves.append(leaf)
+            add_merged_input(merged_cancer_sources, leaf.data_path)
+            output_folders.add(os.path.dirname(leaf.data_path))
+    return leaves, merged_cancer_sources
+
+
+def output_folders(leaves: list[Leaf]) -> set[str]:
+    """The folders 'leaves' are converted into, including the '<gene>' folders of wide exports."""
+    return {os.path.dirname(leaf.output_path("csv")) for leaf in leaves}
+
+
+class BuildOptions(NamedTuple):
+    """The options of a run of process_files or merge_shards, most of them given on the command line."""
+
+    jobs: int = 1
+    # rebuild everything, whatever the build cache says
+    force: bool = False
+    write_csv: bool = True
+    # only the leaves of these genes when set
+    genes: list[str] = None
+    aggregate_layout: str = "wide"
+    aggregate_formats: list[str] = aggregate.DEFAULT_FORMATS
+    dataset_cache_mb: float = dataset_cache.DEFAULT_BUDGET_MB
+    # where to write the Chrome trace when timing every stage, 'cprofile' also writes a .prof beside it
+    profile: str = None
+    cprofile: bool = False
+    # replace the config's when they aren't None
+    render_profile: str = None
+    atlas: bool = None
+    gene_plots: bool = None
+    stats: bool = None
+    # more configs by name to draw every plot with, each into '<root>/themes/<name>'
+    themes: dict[str, schema_model.Model] = None
+    # what the leaves are converted into, 'csv' or 'binary', see intermediate
+    data_format: str = "csv"
+
+
+def run_plan(
+    plan: build_plan.BuildPlan,
+    config: schema_model.Model,
+    options: BuildOptions = BuildOptions(),
+    aggregate_writer: aggregate.AggregateWriter = None,
+) -> tuple[list[bool], int, list[str]]:
+    # the aggregate only replaces the previous one when every task succeeded
+    unit = functools.partial(process_unit, config=config, write_csv=options.write_csv)
+    merged = functools.partial(process_merged, config=config)
+    try:
+        if options.jobs > 1:
+            completed, count_cancer, failures = scheduler.run_parallel(
+                plan.tasks,
+                plan.merged_cancer_sources,
+                unit,
+                merged,
+                options.jobs,
+                aggregate_writer,
+                options.dataset_cache_mb,
+                plan.targets,
+            )
+        else:
+            completed, count_cancer, failures = scheduler.run_serial(
+                plan.tasks, plan.merged_cancer_sources, unit, merged, aggregate_writer, plan.targets
+            )
+    except BaseException:
+        if aggregate_writer is not None:
+            aggregate_writer.abort()
+        raise
+    if aggregate_writer is not None:
+        if failures:
+            aggregate_writer.abort()
+        else:
+            aggregate_writer.close()
+    return completed, count_cancer, failures
+
+
+def override_config(
+    config: schema_model.Model,
+    render_profile: str = None,
+    atlas: bool = None,
+    gene_plots: bool = None,
+    stats: bool = None,
+) -> schema_model.Model:
+    """
+    Returns a copy of 'config' with the fields given on the command line replaced, None leaves a field as is.
+    """
+    overrides = {"render_profile": render_profile or None, "atlas": atlas, "gene_plots": gene_plots, "stats": stats}
+    return {**config, **{field: value for field, value in overrides.items() if value is not None}}
+
+
+def new_aggregate_writer(
+    root_directory: str,
+    plan: build_plan.BuildPlan,
+    aggregate_layout: str = "wide",
+    aggregate_formats: list[str] = aggregate.DEFAULT_FORMATS,
+    shard: shards.Shard = None,
+    config: schema_model.Model = None,
+) -> aggregate.AggregateWriter:
+    """
+    Returns the writer of the aggregate, or of the shard's partial aggregate, None when it is up to date.
+    """
+    if plan.aggregate_fresh:
+        return None
+    if shard is not None:
+        # written even without any leaves, merge_shards needs every shard's manifest
+        leaf_keys = [shards.relative_key(root_directory, leaf.key) for leaf, _ in plan.tasks]
+        return shards.PartialAggregateWriter(root_directory, shard, leaf_keys)
+    if not plan.tasks:
+        return None
+    writer = aggregate.AggregateWriter(root_directory, aggregate_layout, aggregate_formats)
+    if config is not None and config.get("stats", False):
+        is_gene = [leaf.is_gene for leaf, _ in plan.tasks]
+        return significance.StatsWriter(root_directory, config, is_gene, writer, translate_in_mapping)
+    return writer
+
+
+def configure(options: BuildOptions) -> None:
+    cprofile_path = f"{os.path.splitext(options.profile)[0]}.prof" if options.profile and options.cprofile else None
+    profiling.configure(bool(options.profile), cprofile_path)
+    if cprofile_path:
+        profiling.remove_worker_profiles(cprofile_path)
+    dataset_cache.configure(options.dataset_cache_mb)
+    intermediate.configure(options.data_format)
+    # the cache and exporter outlive a run when called repeatedly, their counters are reported per run
+    dataset_cache.default_cache.take_counters()
+    plot_data.default_exporter.take_counters()
+
+
+def process_files(
+    root_directory: str = ".",
+    options: BuildOptions = BuildOptions(),
+    config: schema_model.Model = None,
+    shard: shards.Shard = None,
+) -> list[Leaf]:
+    """
+    Converts and plots whatever is out of date under 'root_directory', returns every leaf found (the shard's with a 'shard').
+    """
+    configure(options)
+    if config is None:
+        config = load_config(local_or_default("config.json"))
+    config = override_config(config, options.render_profile, options.atlas, options.gene_plots, options.stats)
+    theme_list = [
+        theming.new_theme(
+            root_directory, name, override_config(theme_config, options.render_profile, options.atlas, options.gene_plots)
+        )
+        for name, theme_config in (options.themes or {}).items()
+    ]
+    image_formats = plot_data.render_profile(config)["formats"]
+    ignored_file_patterns = load_patterns(local_or_default(".fileignore"))
+    ignored_dir_patterns = load_patterns(local_or_default(".dirignore"))
+
+    with profiling.span("walk"):
+        leaves, merged_cancer_sources = find_leaves(root_directory, ignored_file_patterns, ignored_dir_patterns, options.genes)
+    aggregate_layout, aggregate_formats = options.aggregate_layout, options.aggregate_formats
+    if shard is not None:
+        leaves = shards.select_leaves(root_directory, leaves, shard)
+        logger.info(f"shard {shard.number}/{shard.count} has {len(leaves)} leaves")
+        # merged plots need the leaves of every shard, the partial aggregate is always long CSV
+        merged_cancer_sources = {}
+        aggregate_layout, aggregate_formats = "long", ["csv"]
+        aggregate_outputs = shards.partial_paths(root_directory, shard)
+    else:
+        aggregate_outputs = aggregate.output_paths(root_directory, aggregate_formats)
+        if config.get("stats", False):
+            aggregate_outputs.append(significance.output_path(root_directory))
+
+    cache = build_cache.BuildCache(root_directory, config, force=options.force, file_name=shards.cache_file_name(shard))
+    with profiling.span("plan"):
+        theme_plans = [
+            theming.plan_theme(
+                theme,
+                build_cache.BuildCache(
+                    root_directory,
+                    theme.config,
+                    force=options.force,
+                    file_name=theming.cache_file_name(theme, shards.cache_file_name(shard)),
+                ),
+                leaves,
+                merged_cancer_sources,
+            )
+            for theme in theme_list
+        ]
+        plan = build_plan.plan_build(
+            cache,
+            root_directory,
+            leaves,
+            merged_cancer_sources,
+            options.write_csv,
+            aggregate_layout,
+            aggregate_formats,
+            image_formats,
+            config.get("gene_plots", True),
+            config.get("atlas", False),
+            aggregate_outputs,
+            theme_plans,
+            theming.Theme("", config),
+        )
+    logger.info(cache.report())
+    for theme_plan in theme_plans:
+        logger.info(f"theme {theme_plan.theme.name} {theme_plan.cache.report()}")
+    aggregate_writer = new_aggregate_writer(root_directory, plan, aggregate_layout, aggregate_formats, shard, config)
+
+    rebuilt_files = {leaf.file_path for leaf, rebuild in plan.tasks if rebuild}
+    count_json = sum(1 for file_path in rebuilt_files if file_path.endswith(".json"))
+    count_txt = len(rebuilt_files) - count_json
+    logger.info(f"processing {len(plan.tasks)} leaves with {options.jobs} job{'s' if options.jobs > 1 else ''}")
+    completed, count_cancer, failures = run_plan(plan, config, options, aggregate_writer)
     logger.success(
         f"processing {count_json} JSON files and {count_txt} TXT files"
     )
-    if all_data:
-        global_df = pd.concat(all_data, axis=1)
-        # Save the concatenated DataFrame to a CSV file
-        global_df.to_csv(root_directory+'/all_csv_data.csv', index=False)
-        global_df.to_excel(root_directory+'/all_csv_data.xlsx', index=False, engine='openpyxl')
-    count_cancer = 0
-    for source in merged_cancer_sources:
-        cancer_type = source.split(os.sep)[-1]
-        source_database = source.split(os.sep)[-2]
-        is_gene = source.split(os.sep)[-3].lower().find("gene") != -1
-        gene_or_protein_expression = "gene" if is_gene else "protein"
-        logger.info(
-            f"starting {gene_or_protein_expression}s for: {cancer_type}, from source: {source_database}"
-        )
-        plot_data.plot_formatted_csvs(
-            config=config,
-            inputs=merged_cancer_sources[source],
-            output=f"{source}/merged.png",
-            translation_func=translate_in_mapping,
-            cancer_type=source.split(os.sep)[-1],
-            is_gene=source.split(os.sep)[-3].lower().find("gene") != -1,
-        )
-        count_cancer += 1
     logger.success(
         f"finished processing {count_cancer} cancer combinations"
     )
+    if plot_data.default_exporter.exported:
+        logger.info(plot_data.default_exporter.summary())
+    logger.info(dataset_cache.default_cache.report())
+    build_plan.update_cache(cache, plan, completed, failures)
+    if options.profile:
+        profiling.report(options.profile)
+    if failures:
+        raise RuntimeError(f"{len(failures)} task(s) failed: {sorted(failures)}")
+    return leaves
+
+
+def merge_shards(
+    root_directory: str = ".", options: BuildOptions = BuildOptions(), config: schema_model.Model = None
+) -> None:
+    """
+    Combines the partial aggregates of every '--shard i/N' run into all_csv_data and draws the merged plots.
+    """
+    config = override_config(
+        config or load_config(local_or_default("config.json")), options.render_profile, options.atlas, stats=options.stats
+    )
+    merged_themes = None
+    if options.themes:
+        merged_themes = [theming.Theme("", config)] + [
+            theming.new_theme(root_directory, name, override_config(theme_config, options.render_profile, options.atlas))
+            for name, theme_config in options.themes.items()
+        ]
+    ignored_file_patterns = load_patterns(local_or_default(".fileignore"))
+    ignored_dir_patterns = load_patterns(local_or_default(".dirignore"))
+    leaves, merged_cancer_sources = find_leaves(root_directory, ignored_file_patterns, ignored_dir_patterns, options.genes)
+    # taken in the same order as a single run, each dataset comes from its shard's partial
+    tasks = [(leaf, False) for leaf in leaves]
+    results: list[pd.DataFrame] = [None] * len(tasks)
+    pending = scheduler.pending_merged(tasks, merged_cancer_sources)
+    aggregate_writer = aggregate.AggregateWriter(root_directory, options.aggregate_layout, options.aggregate_formats)
+    if config.get("stats", False):
+        is_gene = [leaf.is_gene for leaf in leaves]
+        aggregate_writer = significance.StatsWriter(root_directory, config, is_gene, aggregate_writer, translate_in_mapping)
+
+    def plot_merged(source: str) -> None:
+        inputs = merged_cancer_sources[source]
+        process_merged(source, inputs, config, scheduler.merged_datasets(inputs, tasks, results), merged_themes)
+        scheduler.release_merged(source, tasks, results)
+
+    try:
+        for source, count in pending.items():
+            if count == 0:
+                plot_merged(source)
+        leaf_keys = [shards.relative_key(root_directory, leaf.key) for leaf in leaves]
+        for index, dataset in shards.merge_partials(root_directory, leaf_keys):
+            source = scheduler.collect_result(index, dataset, tasks, results, pending, aggregate_writer)
+            if source is not None:
+                plot_merged(source)
+    except BaseException:
+        aggregate_writer.abort()
+        raise
+    aggregate_writer.close()
+    logger.success(f"merged {len(leaves)} leaves and drew {len(merged_cancer_sources)} merged plots")
+
+
+def binary_to_csv(paths: list[str]) -> int:
+    """
+    Writes a data.csv beside every data.jbin in or under 'paths', returns how many were written.
+    """
+    matcher = walker.IgnoreMatcher(
+        load_patterns(local_or_default(".dirignore")) + load_patterns(local_or_default(".fileignore"))
+    )
+    count = 0
+    for path in paths:
+        if not os.path.isdir(path):
+            intermediate.binary_to_csv(path)
+            count += 1
+            continue
+        for data_file in walker.walk_data_files(path, matcher, names=("data.jbin",)):
+            intermediate.binary_to_csv(data_file.file_path)
+            count += 1
+    logger.success(f"wrote {count} CSV files")
+    return count
 
 
 # Assumed structure:
@@ -306,12 +848,10 @@ def process_files(root_directory: str = ".") -> None:  # noqa: C901
 
 
 def main():
-    with logger.catch(onerror=lambda _: sys.exit(1)):
-        logger.remove(0)
-        logger.add(sys.stdout, level="INFO")
-        logger.success("Starting jeddinformatics.")
-        logger.add("jeddinformatics.log", retention="5 minute", level="DEBUG")
-        process_files(sys.argv[1]) if len(sys.argv) > 1 else process_files()
+    # kept so existing callers of convert_and_plot.main keep working, the CLI lives in cli.py
+    from jeddinformatics import cli
+
+    cli.main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+import os
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+import pandas as pd
+
+DEFAULT_BUDGET_MB = 256
+
+
+class CacheEntry(NamedTuple):
+    signature: tuple[int, int]
+    dataset: pd.DataFrame
+    size: int
+
+
+def file_signature(path: str) -> tuple[int, int]:
+    """
+    Returns the modification time and size of 'path', a dataset cached against a different signature is stale.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def dataset_size(dataset: pd.DataFrame) -> int:
+    return int(dataset.memory_usage(index=True, deep=True).sum())
+
+
+class DatasetCache:
+    """
+    Parsed datasets kept in memory by the file they came from, so a file is only parsed again once it changes.
+
+    Entries are keyed by path (or by an explicit key when one file holds several datasets, like a wide
+    OncoDB export) and are only used while the file's modification time and size are unchanged. The least
+    recently used entries are evicted once the datasets add up to more than 'budget' bytes, a budget of 0
+    turns the cache off.
+
+    Cached datasets are shared between everything that asks for them so they must not be modified in place.
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET_MB << 20):
+        self.budget = budget
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, path: str, key: str = None) -> pd.DataFrame:
+        """
+        Returns the dataset cached for 'path', None when it isn't cached or is stale. Counts as a hit or a miss.
+        """
+        entry = self.entries.get(key or path)
+        if entry is not None and entry.signature == file_signature(path):
+            self.entries.move_to_end(key or path)
+            self.hits += 1
+            return entry.dataset
+        self.misses += 1
+        return None
+
+    def get(self, path: str, load: Callable[[], pd.DataFrame], key: str = None) -> pd.DataFrame:
+        """
+        Returns the dataset cached for 'path', calling 'load' to parse it when it isn't cached or is stale.
+        """
+        dataset = self.lookup(path, key)
+        if dataset is not None:
+            return dataset
+        # taken before loading, a file that changes while it's parsed is parsed again next time
+        signature = file_signature(path)
+        dataset = load()
+        self._store(key or path, signature, dataset)
+        return dataset
+
+    def put(self, path: str, dataset: pd.DataFrame, key: str = None) -> None:
+        """
+        Caches a dataset that was just parsed from or written to 'path'.
+        """
+        if dataset is None or not os.path.exists(path):
+            return
+        self._store(key or path, file_signature(path), dataset)
+
+    def _store(self, key: str, signature: tuple[int, int], dataset: pd.DataFrame) -> None:
+        self._drop(key)
+        if dataset is None or self.budget <= 0:
+            return
+        size = dataset_size(dataset)
+        if size > self.budget:
+            return
+        self.entries[key] = CacheEntry(signature, dataset, size)
+        self.bytes += size
+        while self.bytes > self.budget:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+    def take_counters(self) -> dict[str, int]:
+        """
+        Returns the hit, miss and eviction counts and resets them, used to hand a worker's counts to the parent.
+        """
+        counters = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+        self.hits = self.misses = self.evictions = 0
+        return counters
+
+    def add_counters(self, counters: dict[str, int]) -> None:
+        self.hits += counters.get("hits", 0)
+        self.misses += counters.get("misses", 0)
+        self.evictions += counters.get("evictions", 0)
+
+    def report(self) -> str:
+        return (
+            f"dataset cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+            f"holding {len(self.entries)} datasets in {self.bytes / (1 << 20):.1f} of {self.budget / (1 << 20):.1f} MB"
+        )
+
+
+default_cache = DatasetCache()
+
+
+def configure(budget_mb: float = DEFAULT_BUDGET_MB) -> None:
+    """
+    Sets the budget of this process's default cache, also used as the initializer of pool workers.
+    """
+    default_cache.budget = int(budget_mb * (1 << 20))
+    if default_cache.bytes > default_cache.budget:
+        default_cache.clear()
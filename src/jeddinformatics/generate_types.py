@@ -1,16 +1,102 @@
-from datamodel_code_generator import InputFileType, generate
+import os
+import sys
+import hashlib
+import importlib.util
+from types import ModuleType
 from pathlib import Path
+from loguru import logger
+
+# first line of every generated model, lets a stale model be spotted without importing anything heavy
+HASH_PREFIX = "# schema-sha256: "
+
+
+def schema_hash(schema_filename: str = "./schema.json") -> str:
+    with open(schema_filename, "rb") as schema_file:
+        return hashlib.sha256(schema_file.read()).hexdigest()
+
+
+def generated_hash(model_filename: str = "./schema_model.py") -> str:
+    """
+    Returns the schema hash a model was generated from, None if it doesn't exist or wasn't stamped.
+    """
+    try:
+        with open(model_filename, "r") as model_file:
+            first_line = model_file.readline().strip()
+    except OSError:
+        return None
+    if not first_line.startswith(HASH_PREFIX):
+        return None
+    return first_line[len(HASH_PREFIX):]
 
 
 def generate_models_from_schema(
     schema_filename: str = "./schema.json", output_filename: str = "./schema_model.py"
 ):
+    # datamodel-code-generator is slow to import so only pay for it when something actually has to be generated
+    from datamodel_code_generator import InputFileType, generate
+
     schema_path = Path(schema_filename)
     output_path = Path(output_filename)
+    temporary_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+
+    try:
+        # without a timestamp the model only changes when the schema does
+        generate(
+            input_=schema_path, input_file_type=InputFileType.JsonSchema, output=temporary_path, disable_timestamp=True
+        )
+        generated = temporary_path.read_text()
+        temporary_path.write_text(f"{HASH_PREFIX}{schema_hash(schema_filename)}\n{generated}")
+        os.replace(temporary_path, output_path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
+def cache_directory() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "jeddinformatics")
+
+
+def import_model(model_filename: str, module_name: str, reuse: bool = True) -> ModuleType:
+    """
+    Imports 'model_filename' as 'module_name', reusing an already imported copy of the same file when 'reuse' is set.
+    """
+    module = sys.modules.get(module_name)
+    if reuse and module is not None and os.path.abspath(module.__file__) == os.path.abspath(model_filename):
+        return module
+    spec = importlib.util.spec_from_file_location(module_name, model_filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_schema_model(
+    schema_filename: str = "./schema.json",
+    model_filename: str = "./schema_model.py",
+    module_name: str = "jeddinformatics.schema_model",
+) -> ModuleType:
+    """
+    Imports the model generated from 'schema_filename', regenerating it only when the schema's hash has changed.
 
-    generate(
-        input_=schema_path, input_file_type=InputFileType.JsonSchema, output=output_path
-    )
+    The model is kept at 'model_filename' (normally inside the package). If that can't be written, e.g. on
+    a read-only install, it is generated into the user's cache directory instead and imported from there.
+    """
+    current_hash = schema_hash(schema_filename)
+    if generated_hash(model_filename) == current_hash:
+        return import_model(model_filename, module_name)
+    cached_filename = os.path.join(cache_directory(), f"schema_model_{current_hash[:16]}.py")
+    if generated_hash(cached_filename) == current_hash:
+        return import_model(cached_filename, module_name)
+    try:
+        logger.info(f"schema '{schema_filename}' changed, regenerating '{model_filename}'")
+        generate_models_from_schema(schema_filename, model_filename)
+        return import_model(model_filename, module_name, reuse=False)
+    except OSError as e:
+        logger.warning(f"couldn't write '{model_filename}' with {e}, using '{cached_filename}' instead")
+    os.makedirs(cache_directory(), exist_ok=True)
+    generate_models_from_schema(schema_filename, cached_filename)
+    return import_model(cached_filename, module_name, reuse=False)
 
 
 if __name__ == "__main__":
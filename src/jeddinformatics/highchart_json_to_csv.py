@@ -1,27 +1,244 @@
+import re
 import json
-import csv
 import sys
+from array import array
+from typing import IO, Iterator
 from loguru import logger
+import numpy as np
+import pandas as pd
+from jeddinformatics import intermediate
+from jeddinformatics import profiling
 
+WHITESPACE = re.compile(r"\s*")
+# the rest of the buffer after a number is only more of that number
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
 
-def convert_highchart_to_csv(input: str = "data.json", output: str = "data.csv"):
-    # Load the Highcharts configuration from a JSON file
+
+class JsonStream:
+    """
+    Incremental reader over a JSON text file.
+
+    Objects and arrays can be walked a member at a time with items and elements, while value decodes
+    the next whole value with the C decoder. Only the value being decoded has to fit in the buffer, so
+    walking a document holds one member in memory rather than the whole document.
+    """
+
+    def __init__(self, file: IO[str], chunk_size: int = 1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self, size: int) -> bool:
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it, "" at the end of the file.
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more(self.chunk_size):
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected '{char}' but found '{found}' in {getattr(self.file, 'name', 'JSON')}")
+        self.position += 1
+
+    def value(self) -> object:
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.read_more(size):
+                    raise
+                # grow geometrically so a large value isn't re-parsed once per chunk
+                size *= 2
+                continue
+            # a number that reaches the end of the buffer (e.g. "1" of "1.5e3") may have been cut short
+            if self.cut_short(value, end) and self.read_more(size):
+                continue
+            self.position = end
+            return value
+
+    def cut_short(self, value: object, end: int) -> bool:
+        return not self.eof and isinstance(value, (int, float)) and NUMBER_TAIL.match(self.buffer, end) is not None
+
+    def members(self, opening: str, closing: str) -> Iterator[None]:
+        self.expect(opening)
+        first = True
+        while True:
+            char = self.peek()
+            if char == closing:
+                self.position += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            yield
+
+    def items(self) -> Iterator[str]:
+        """
+        Yields the keys of an object, the caller must consume each member's value before asking for the next key.
+        """
+        for _ in self.members("{", "}"):
+            key = self.value()
+            self.expect(":")
+            yield key
+
+    def elements(self) -> Iterator[int]:
+        """
+        Yields the index of each element of an array, the caller must consume the element before the next one.
+        """
+        for index, _ in enumerate(self.members("[", "]")):
+            yield index
+
+
+def point_value(point: object) -> float:
+    # Highcharts points are {"y": ...} objects, [x, y] pairs or bare y values
+    if isinstance(point, dict):
+        point = point.get("y")
+    elif isinstance(point, list):
+        point = point[-1] if point else None
+    return np.nan if point is None else point
+
+
+def buffered_points(stream: JsonStream) -> list:
+    """
+    Decodes every complete point already in the buffer with a single C decoder call, None if that isn't possible.
+
+    The buffer is cut after its last '},' (or '],' or ',' for pairs and bare values) and parsed as an array.
+    A cut that lands inside a point can't parse, so a successful parse always ends on a point boundary.
+    """
+    buffer, position = stream.buffer, stream.position
+    for separator in ("},", "],", ","):
+        cut = buffer.rfind(separator, position)
+        if cut != -1:
+            break
+    else:
+        return None
+    end = cut + len(separator) - 1
+    try:
+        points = json.loads(f"[{buffer[position:end]}]")
+    except json.JSONDecodeError:
+        return None
+    stream.position = end + 1
+    return points
+
+
+def read_values(stream: JsonStream, values: array) -> None:
+    """
+    Appends the y value of every point of a data array in 'stream' to 'values'.
+
+    Whole buffers of points are decoded at once where possible, points that can't be (e.g. ones with
+    nested objects) are decoded one at a time.
+    """
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.position += 1
+        return
+    failed_bulk = 0
+    while True:
+        # a partial point at the end of the buffer fails once, points that always fail stop being tried
+        points = buffered_points(stream) if failed_bulk < 2 else None
+        if points is not None:
+            failed_bulk = 0
+            values.extend(map(point_value, points))
+            stream.peek()
+            continue
+        failed_bulk += 1
+        values.append(point_value(stream.value()))
+        char = stream.peek()
+        stream.position += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"expected ',' or ']' but found '{char}' in {getattr(stream.file, 'name', 'JSON')}")
+
+
+def read_series(stream: JsonStream) -> tuple[str, np.ndarray]:
+    """
+    Reads one series object from 'stream' a point at a time, straight into a float64 array.
+    """
+    name = None
+    values = array("d")
+    for key in stream.items():
+        if key == "name":
+            name = stream.value()
+        elif key == "data":
+            read_values(stream, values)
+        else:
+            stream.value()
+    return name, np.frombuffer(values, dtype="float64")
+
+
+def iter_highchart_series(input: str = "data.json") -> Iterator[tuple[str, np.ndarray]]:
+    """
+    Yields the name and float64 values of each scatter series (every series after the first) of a Highcharts config.
+
+    The file is walked incrementally, so at most one series' values are held at a time.
+    """
     with open(input, "r") as file:
-        highcharts_config = json.load(file)
+        stream = JsonStream(file)
+        for key in stream.items():
+            if key != "series":
+                # chart options other than the series are small, decode and drop them
+                stream.value()
+                continue
+            for index in stream.elements():
+                # the first series is the box plot, assume all remaining series are scatter data
+                if index == 0:
+                    stream.value()
+                    continue
+                name, values = read_series(stream)
+                if name is None:
+                    raise ValueError(f"series {index} has no 'name' in {input}")
+                yield name, values
+
 
-    # Extract scatter data (assume all remaining series are scatter data)
-    scatter_data = []
-    for series in highcharts_config["series"][1:]:
-        for point in series["data"]:
-            scatter_data.append([series["name"], point["y"]])
+def read_highchart(input: str = "data.json") -> pd.DataFrame:
+    """
+    Reads a Highcharts config into a dataset with a 'Series Name' and a 'Y' column.
+    """
+    with profiling.span("parse", file=input):
+        names = []
+        values = []
+        for name, series_values in iter_highchart_series(input):
+            names.append(name)
+            values.append(series_values)
+        categories = list(dict.fromkeys(names))
+        codes = np.repeat([categories.index(name) for name in names], [len(series) for series in values])
+        dataset = pd.DataFrame(
+            {
+                "Series Name": pd.Categorical.from_codes(codes.astype("int32"), categories=categories),
+                "Y": np.concatenate(values) if values else np.empty(0, dtype="float64"),
+            }
+        )
+    logger.debug(f"read {len(dataset)} points from {input}")
+    return dataset
 
-    # Write scatter data to CSV
-    with open(output, "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["Series Name", "Y"])
-        writer.writerows(scatter_data)
 
+def convert_highchart_to_csv(input: str = "data.json", output: str = "data.csv") -> pd.DataFrame:
+    dataset = read_highchart(input)
+    # Write scatter data to CSV, or to a data.jbin (see intermediate)
+    with profiling.span("convert", file=output):
+        intermediate.write_dataset(dataset, output)
     logger.debug(f"wrote {output} from {input}")
+    return dataset
 
 
 # Running the main function
@@ -0,0 +1,283 @@
+import os
+import json
+import mmap
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from loguru import logger
+from jeddinformatics import profiling
+
+# the data file a leaf is converted into, by the name of its format
+FORMATS = {"csv": "csv", "binary": "jbin"}
+FILE_NAMES = tuple(f"data.{extension}" for extension in FORMATS.values())
+MAGIC = b"JEDDBIN\x01"
+VERSION = 1
+# the magic, the header length and padding up to ALIGNMENT
+PREFIX_SIZE = 16
+ALIGNMENT = 8
+
+_extension = FORMATS["csv"]
+
+
+def configure(data_format: str = "csv") -> None:
+    """
+    Sets the format leaves are converted into in this process, 'csv' or 'binary'.
+
+    Like the dataset cache it is per process, pool workers set it again from init_worker.
+    """
+    global _extension
+    _extension = FORMATS[data_format]
+
+
+def extension() -> str:
+    return _extension
+
+
+def data_format() -> str:
+    return next(name for name, format_extension in FORMATS.items() if format_extension == _extension)
+
+
+def is_binary(path: str) -> bool:
+    return path.endswith(f".{FORMATS['binary']}")
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def path_metadata(path: str) -> dict[str, str]:
+    # the same folders the walker reads the leaf's fields from
+    components = [""] * 5 + os.path.normpath(os.path.abspath(path)).split(os.sep)
+    return {"gene": components[-2], "cancer": components[-3], "source": components[-4], "expression": components[-5]}
+
+
+def encode_series(series: pd.Series) -> tuple[np.ndarray, list[str]]:
+    """
+    Returns the codes and labels of a 'Series Name' column, missing names get the code -1.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, labels = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, labels = pd.factorize(series, sort=False)
+    labels = [str(label) for label in labels]
+    return codes.astype(code_dtype(len(labels))), labels
+
+
+def code_dtype(labels: int) -> str:
+    # the smallest integer that holds every code and -1
+    for dtype in ("<i1", "<i2", "<i4"):
+        if labels < np.iinfo(dtype).max:
+            return dtype
+    return "<i8"
+
+
+def write_prefix(file, header: dict) -> int:
+    """
+    Writes the magic, the header and the padding up to the codes, returns the offset the codes start at.
+    """
+    encoded = json.dumps(header).encode("utf-8")
+    codes_offset = aligned(PREFIX_SIZE + len(encoded))
+    file.write(MAGIC + len(encoded).to_bytes(4, "little"))
+    file.write(bytes(PREFIX_SIZE - len(MAGIC) - 4))
+    file.write(encoded)
+    file.write(bytes(codes_offset - PREFIX_SIZE - len(encoded)))
+    return codes_offset
+
+
+def write_binary(dataset: pd.DataFrame, path: str, metadata: dict = None) -> None:
+    """
+    Writes 'dataset' to 'path' as a header with the series labels and 'metadata' (the gene, cancer type and source
+    from the path unless given), followed by the label code of every row and then every value as float64.
+
+    Both arrays start on an 8 byte boundary so read_binary can map them straight out of the file. The file is
+    written beside 'path' and renamed over it, a reader with the old file mapped keeps seeing the old file.
+    """
+    codes, labels = encode_series(dataset.iloc[:, 0])
+    values = pd.to_numeric(dataset.iloc[:, 1], errors="coerce").to_numpy(dtype="<f8")
+    header = {
+        "version": VERSION,
+        "rows": len(values),
+        "codes": codes.dtype.str,
+        "labels": labels,
+        "columns": [str(column) for column in dataset.columns[:2]],
+        **(metadata if metadata is not None else path_metadata(path)),
+    }
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        codes_offset = write_prefix(file, header)
+        values_offset = aligned(codes_offset + codes.nbytes)
+        file.write(codes.tobytes())
+        file.write(bytes(values_offset - codes_offset - codes.nbytes))
+        file.write(values.tobytes())
+    os.replace(temporary, path)
+
+
+class DatasetWriter:
+    """
+    Writes a dataset to 'path' one chunk at a time, in the format its extension names like write_dataset, so a
+    conversion only ever holds a chunk.
+
+    The output is written beside 'path' and renamed over it on close, abort (or leaving a with block with an
+    exception) removes it and leaves 'path' as it was. A binary dataset's codes and values are spooled to
+    temporary files until the labels are all known, the header that lists them comes first in the file.
+    """
+
+    def __init__(self, path: str, metadata: dict = None):
+        self.path = path
+        self.metadata = metadata
+        self.temporary = f"{path}.tmp"
+        self.rows = 0
+        self.columns = None
+        self.binary = is_binary(path)
+        if self.binary:
+            self.labels: dict[str, int] = {}
+            self.codes_file = tempfile.TemporaryFile()
+            self.values_file = tempfile.TemporaryFile()
+        else:
+            self.file = open(self.temporary, "w", newline="")
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = [str(column) for column in chunk.columns[:2]]
+            if not self.binary:
+                chunk.iloc[:0, :2].to_csv(self.file, index=False)
+        self.rows += len(chunk)
+        if not self.binary:
+            chunk.iloc[:, :2].to_csv(self.file, index=False, header=False)
+            return
+        codes, labels = encode_series(chunk.iloc[:, 0])
+        # the chunk's codes into codes of every label so far, -1 (missing) indexes the -1 on the end
+        mapping = np.array([self.labels.setdefault(label, len(self.labels)) for label in labels] + [-1], dtype="<i8")
+        self.codes_file.write(mapping[codes].tobytes())
+        self.values_file.write(pd.to_numeric(chunk.iloc[:, 1], errors="coerce").to_numpy(dtype="<f8").tobytes())
+
+    def close(self) -> int:
+        """
+        Finishes the file and moves it over 'path', returns the number of rows written.
+        """
+        if self.columns is None:
+            self.columns = ["Series Name", "Y"]
+            if not self.binary:
+                self.file.write(",".join(self.columns) + "\n")
+        if self.binary:
+            self.write_binary()
+        else:
+            self.file.close()
+        os.replace(self.temporary, self.path)
+        return self.rows
+
+    def write_binary(self) -> None:
+        dtype = code_dtype(len(self.labels))
+        header = {
+            "version": VERSION,
+            "rows": self.rows,
+            "codes": np.dtype(dtype).str,
+            "labels": list(self.labels),
+            "columns": self.columns,
+            **(self.metadata if self.metadata is not None else path_metadata(self.path)),
+        }
+        with self.codes_file, self.values_file, open(self.temporary, "wb") as file:
+            codes_offset = write_prefix(file, header)
+            self.codes_file.seek(0)
+            while block := self.codes_file.read(1 << 20):
+                file.write(np.frombuffer(block, dtype="<i8").astype(dtype).tobytes())
+            codes_end = codes_offset + self.rows * np.dtype(dtype).itemsize
+            file.write(bytes(aligned(codes_end) - codes_end))
+            self.values_file.seek(0)
+            shutil.copyfileobj(self.values_file, file)
+
+    def abort(self) -> None:
+        if self.binary:
+            self.codes_file.close()
+            self.values_file.close()
+        else:
+            self.file.close()
+        if os.path.exists(self.temporary):
+            os.remove(self.temporary)
+
+
+def write_chunks(chunks, path: str, metadata: dict = None) -> int:
+    """
+    Writes the datasets 'chunks' yields to 'path' as one dataset through a DatasetWriter, returns the row count.
+    """
+    with DatasetWriter(path, metadata) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.rows
+
+
+def read_header(mapped: mmap.mmap, path: str) -> tuple[dict, int, int]:
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} isn't a binary dataset")
+    length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 4], "little")
+    header = json.loads(mapped[PREFIX_SIZE:PREFIX_SIZE + length].decode("utf-8"))
+    if header.get("version") != VERSION:
+        raise ValueError(f"{path} is version {header.get('version')} of the binary dataset format, expected {VERSION}")
+    codes_offset = aligned(PREFIX_SIZE + length)
+    values_offset = aligned(codes_offset + header["rows"] * np.dtype(header["codes"]).itemsize)
+    return header, codes_offset, values_offset
+
+
+def read_metadata(path: str) -> dict:
+    """
+    Returns the header of a binary dataset without reading its rows.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return read_header(mapped, path)[0]
+
+
+def read_binary(path: str) -> pd.DataFrame:
+    """
+    Maps a file written by write_binary into a dataset with a categorical 'Series Name' and a float64 'Y'.
+
+    'Y' is a read-only view of the mapped file rather than a copy, so a dataset is only read from disk as
+    far as it's used and costs no memory of its own beyond the label codes.
+    """
+    with profiling.span("parse", file=path):
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header, codes_offset, values_offset = read_header(mapped, path)
+        rows = header["rows"]
+        codes = np.frombuffer(mapped, dtype=header["codes"], count=rows, offset=codes_offset)
+        values = np.frombuffer(mapped, dtype="<f8", count=rows, offset=values_offset)
+        name_column, value_column = header.get("columns", ["Series Name", "Y"])
+        return pd.DataFrame(
+            {name_column: pd.Categorical.from_codes(codes, categories=header["labels"]), value_column: values}, copy=False
+        )
+
+
+def write_dataset(dataset: pd.DataFrame, path: str, metadata: dict = None) -> None:
+    """
+    Writes a converted dataset to 'path' in the format its extension names, CSV unless it's binary.
+    """
+    if is_binary(path):
+        write_binary(dataset, path, metadata)
+    else:
+        dataset.to_csv(path, index=False)
+
+
+def read_dataset(path: str) -> pd.DataFrame:
+    if is_binary(path):
+        return read_binary(path)
+    with profiling.span("parse", file=path):
+        return pd.read_csv(path, dtype={"Series Name": "category", "Y": "float64"})
+
+
+def binary_to_csv(path: str, output: str = None) -> str:
+    """
+    Writes the CSV a binary dataset was converted from, beside it unless 'output' is given, returns its path.
+    """
+    output = output or f"{os.path.splitext(path)[0]}.csv"
+    read_binary(path).to_csv(output, index=False)
+    logger.debug(f"wrote {output} from {path}")
+    return output
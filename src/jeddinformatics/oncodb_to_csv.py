@@ -1,32 +1,240 @@
+import os
 import csv
+import contextlib
 import sys
+from typing import Iterator
 from loguru import logger
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from jeddinformatics import intermediate
+from jeddinformatics import profiling
 
+SAMPLE_COLUMN = "Sample"
+EXPRESSION_SUFFIX = "_expression_value"
+# rows parsed at a time, keeps memory bounded on multi-million row exports
+DEFAULT_CHUNKSIZE = 1 << 18
 
-def convert_onco_to_csv(input: str = "data.txt", output: str = "data.csv") -> None:
-    # Open the input file in read mode and the output file in write mode
-    with open(input, "r") as infile, open(output, "w", newline="") as outfile:
-        # Create a CSV reader object to read the tab-separated values
-        reader = csv.reader(infile, delimiter="\t")
 
-        # Create a CSV writer object to write the comma-separated values
-        writer = csv.writer(outfile)
+def read_header(input: str = "data.txt") -> list[str]:
+    with open(input, "r", newline="") as infile:
+        return next(csv.reader(infile, delimiter="\t"), [])
 
-        # Write the header for the output file
-        writer.writerow(["Series Name", "Y"])
 
-        # Skip the header of the input file
-        next(reader)
+def expression_genes(header: list[str]) -> list[str]:
+    """
+    Returns the genes that have a '<gene>_expression_value' column in an OncoDB header, in header order.
+    """
+    return [column[: -len(EXPRESSION_SUFFIX)] for column in header if column.endswith(EXPRESSION_SUFFIX)]
 
-        # Iterate over the rows of the input file
-        for row in reader:
-            # Extract the 'Sample' and 'KPNB1_expression_value' values
-            sample = row[0]
-            expression_value = row[2]
 
-            # Write the extracted values to the output file
-            writer.writerow([sample, expression_value])
-    logger.debug(f"wrote {output} from {input}")
+def find_columns(header: list[str], gene: str = None) -> tuple[str, str]:
+    """
+    Picks the sample and expression columns out of an OncoDB header by name.
+
+    The sample column is 'Sample' (any case) or else the first column. The expression column is
+    '<gene>_expression_value' when 'gene' is given, otherwise the first '*_expression_value' column.
+    Exports without a named expression column fall back to the third column like earlier versions did.
+    """
+    if not header:
+        raise ValueError("OncoDB export has no header")
+    sample_column = next((column for column in header if column.lower() == SAMPLE_COLUMN.lower()), header[0])
+    if gene is not None:
+        expression_column = f"{gene}{EXPRESSION_SUFFIX}"
+        if expression_column not in header:
+            raise ValueError(f"no '{expression_column}' column in {header}")
+        return sample_column, expression_column
+    expression_columns = [column for column in header if column.endswith(EXPRESSION_SUFFIX)]
+    if expression_columns:
+        return sample_column, expression_columns[0]
+    if len(header) < 3:
+        raise ValueError(f"no expression column in {header}")
+    logger.warning(f"no '*{EXPRESSION_SUFFIX}' column in {header}, using '{header[2]}'")
+    return sample_column, header[2]
+
+
+def iter_onco(
+    input: str = "data.txt", gene: str = None, chunksize: int = DEFAULT_CHUNKSIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields an OncoDB TXT export in chunks of at most 'chunksize' rows as 'Series Name'/'Y' datasets.
+
+    Only the sample and expression columns are parsed, the samples as categoricals and the values as float64.
+    """
+    sample_column, expression_column = find_columns(read_header(input), gene)
+    reader = pd.read_csv(
+        input,
+        sep="\t",
+        usecols=[sample_column, expression_column],
+        dtype={sample_column: "category", expression_column: "float64"},
+        chunksize=chunksize,
+        engine="c",
+    )
+    with reader:
+        for chunk in reader:
+            yield pd.DataFrame({"Series Name": chunk[sample_column], "Y": chunk[expression_column]})
+
+
+def combine_chunks(chunks: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates 'Series Name'/'Y' chunks into one dataset.
+
+    Every chunk has its own categories, the labels are unioned as categoricals rather than going through an
+    object column of every sample name, so the combined dataset is never bigger than its codes and values.
+    """
+    if not chunks:
+        return pd.DataFrame({"Series Name": pd.Categorical([]), "Y": pd.Series([], dtype="float64")})
+    names = union_categoricals([pd.Categorical(chunk["Series Name"]) for chunk in chunks])
+    values = np.concatenate([chunk["Y"].to_numpy(dtype="float64") for chunk in chunks])
+    return pd.DataFrame({"Series Name": names, "Y": values})
+
+
+def read_onco(input: str = "data.txt", gene: str = None, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """
+    Reads an OncoDB TXT export into a dataset with a 'Series Name' and a 'Y' column.
+
+    The file is parsed in chunks of 'chunksize' rows so parsing never holds more than a chunk of text, the
+    dataset itself is held in full since the plots and the aggregate need every value.
+    """
+    with profiling.span("parse", file=input):
+        dataset = combine_chunks(list(iter_onco(input, gene=gene, chunksize=chunksize)))
+    logger.debug(f"read {len(dataset)} rows from {input}")
+    return dataset
+
+
+def gene_columns(input: str, genes: list[str] = None) -> tuple[str, dict[str, str]]:
+    """
+    Returns the sample column of a wide OncoDB export and the expression column of each gene in 'genes' (every
+    gene in the file when None).
+    """
+    header = read_header(input)
+    available = expression_genes(header)
+    if not available:
+        raise ValueError(f"no '*{EXPRESSION_SUFFIX}' columns in {input}")
+    sample_column, _ = find_columns(header)
+    genes = available if genes is None else list(genes)
+    missing = [gene for gene in genes if gene not in available]
+    if missing:
+        raise ValueError(f"no expression column for {missing} in {input}, found {available}")
+    return sample_column, {gene: f"{gene}{EXPRESSION_SUFFIX}" for gene in genes}
+
+
+def iter_onco_genes(
+    input: str = "data.txt", genes: list[str] = None, chunksize: int = DEFAULT_CHUNKSIZE
+) -> Iterator[dict[str, pd.DataFrame]]:
+    """
+    Yields a wide OncoDB export in chunks of at most 'chunksize' rows, each one a 'Series Name'/'Y' dataset per
+    gene sharing the chunk's categorical sample labels, see gene_columns for 'genes'.
+    """
+    sample_column, columns = gene_columns(input, genes)
+    reader = pd.read_csv(
+        input,
+        sep="\t",
+        usecols=[sample_column, *columns.values()],
+        dtype={sample_column: "category", **{column: "float64" for column in columns.values()}},
+        chunksize=chunksize,
+        engine="c",
+    )
+    with reader:
+        for chunk in reader:
+            yield {
+                gene: pd.DataFrame({"Series Name": chunk[sample_column], "Y": chunk[column]})
+                for gene, column in columns.items()
+            }
+
+
+def read_onco_genes(
+    input: str = "data.txt", genes: list[str] = None, chunksize: int = DEFAULT_CHUNKSIZE
+) -> dict[str, pd.DataFrame]:
+    """
+    Reads a wide OncoDB export with several expression columns in a single pass.
+
+    Returns a 'Series Name'/'Y' dataset per gene in 'genes' (every gene in the file when None), held in full
+    like read_onco's.
+    """
+    _, columns = gene_columns(input, genes)
+    with profiling.span("parse", file=input):
+        chunks: dict[str, list[pd.DataFrame]] = {gene: [] for gene in columns}
+        for datasets in iter_onco_genes(input, genes=list(columns), chunksize=chunksize):
+            for gene, dataset in datasets.items():
+                chunks[gene].append(dataset)
+        datasets = {gene: combine_chunks(gene_chunks) for gene, gene_chunks in chunks.items()}
+    rows = len(next(iter(datasets.values()))) if datasets else 0
+    logger.debug(f"read {rows} rows of {len(datasets)} genes from {input}")
+    return datasets
+
+
+def convert_chunks(
+    input: str, chunks: Iterator[dict[str, pd.DataFrame]], outputs: dict[str, str]
+) -> dict[str, pd.DataFrame]:
+    """
+    Writes every dataset of each chunk that has a path in 'outputs' to it as soon as it's parsed (see
+    intermediate.DatasetWriter) and returns every dataset combined.
+
+    This is the build's conversion step: the plots and the aggregate need every value so each dataset is still
+    held in full, but never the text of the file or a second copy of the dataset. An error removes the partly
+    written files and leaves the old ones in place.
+    """
+    kept: dict[str, list[pd.DataFrame]] = {key: [] for key in outputs}
+    with contextlib.ExitStack() as stack:
+        writers = {key: stack.enter_context(intermediate.DatasetWriter(path)) for key, path in outputs.items()}
+        for datasets in chunks:
+            for key, dataset in datasets.items():
+                if key in writers:
+                    writers[key].write(dataset)
+                kept.setdefault(key, []).append(dataset)
+    for path in outputs.values():
+        logger.debug(f"wrote {path} from {input}")
+    return {key: combine_chunks(key_chunks) for key, key_chunks in kept.items()}
+
+
+def convert_onco(
+    input: str = "data.txt", output: str = "data.csv", gene: str = None, chunksize: int = DEFAULT_CHUNKSIZE
+) -> pd.DataFrame:
+    """
+    Converts an OncoDB TXT export into 'output' chunk by chunk and returns its dataset, see convert_chunks.
+    """
+    with profiling.span("parse", file=input):
+        chunks = ({output: chunk} for chunk in iter_onco(input, gene=gene, chunksize=chunksize))
+        return convert_chunks(input, chunks, {output: output})[output]
+
+
+def convert_onco_genes(
+    input: str, genes: list[str], outputs: dict[str, str], chunksize: int = DEFAULT_CHUNKSIZE
+) -> dict[str, pd.DataFrame]:
+    """
+    Reads 'genes' out of a wide OncoDB export in a single pass, converting the ones in 'outputs' into their path,
+    and returns their datasets, see convert_chunks.
+    """
+    with profiling.span("parse", file=input):
+        datasets = convert_chunks(input, iter_onco_genes(input, genes=genes, chunksize=chunksize), outputs)
+    return {gene: datasets.get(gene, combine_chunks([])) for gene in genes}
+
+
+def convert_onco_genes_to_csv(
+    input: str = "data.txt", output_directory: str = ".", genes: list[str] = None, file_name: str = "data.csv"
+) -> dict[str, pd.DataFrame]:
+    """
+    Splits a wide OncoDB export into '<output_directory>/<gene>/<file_name>' for each gene, parsing the file once.
+    """
+    _, columns = gene_columns(input, genes)
+    outputs = {}
+    for gene in columns:
+        os.makedirs(os.path.join(output_directory, gene), exist_ok=True)
+        outputs[gene] = os.path.join(output_directory, gene, file_name)
+    return convert_onco_genes(input, list(columns), outputs)
+
+
+def convert_onco_to_csv(
+    input: str = "data.txt", output: str = "data.csv", gene: str = None, chunksize: int = DEFAULT_CHUNKSIZE
+) -> int:
+    """
+    Converts an OncoDB TXT export to CSV (or a data.jbin, see intermediate) one chunk at a time without holding
+    the whole file, returns the row count.
+    """
+    rows = intermediate.write_chunks(iter_onco(input, gene=gene, chunksize=chunksize), output)
+    logger.debug(f"wrote {rows} rows to {output} from {input}")
+    return rows
 
 
 # Running the main function
@@ -1,21 +1,374 @@
+from __future__ import annotations
 import sys
 import os
-from typing import Callable
+import math
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple
 from loguru import logger
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from jeddinformatics import schema_model
+from plotly.subplots import make_subplots
+from jeddinformatics import intermediate
+from jeddinformatics import profiling
+
+if TYPE_CHECKING:
+    from jeddinformatics import schema_model
+
+
+# formats a render profile can export, kaleido renders all but html which plotly writes on its own
+EXPORT_FORMATS = ("png", "jpeg", "webp", "svg", "pdf", "html")
+DEFAULT_RENDER_PROFILE = "publication"
+# size of each atlas facet relative to the configured plot size
+ATLAS_FACET_SCALE = 0.5
+# built in profiles, a config's 'render_profiles' can add to them or replace them by name
+RENDER_PROFILES = {
+    "publication": {"scale": 4, "formats": ["png"], "points": True},
+    "draft": {"scale": 1, "formats": ["png"], "points": False},
+    "vector": {"scale": 1, "formats": ["svg", "pdf"], "points": True},
+    "html": {"scale": 1, "formats": ["html"], "points": True},
+}
+
+
+def render_profile(config: schema_model.Model) -> dict:
+    """
+    Returns the settings of the config's 'render_profile', anything a profile leaves out is taken from
+    the publication profile.
+    """
+    name = config.get("render_profile") or DEFAULT_RENDER_PROFILE
+    profiles = {**RENDER_PROFILES, **config.get("render_profiles", {})}
+    if name not in profiles:
+        raise ValueError(f"unknown render profile '{name}', expected one of {', '.join(sorted(profiles))}")
+    return {**RENDER_PROFILES[DEFAULT_RENDER_PROFILE], **profiles[name]}
+
+
+class ExportJob(NamedTuple):
+    figure: go.Figure
+    output: str
+    width: float
+    height: float
+    scale: float
+    format: str
+
+
+class ImageExporter:
+    """
+    Exports figures through a single long-lived kaleido renderer and counts what it exported.
+
+    Each figure is exported as soon as it is handed over, so a failed export is raised while its own plot is
+    being made. 'mathjax' is the MathJax the renderer loads, by default kaleido's own (a bundled copy when it has
+    one, otherwise none) rather than the CDN plotly.io points it at, which stalls or fails offline. Falls back
+    to fig.write_image when kaleido's scope isn't available.
+    """
+
+    def __init__(self, mathjax: str = None):
+        self.mathjax = mathjax
+        self.exported = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+        self._scope = None
+
+    @property
+    def scope(self):
+        if self._scope is None:
+            try:
+                import plotly
+                from kaleido.scopes.plotly import PlotlyScope
+
+                # plotly.js from the installed plotly like plotly.io, MathJax only when asked for
+                self._scope = PlotlyScope(
+                    plotlyjs=os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js"),
+                    mathjax=self.mathjax,
+                )
+            except ImportError:
+                logger.warning("kaleido scope unavailable, falling back to write_image")
+                self._scope = False
+        return self._scope
+
+    def export(
+        self,
+        figure: go.Figure,
+        output: str,
+        width: float,
+        height: float,
+        scale: float = 4,
+        format: str = "png",
+    ) -> None:
+        job = ExportJob(figure, output, width, height, scale, format)
+        start = time.perf_counter()
+        try:
+            self._export(job)
+        except Exception as e:
+            logger.error(f"failed exporting {job.output}: {e}")
+            raise e
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def _export(self, job: ExportJob) -> None:
+        with profiling.span("image_export", output=job.output):
+            self._write(job)
+        self.exported += 1
+        logger.debug(f"wrote {job.output}")
+
+    def _write(self, job: ExportJob) -> None:
+        if job.format == "html":
+            # self-contained, plotly.js is embedded so the file opens without a network connection
+            job.figure.write_html(job.output, include_plotlyjs=True, default_width=job.width, default_height=job.height)
+            self.bytes_written += os.path.getsize(job.output)
+        elif self.scope:
+            image = self.scope.transform(
+                job.figure.to_plotly_json(), format=job.format, width=job.width, height=job.height, scale=job.scale
+            )
+            with open(job.output, "wb") as file:
+                file.write(image)
+            self.bytes_written += len(image)
+        else:
+            job.figure.write_image(
+                file=job.output, format=job.format, engine="auto", width=job.width, height=job.height, scale=job.scale
+            )
+
+    def throughput(self) -> float:
+        """
+        Returns the number of images exported per second spent exporting.
+        """
+        return self.exported / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"exported {self.exported} images ({self.bytes_written / 1e6:.1f} MB) "
+            f"in {self.seconds:.2f}s, {self.throughput():.2f} images/s"
+        )
+
+    def take_counters(self) -> dict[str, float]:
+        """
+        Returns the export counts and time and resets them, used to hand a worker's counts to the parent.
+        """
+        counters = {"exported": self.exported, "bytes_written": self.bytes_written, "seconds": self.seconds}
+        self.exported = self.bytes_written = 0
+        self.seconds = 0.0
+        return counters
+
+    def add_counters(self, counters: dict[str, float]) -> None:
+        self.exported += counters.get("exported", 0)
+        self.bytes_written += counters.get("bytes_written", 0)
+        self.seconds += counters.get("seconds", 0.0)
+
+    def close(self) -> None:
+        # kaleido has no public way to stop its renderer other than dropping the scope, whose __del__ stops it,
+        # stop it straight away where this version of kaleido still has the method for it
+        shutdown = getattr(self._scope, "_shutdown_kaleido", None)
+        if callable(shutdown):
+            shutdown()
+        self._scope = None
+
+
+# shared by every plot in this process so the renderer stays warm for the whole run
+default_exporter = ImageExporter()
+
+
+def export_figure(
+    figure: go.Figure,
+    output: str,
+    config: schema_model.Model,
+    exporter: ImageExporter = None,
+    width: float = None,
+    height: float = None,
+) -> None:
+    """
+    Exports 'figure' in every format of the config's render profile, 'output' has its extension swapped for each.
+
+    The figure is the config's plot size unless a 'width' and 'height' are given.
+    """
+    profile = render_profile(config)
+    base, _ = os.path.splitext(output)
+    for format in profile["formats"]:
+        (exporter or default_exporter).export(
+            figure,
+            f"{base}.{format}",
+            width=width or config["plot_width"],
+            height=height or config["plot_height"],
+            scale=profile["scale"],
+            format=format,
+        )
 
 
 def default_translation(input: str, _: object = {}) -> str:
     return input
 
 
+def series_label(
+    series_name: object,
+    cancer_type: str = "",
+    translation_func: Callable[[str, object], str] = default_translation,
+    mappings: object = {},
+) -> str:
+    # the tumor series is named after its cancer type
+    if series_name == "Primary tumor" and cancer_type != "":
+        return translation_func(cancer_type, mappings=mappings)
+    return translation_func(series_name, mappings=mappings)
+
+
 def color_for_series(series: str, colors: object = {}) -> str:
     return colors.get(series, "purple")
 
 
+def read_dataset(input: str) -> pd.DataFrame:
+    # a data.csv or a memory mapped data.jbin
+    return intermediate.read_dataset(input)
+
+
+def precedence_ranks(precedence: list[str]) -> dict[str, int]:
+    # the first position of each name, like list.index
+    ranks: dict[str, int] = {}
+    for rank, series_name in enumerate(precedence):
+        ranks.setdefault(series_name, rank)
+    return ranks
+
+
+def prepare_series(
+    data: pd.DataFrame, precedence: list[str] = [], is_gene: bool = False
+) -> list[tuple[object, np.ndarray]]:
+    """
+    Splits 'data' into (series name, values) pairs, ordered by 'precedence' and then by name.
+
+    The series are grouped in one pass over the names' codes (a stable sort, so each series keeps its rows
+    in order) and gene expression values are log2 transformed once for the whole column. The values are
+    float64 views into that column rather than filtered copies of the frame.
+    """
+    values = data["Y"].to_numpy(dtype="float64")
+    if is_gene:
+        # zero TPM is -inf and gets left out of the box like plotly would
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log2(values)
+    codes, uniques = pd.factorize(data["Series Name"], sort=False)
+    if len(uniques) < np.iinfo(np.int16).max:
+        # numpy radix sorts small integers, which is several times quicker than sorting the default intp codes
+        codes = codes.astype(np.int16)
+    order = np.argsort(codes, kind="stable")
+    # rows without a series name have the code -1 and sort in front of the first bound
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    groups = {uniques[code]: values[order[bounds[code]:bounds[code + 1]]] for code in range(len(uniques))}
+    ranks = precedence_ranks(precedence)
+    ordered = sorted(groups, key=lambda name: (name not in ranks, ranks.get(name, 0), name))
+    return [(series_name, groups[series_name]) for series_name in ordered]
+
+
+class PreparedSeries:
+    """
+    prepare_series of one dataset for every precedence asked for, so the plots drawing it (the gene's plot,
+    the merged plot and the atlas, in every theme) split and transform it once per distinct precedence.
+    """
+
+    def __init__(self, data: pd.DataFrame, is_gene: bool = False):
+        self.data = data
+        self.is_gene = is_gene
+        self.prepared: dict[tuple[str, ...], list[tuple[object, np.ndarray]]] = {}
+
+    def get(self, precedence: list[str] = []) -> list[tuple[object, np.ndarray]]:
+        key = tuple(precedence)
+        if key not in self.prepared:
+            self.prepared[key] = prepare_series(self.data, precedence, self.is_gene)
+        return self.prepared[key]
+
+
+class BoxStats(NamedTuple):
+    q1: float
+    median: float
+    q3: float
+    lowerfence: float
+    upperfence: float
+    outliers: np.ndarray
+
+
+def box_stats(values: np.ndarray) -> BoxStats:
+    """
+    Summarises 'values' the way plotly.js does for a box with the default 'linear' quartile method.
+
+    Quartiles interpolate between the sorted values at n * p - 0.5 (numpy's 'hazen' method), the lower
+    fence is the smallest value at or above q1 - 1.5 * IQR (but no higher than q1) and the upper fence the
+    largest value at or below q3 + 1.5 * IQR (but no lower than q3). Anything past the fences is an outlier.
+    The limits are computed the way plotly.js does, including the 1e-9 of the average gap between values it
+    lets a value be off a limit by and still count as on it, so a value right on one is treated the same.
+    Values that aren't finite are dropped like plotly.js drops them, returns None if nothing is left.
+    """
+    values = np.asarray(values, dtype="float64")
+    values = np.sort(values[np.isfinite(values)])
+    if len(values) == 0:
+        return None
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75], method="hazen")
+    tolerance = 1e-9 * ((values[-1] - values[0]) / (len(values) - 1) if len(values) > 1 else 1)
+    lower = values[min(np.searchsorted(values, 2.5 * q1 - 1.5 * q3 - tolerance, side="left"), len(values) - 1)]
+    upper = values[max(np.searchsorted(values, 2.5 * q3 - 1.5 * q1 + tolerance, side="right") - 1, 0)]
+    lowerfence = min(q1, lower)
+    upperfence = max(q3, upper)
+    outliers = values[(values < lowerfence) | (values > upperfence)]
+    return BoxStats(q1, median, q3, lowerfence, upperfence, outliers)
+
+
+def box_traces(values: np.ndarray, name: str, config: schema_model.Model, color: str) -> list[go.Box]:
+    """
+    Builds the traces for a single box of 'values' at category 'name'.
+
+    With the config's 'box_mode' set to 'stats' (the default) the quartiles and fences are computed here and
+    only those plus the outliers go into the figure, drawn as the box and an overlaid box of just the
+    outlier points with no lines, so the figure stays the same size however many values there are. 'raw'
+    hands every value to plotly to compute the box from.
+    """
+    marker = dict(color=color, size=config["point_size"])
+    line = dict(color=color_for_series("box", config["colors"]), width=config["line_width"])
+    points = render_profile(config)["points"]
+    if config.get("box_mode", "stats") == "raw":
+        return [
+            go.Box(
+                y=values,
+                name=name,
+                boxpoints="outliers" if points else False,
+                pointpos=0,
+                marker=marker,
+                line=line,
+                fillcolor="rgba(0,0,0,0)",
+                jitter=config["jitter"],
+            )
+        ]
+    stats = box_stats(values)
+    if stats is None:
+        return [go.Box(y=[], name=name, marker=marker, line=line)]
+    lowerfence, upperfence = stats.lowerfence, stats.upperfence
+    if not points and len(stats.outliers):
+        # without points plotly.js draws the whiskers of a raw box out to the smallest and largest values
+        lowerfence = min(lowerfence, stats.outliers.min())
+        upperfence = max(upperfence, stats.outliers.max())
+    traces = [
+        go.Box(
+            x=[name],
+            q1=[stats.q1],
+            median=[stats.median],
+            q3=[stats.q3],
+            lowerfence=[lowerfence],
+            upperfence=[upperfence],
+            name=name,
+            boxpoints=False,
+            marker=marker,
+            line=line,
+            fillcolor="rgba(0,0,0,0)",
+        )
+    ]
+    if points and len(stats.outliers):
+        traces.append(
+            go.Box(
+                y=stats.outliers,
+                name=name,
+                boxpoints="all",
+                pointpos=0,
+                marker=marker,
+                line=dict(width=0),
+                fillcolor="rgba(0,0,0,0)",
+                jitter=config["jitter"],
+            )
+        )
+    return traces
+
+
 def plot_formatted_csv(
     config: schema_model.Model,
     input: str = "data.csv",
@@ -23,77 +376,52 @@ def plot_formatted_csv(
     translation_func: Callable[[str, object], str] = default_translation,
     cancer_type: str = "",
     is_gene: bool = False,
+    exporter: ImageExporter = None,
+    data: pd.DataFrame = None,
+    annotations: dict[object, str] = None,
+    series: PreparedSeries = None,
 ):
-    # Read the scatter data from the CSV file
-    scatter_data = pd.read_csv(input)
-
-    # Initialize a Plotly figure
-    fig = go.Figure()
-
-    mappings = config["mappings"]
-    colors = config["colors"]
-    precedence = config["precedence"]
-
-    sorted_unique_series = sorted(
-        scatter_data["Series Name"].unique(),
-        key=lambda x: (
-            x not in precedence,
-            precedence.index(x) if x in precedence else 0,
-            x,
-        ),
-    )
+    # 'annotations' are written above the box of the series they are keyed by, like its significance and
+    # 'series' is the already prepared 'data' when other plots share it
+    with profiling.span("figure_build", output=output):
+        # Use the dataset if it was already parsed, otherwise read the scatter data from the CSV file
+        if data is None and series is not None:
+            data = series.data
+        scatter_data = data if data is not None else read_dataset(input)
 
-    # Iterate over each unique series name in the scatter data
-    for series_name in sorted_unique_series:
-        # Filter data for the current series
-        mask = scatter_data["Series Name"] == series_name
-        if is_gene:
-            scatter_data.loc[mask, "Y"] = np.log2(scatter_data.loc[mask, "Y"])
-
-        name = (
-            translation_func(cancer_type, mappings=mappings)
-            if series_name == "Primary tumor" and cancer_type != ""
-            else translation_func(series_name, mappings=mappings)
-        )
+        # Initialize a Plotly figure
+        fig = go.Figure()
 
-        fig.add_trace(
-            go.Box(
-                y=scatter_data.loc[mask, "Y"],
-                name=name,
-                boxpoints="outliers",
-                pointpos=0,
-                marker=dict(
-                    color=color_for_series(name, colors), size=config["point_size"]
-                ),
-                line=dict(
-                    color=color_for_series("box", colors), width=config["line_width"]
-                ),
-                fillcolor="rgba(0,0,0,0)",
-                jitter=config["jitter"],
-            )
+        mappings = config["mappings"]
+        colors = config["colors"]
+        precedence = config["precedence"]
+
+        series = series or PreparedSeries(scatter_data, is_gene)
+
+        # Iterate over each series in the scatter data
+        for series_name, values in series.get(precedence):
+            name = series_label(series_name, cancer_type, translation_func, mappings)
+
+            fig.add_traces(box_traces(values, name, config, color_for_series(name, colors)))
+            if annotations and series_name in annotations:
+                fig.add_annotation(
+                    x=name, y=1, yref="paper", yanchor="bottom", text=annotations[series_name], showarrow=False
+                )
+        yaxes_title = "Z-value" if not is_gene else "log2(TPM)"
+
+        # Update layout with titles and axis labels
+        fig.update_layout(
+            xaxis={"type": "category", "showline": True, "linecolor": "black"},
+            yaxis={"showline": True, "linecolor": "black"},
+            yaxis_title=translation_func(yaxes_title, mappings=mappings),
+            showlegend=False,
+            plot_bgcolor=colors["plot_background_color"],
+            paper_bgcolor=colors["paper_background_color"],
         )
-    yaxes_title = "Z-value" if not is_gene else "log2(TPM)"
-
-    # Update layout with titles and axis labels
-    fig.update_layout(
-        xaxis={"type": "category", "showline": True, "linecolor": "black"},
-        yaxis={"showline": True, "linecolor": "black"},
-        yaxis_title=translation_func(yaxes_title, mappings=mappings),
-        showlegend=False,
-        plot_bgcolor=colors["plot_background_color"],
-        paper_bgcolor=colors["paper_background_color"],
-    )
 
-    # Save the image
-    fig.write_image(
-        file=output,
-        format="png",
-        engine="auto",
-        width=config["plot_width"],
-        height=config["plot_height"],
-        scale=4,
-    )
-    logger.debug(f"wrote {output} from {input}")
+    # Export the image in every format of the render profile
+    export_figure(fig, output, config, exporter)
+    logger.debug(f"exported {output} from {input}")
 
 
 def plot_formatted_csvs(
@@ -103,76 +431,113 @@ def plot_formatted_csvs(
     translation_func: Callable[[str, object], str] = default_translation,
     cancer_type: str = "",
     is_gene: bool = False,
+    exporter: ImageExporter = None,
+    datasets: list[pd.DataFrame] = None,
+    series: list[PreparedSeries] = None,
 ):
-    # Initialize a Plotly figure
-    fig = go.Figure()
-
-    mappings = config["mappings"]
-    colors = config["colors"]
-    precedence = config["precedence"]
-    for input in inputs:
-        scatter_data = pd.read_csv(input)
-
-        sorted_unique_series = sorted(
-            scatter_data["Series Name"].unique(),
-            key=lambda x: (
-                x not in precedence,
-                precedence.index(x) if x in precedence else 0,
-                x,
-            ),
-        )
+    with profiling.span("figure_build", output=output):
+        # Initialize a Plotly figure
+        fig = go.Figure()
+
+        mappings = config["mappings"]
+        colors = config["colors"]
+        precedence = config["precedence"]
+        # 'datasets' lines up with 'inputs', any missing entries are read from the CSV files
+        datasets = datasets or [None] * len(inputs)
+        for input, data, prepared in zip(inputs, datasets, series or [None] * len(inputs)):
+            if prepared is None:
+                prepared = PreparedSeries(data if data is not None else read_dataset(input), is_gene)
 
-        # Iterate over each unique series name in the scatter data
-        for series_name in sorted_unique_series:
-            # Filter data for the current series
-            mask = scatter_data["Series Name"] == series_name
-            if is_gene:
-                scatter_data.loc[mask, "Y"] = np.log2(scatter_data.loc[mask, "Y"])
-
-            name: str = (
-                translation_func(cancer_type, mappings=mappings)
-                if series_name == "Primary tumor" and cancer_type != ""
-                else translation_func(series_name, mappings=mappings)
-            ) + " \n" + input.split(os.sep)[-2]
-
-            fig.add_trace(
-                go.Box(
-                    y=scatter_data.loc[mask, "Y"],
-                    name=name,
-                    boxpoints="outliers",
-                    pointpos=0,
-                    marker=dict(
-                        color=color_for_series(name.split(" ")[0], colors), size=config["point_size"]
-                    ),
-                    line=dict(
-                        color=color_for_series("box", colors), width=config["line_width"]
-                    ),
-                    fillcolor="rgba(0,0,0,0)",
-                    jitter=config["jitter"],
+            # Iterate over each series in the scatter data
+            for series_name, values in prepared.get(precedence):
+                name = series_label(series_name, cancer_type, translation_func, mappings) + " \n" + input.split(os.sep)[-2]
+
+                fig.add_traces(
+                    box_traces(values, name, config, color_for_series(name.split(" ")[0], colors))
                 )
-            )
+            yaxes_title = "Z-value" if not is_gene else "log2(TPM)"
+
+        # Update layout with titles and axis labels
+        fig.update_layout(
+            xaxis={"type": "category", "showline": True, "linecolor": "black"},
+            yaxis={"showline": True, "linecolor": "black"},
+            yaxis_title=translation_func(yaxes_title, mappings=mappings),
+            showlegend=False,
+            plot_bgcolor=colors["plot_background_color"],
+            paper_bgcolor=colors["paper_background_color"],
+        )
+
+    # Export the image in every format of the render profile
+    export_figure(fig, output, config, exporter)
+    logger.debug(f"exported {output} from {input}")
+
+
+def atlas_grid(count: int, columns: int = None) -> tuple[int, int]:
+    """
+    Returns the rows and columns of a grid for 'count' facets, as square as possible unless 'columns' is set.
+    """
+    columns = min(columns or math.ceil(math.sqrt(count)), count) or 1
+    return math.ceil(count / columns) or 1, columns
+
+
+def plot_atlas(
+    config: schema_model.Model,
+    inputs: list[str] = ["data.csv"],
+    output: str = "atlas.png",
+    translation_func: Callable[[str, object], str] = default_translation,
+    cancer_type: str = "",
+    is_gene: bool = False,
+    exporter: ImageExporter = None,
+    datasets: list[pd.DataFrame] = None,
+    series: list[PreparedSeries] = None,
+):
+    """
+    Plots every CSV of a cancer type into one grid with a facet per gene or protein, exported with a single render.
+
+    Each facet is drawn like the gene's own plot (same colors, precedence and mappings) at ATLAS_FACET_SCALE
+    of the configured plot size, the grid has 'atlas_columns' columns or is as square as possible.
+    """
+    with profiling.span("figure_build", output=output):
+        mappings = config["mappings"]
+        colors = config["colors"]
+        precedence = config["precedence"]
+        rows, columns = atlas_grid(len(inputs), config.get("atlas_columns"))
+        fig = make_subplots(
+            rows=rows,
+            cols=columns,
+            subplot_titles=[translation_func(input.split(os.sep)[-2], mappings=mappings) for input in inputs],
+        )
+        # 'datasets' lines up with 'inputs', any missing entries are read from the CSV files
+        datasets = datasets or [None] * len(inputs)
+        for index, (input, data, prepared) in enumerate(zip(inputs, datasets, series or [None] * len(inputs))):
+            if prepared is None:
+                prepared = PreparedSeries(data if data is not None else read_dataset(input), is_gene)
+            row, column = divmod(index, columns)
+            for series_name, values in prepared.get(precedence):
+                name = series_label(series_name, cancer_type, translation_func, mappings)
+                traces = box_traces(values, name, config, color_for_series(name, colors))
+                fig.add_traces(traces, rows=[row + 1] * len(traces), cols=[column + 1] * len(traces))
         yaxes_title = "Z-value" if not is_gene else "log2(TPM)"
 
-    # Update layout with titles and axis labels
-    fig.update_layout(
-        xaxis={"type": "category", "showline": True, "linecolor": "black"},
-        yaxis={"showline": True, "linecolor": "black"},
-        yaxis_title=translation_func(yaxes_title, mappings=mappings),
-        showlegend=False,
-        plot_bgcolor=colors["plot_background_color"],
-        paper_bgcolor=colors["paper_background_color"],
-    )
+        fig.update_xaxes(type="category", showline=True, linecolor="black")
+        fig.update_yaxes(showline=True, linecolor="black")
+        fig.update_yaxes(title_text=translation_func(yaxes_title, mappings=mappings), col=1)
+        fig.update_layout(
+            showlegend=False,
+            plot_bgcolor=colors["plot_background_color"],
+            paper_bgcolor=colors["paper_background_color"],
+        )
 
-    # Save the image
-    fig.write_image(
-        file=output,
-        format="png",
-        engine="auto",
-        width=config["plot_width"],
-        height=config["plot_height"],
-        scale=4,
+    # Export the image in every format of the render profile
+    export_figure(
+        fig,
+        output,
+        config,
+        exporter,
+        width=config["plot_width"] * ATLAS_FACET_SCALE * columns,
+        height=config["plot_height"] * ATLAS_FACET_SCALE * rows,
     )
-    logger.debug(f"wrote {output} from {input}")
+    logger.debug(f"exported {output} from {len(inputs)} inputs")
 
 
 # Running the main function
@@ -183,3 +548,4 @@ if __name__ == "__main__":
     logger.add("plot_data.log", retention="5 minute")
     with logger.catch(onerror=lambda _: sys.exit(1)):
         plot_formatted_csv()
+        default_exporter.close()
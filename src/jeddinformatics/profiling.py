@@ -0,0 +1,193 @@
+import os
+import io
+import json
+import time
+import glob
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import NamedTuple
+from loguru import logger
+
+# stages that run cProfile when it is on, the rest are too coarse or too cheap to be worth it
+HOT_STAGES = ("parse", "convert", "figure_build", "image_export", "aggregate")
+# a reusable context manager that does nothing, handed out while profiling is off
+NULL_SPAN = nullcontext()
+
+
+class Span(NamedTuple):
+    name: str
+    start: int
+    duration: int
+    pid: int
+    tid: int
+    tags: dict
+
+
+class Profiler:
+    """
+    Records timing spans for one process, along with an optional cProfile of the hot stages.
+
+    Spans nest and a span inherits the tags of the span it is inside of, so a 'parse' span inside a
+    'leaf' span tagged with the gene, cancer type and source is tagged with them too. Times come from
+    time.perf_counter_ns, which is shared between processes on the same machine, so spans handed back by
+    pool workers line up with the parent's.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans: list[Span] = []
+        self.cprofile: cProfile.Profile = None
+        self.cprofile_path: str = None
+        self.local = threading.local()
+
+    def configure(self, enabled: bool = False, cprofile_path: str = None) -> None:
+        """
+        Turns span recording on or off, with a 'cprofile_path' the hot stages also run under cProfile.
+        """
+        self.enabled = enabled
+        self.spans = []
+        self.cprofile = cProfile.Profile() if enabled and cprofile_path else None
+        self.cprofile_path = cprofile_path if self.cprofile else None
+
+    def tags(self) -> dict:
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else {}
+
+    @contextmanager
+    def record(self, name: str, tags: dict):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+            self.local.profiling = False
+        merged = {**self.tags(), **tags}
+        self.local.stack.append(merged)
+        profile = self.cprofile is not None and name in HOT_STAGES and not self.local.profiling
+        if profile:
+            self.local.profiling = True
+            self.cprofile.enable()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            if profile:
+                self.cprofile.disable()
+                self.local.profiling = False
+            self.local.stack.pop()
+            self.spans.append(Span(name, start, duration, os.getpid(), threading.get_ident(), merged))
+
+    def take_spans(self) -> list[Span]:
+        """
+        Returns the spans recorded so far and forgets them, used to hand a worker's spans to the parent.
+        """
+        spans, self.spans = self.spans, []
+        return spans
+
+    def add_spans(self, spans: list[Span]) -> None:
+        self.spans.extend(Span(*span) for span in spans)
+
+    def dump_cprofile(self) -> None:
+        # a worker writes its own file which write_cprofile merges in at the end
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(f"{self.cprofile_path}.{os.getpid()}")
+
+
+profiler = Profiler()
+
+
+def span(name: str, **tags):
+    """
+    Times the block it wraps as the stage 'name' when profiling is on, otherwise does nothing.
+    """
+    if not profiler.enabled:
+        return NULL_SPAN
+    return profiler.record(name, tags)
+
+
+def configure(enabled: bool = False, cprofile_path: str = None) -> None:
+    profiler.configure(enabled, cprofile_path)
+
+
+def remove_worker_profiles(cprofile_path: str) -> None:
+    # left behind by a run that didn't get as far as merging them
+    for worker_file in glob.glob(f"{glob.escape(cprofile_path)}.*"):
+        os.remove(worker_file)
+
+
+def summary(spans: list[Span], slowest: int = 5) -> str:
+    """
+    Returns a table of the count, total, mean and max time of every stage, followed by the slowest leaves.
+    """
+    stages: dict[str, list[int]] = {}
+    for recorded in spans:
+        stages.setdefault(recorded.name, []).append(recorded.duration)
+    lines = [f"{'stage':<16}{'count':>8}{'total':>11}{'mean':>11}{'max':>11}"]
+    for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1])):
+        total = sum(durations)
+        lines.append(
+            f"{name:<16}{len(durations):>8}{total / 1e9:>10.3f}s"
+            f"{total / len(durations) / 1e6:>9.2f}ms{max(durations) / 1e6:>9.2f}ms"
+        )
+    leaves = sorted((recorded for recorded in spans if recorded.name == "leaf"), key=lambda leaf: -leaf.duration)
+    if leaves:
+        lines.append("slowest leaves:")
+        for leaf in leaves[:slowest]:
+            described = ", ".join(f"{key}: {value}" for key, value in leaf.tags.items())
+            lines.append(f"  {leaf.duration / 1e6:>9.2f}ms  {described}")
+    return "\n".join(lines)
+
+
+def write_trace(spans: list[Span], path: str) -> None:
+    """
+    Writes 'spans' in the Chrome trace event format, open it in chrome://tracing or https://ui.perfetto.dev.
+    """
+    origin = min((recorded.start for recorded in spans), default=0)
+    events = [
+        {
+            "name": recorded.name,
+            "cat": recorded.name,
+            "ph": "X",
+            "ts": (recorded.start - origin) / 1e3,
+            "dur": recorded.duration / 1e3,
+            "pid": recorded.pid,
+            "tid": recorded.tid,
+            "args": {key: str(value) for key, value in recorded.tags.items()},
+        }
+        for recorded in spans
+    ]
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+    logger.debug(f"wrote {path}")
+
+
+def write_cprofile(path: str, top: int = 25) -> str:
+    """
+    Merges this process's cProfile with the ones pool workers wrote into 'path' and returns the top functions.
+    """
+    worker_files = glob.glob(f"{glob.escape(path)}.*")
+    sources = ([profiler.cprofile] if profiler.cprofile is not None else []) + worker_files
+    if not sources:
+        return ""
+    output = io.StringIO()
+    stats = pstats.Stats(*sources, stream=output)
+    stats.dump_stats(path)
+    for worker_file in worker_files:
+        os.remove(worker_file)
+    stats.sort_stats("cumulative").print_stats(top)
+    logger.debug(f"wrote {path}")
+    return output.getvalue()
+
+
+def report(trace_path: str) -> None:
+    """
+    Logs the summary of every span recorded in this process (including those added from workers), writes
+    them to 'trace_path' and, if cProfile was on, writes the merged profile next to it.
+    """
+    spans = sorted(profiler.spans, key=lambda recorded: recorded.start)
+    logger.info(f"profile:\n{summary(spans)}")
+    write_trace(spans, trace_path)
+    logger.info(f"wrote trace of {len(spans)} spans to {trace_path}")
+    if profiler.cprofile_path:
+        top = write_cprofile(profiler.cprofile_path)
+        logger.info(f"wrote cProfile of the hot stages to {profiler.cprofile_path}\n{top}")
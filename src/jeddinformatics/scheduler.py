@@ -0,0 +1,238 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable
+from loguru import logger
+import pandas as pd
+from jeddinformatics import aggregate, dataset_cache, intermediate, plot_data, profiling, theming
+
+# a task is a (leaf, rebuild) pair of the build plan, process_unit(tasks, themes=...) processes the tasks that
+# share a data file and process_merged(source, inputs, datasets=..., themes=...) draws a merged plot
+
+
+def group_units(tasks: list) -> list[list[int]]:
+    # indices of the tasks by data file, in order of first appearance
+    units: dict[str, list[int]] = {}
+    for index, (leaf, _) in enumerate(tasks):
+        units.setdefault(leaf.file_path, []).append(index)
+    return list(units.values())
+
+
+def merged_datasets(inputs: list[str], tasks: list, results: list[pd.DataFrame]) -> list[pd.DataFrame]:
+    # the dataset already produced for each CSV in 'inputs', None where there isn't one
+    by_csv = {leaf.data_path: dataset for (leaf, _), dataset in zip(tasks, results) if dataset is not None}
+    return [by_csv.get(csv) for csv in inputs]
+
+
+def pending_merged(tasks: list, merged_cancer_sources: dict[str, list[str]]) -> dict[str, int]:
+    # how many of 'tasks' each merged plot is waiting on
+    pending = {source: 0 for source in merged_cancer_sources}
+    for leaf, _ in tasks:
+        if leaf.merged_source in pending:
+            pending[leaf.merged_source] += 1
+    return pending
+
+
+def collect_result(
+    index: int,
+    dataset: pd.DataFrame,
+    tasks: list,
+    results: list[pd.DataFrame],
+    pending: dict[str, int],
+    aggregate_writer: aggregate.AggregateWriter = None,
+) -> str:
+    """
+    Hands a finished task's dataset to the aggregate, returns the source whose merged plot it completes.
+    """
+    leaf = tasks[index][0]
+    if aggregate_writer is not None:
+        aggregate_writer.add(index, dataset, leaf.gene_or_protein, leaf.cancer_type, leaf.source_database)
+    source = leaf.merged_source
+    if source not in pending:
+        return None
+    results[index] = dataset
+    pending[source] -= 1
+    return source if pending[source] == 0 else None
+
+
+def release_merged(source: str, tasks: list, results: list[pd.DataFrame]) -> None:
+    # the merged plot has its datasets, nothing else needs them
+    for index, (leaf, _) in enumerate(tasks):
+        if leaf.merged_source == source:
+            results[index] = None
+
+
+def init_worker(
+    dataset_cache_mb: float, profile: bool = False, cprofile_path: str = None, data_format: str = "csv"
+) -> None:
+    # runs once in every pool worker, a forked worker would otherwise start with a copy of the parent's state
+    dataset_cache.configure(dataset_cache_mb)
+    profiling.configure(profile, cprofile_path)
+    intermediate.configure(data_format)
+
+
+def run_task(func: Callable, *args, **kwargs) -> tuple[object, dict]:
+    """
+    Runs 'func' in a pool worker, returning its result along with the worker's counters and spans.
+    """
+    result = func(*args, **kwargs)
+    profiling.profiler.dump_cprofile()
+    return result, {
+        "counters": dataset_cache.default_cache.take_counters(),
+        "exports": plot_data.default_exporter.take_counters(),
+        "spans": profiling.profiler.take_spans(),
+    }
+
+
+def add_telemetry(telemetry: dict) -> None:
+    # the parent's side of run_task
+    dataset_cache.default_cache.add_counters(telemetry["counters"])
+    plot_data.default_exporter.add_counters(telemetry["exports"])
+    profiling.profiler.add_spans(telemetry["spans"])
+
+
+def run_serial(
+    tasks: list,
+    merged_cancer_sources: dict[str, list[str]],
+    process_unit: Callable,
+    process_merged: Callable,
+    aggregate_writer: aggregate.AggregateWriter = None,
+    targets: theming.Targets = None,
+) -> tuple[list[bool], int, list[str]]:
+    """
+    Processes every task in order and each merged plot once its leaves are done, stopping at the first error.
+    """
+    results: list[pd.DataFrame] = [None] * len(tasks)
+    completed = [False] * len(tasks)
+    pending = pending_merged(tasks, merged_cancer_sources)
+
+    def plot_merged(source: str) -> None:
+        inputs = merged_cancer_sources[source]
+        datasets = merged_datasets(inputs, tasks, results)
+        process_merged(source, inputs, datasets=datasets, themes=theming.merged_themes(targets, source))
+        release_merged(source, tasks, results)
+
+    for source, count in pending.items():
+        if count == 0:
+            plot_merged(source)
+    for unit in group_units(tasks):
+        unit_tasks = [tasks[index] for index in unit]
+        datasets = process_unit(unit_tasks, themes=theming.unit_themes(targets, unit_tasks))
+        for index, dataset in zip(unit, datasets):
+            completed[index] = True
+            source = collect_result(index, dataset, tasks, results, pending, aggregate_writer)
+            if source is not None:
+                plot_merged(source)
+    return completed, len(merged_cancer_sources), []
+
+
+class ParallelRun:
+    """
+    The jobs of a run_parallel run that weren't collected yet, the datasets merged plots wait for and the failures.
+    """
+
+    def __init__(
+        self,
+        executor: ProcessPoolExecutor,
+        tasks: list,
+        merged_cancer_sources: dict[str, list[str]],
+        process_unit: Callable,
+        process_merged: Callable,
+        aggregate_writer: aggregate.AggregateWriter = None,
+        targets: theming.Targets = None,
+    ):
+        self.executor = executor
+        self.tasks = tasks
+        self.merged_cancer_sources = merged_cancer_sources
+        self.process_unit = process_unit
+        self.process_merged = process_merged
+        self.aggregate_writer = aggregate_writer
+        self.targets = targets
+        self.results: list[pd.DataFrame] = [None] * len(tasks)
+        self.completed = [False] * len(tasks)
+        self.failures: list[str] = []
+        self.pending = pending_merged(tasks, merged_cancer_sources)
+        # merged plots that won't be drawn because one of their leaves failed
+        self.blocked: set[str] = set()
+        self.count_cancer = 0
+        self.futures: dict[Future, tuple[str, object]] = {}
+
+    def submit_units(self) -> None:
+        for unit in group_units(self.tasks):
+            unit_tasks = [self.tasks[index] for index in unit]
+            themes = theming.unit_themes(self.targets, unit_tasks)
+            future = self.executor.submit(run_task, self.process_unit, unit_tasks, themes=themes)
+            self.futures[future] = ("unit", unit)
+        # merged plots made only of CSVs that aren't leaves can go straight away
+        for source, count in self.pending.items():
+            if count == 0:
+                self.submit_merged(source)
+
+    def submit_merged(self, source: str) -> None:
+        inputs = self.merged_cancer_sources[source]
+        datasets = merged_datasets(inputs, self.tasks, self.results)
+        themes = theming.merged_themes(self.targets, source)
+        future = self.executor.submit(run_task, self.process_merged, source, inputs, datasets=datasets, themes=themes)
+        self.futures[future] = ("merged", source)
+        release_merged(source, self.tasks, self.results)
+
+    def collect(self, future: Future) -> None:
+        # adds up a finished job's telemetry and submits the merged plots that were only waiting for it
+        kind, key = self.futures.pop(future)
+        try:
+            result, telemetry = future.result()
+        except Exception as e:
+            self.fail(kind, key, e)
+            return
+        add_telemetry(telemetry)
+        if kind == "merged":
+            self.count_cancer += 1
+            return
+        for index, dataset in zip(key, result):
+            self.completed[index] = True
+            source = collect_result(index, dataset, self.tasks, self.results, self.pending, self.aggregate_writer)
+            if source is not None and source not in self.blocked:
+                self.submit_merged(source)
+
+    def fail(self, kind: str, key: object, error: Exception) -> None:
+        name = self.tasks[key[0]][0].file_path if kind == "unit" else f"{key}/merged.png"
+        logger.error(f"failed processing {name}: {error!r}")
+        self.failures.append(name)
+        if kind == "unit":
+            self.blocked.update(self.tasks[index][0].merged_source for index in key)
+            # the aggregate won't be written, stop holding datasets for it
+            if self.aggregate_writer is not None:
+                self.aggregate_writer.abort()
+
+
+def run_parallel(
+    tasks: list,
+    merged_cancer_sources: dict[str, list[str]],
+    process_unit: Callable,
+    process_merged: Callable,
+    jobs: int,
+    aggregate_writer: aggregate.AggregateWriter = None,
+    dataset_cache_mb: float = dataset_cache.DEFAULT_BUDGET_MB,
+    targets: theming.Targets = None,
+) -> tuple[list[bool], int, list[str]]:
+    """
+    Runs the tasks in a pool of 'jobs' processes, one job per data file, and each merged plot once its leaves
+    are done. A failing task is logged and named in the returned failures while the rest carries on.
+    """
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(
+            dataset_cache_mb,
+            profiling.profiler.enabled,
+            profiling.profiler.cprofile_path,
+            intermediate.data_format(),
+        ),
+    ) as executor:
+        run = ParallelRun(executor, tasks, merged_cancer_sources, process_unit, process_merged, aggregate_writer, targets)
+        run.submit_units()
+        while run.futures:
+            done, _ = wait(run.futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                run.collect(future)
+    for source in sorted(run.blocked.intersection(run.pending)):
+        logger.warning(f"skipped {source}/merged.png because some of its inputs failed")
+    return run.completed, run.count_cancer, run.failures
@@ -0,0 +1,55 @@
+# schema-sha256: c43bb94302a526627c2278700d7e7bcfa1da16d60f87d4fad172f2d153761121
+# generated by datamodel-codegen:
+#   filename:  schema.json
+
+from __future__ import annotations
+
+from enum import Enum
+
+from pydantic import BaseModel, ConfigDict, Field, PositiveFloat, conint
+
+
+class BoxMode(Enum):
+    stats = 'stats'
+    raw = 'raw'
+
+
+class Format(Enum):
+    png = 'png'
+    jpeg = 'jpeg'
+    webp = 'webp'
+    svg = 'svg'
+    pdf = 'pdf'
+    html = 'html'
+
+
+class RenderProfiles(BaseModel):
+    model_config = ConfigDict(
+        extra='forbid',
+    )
+    scale: PositiveFloat | None = None
+    formats: list[Format] | None = Field(None, min_length=1)
+    points: bool | None = None
+
+
+class Model(BaseModel):
+    model_config = ConfigDict(
+        extra='forbid',
+    )
+    field_schema: str = Field(..., alias='$schema')
+    mappings: dict[str, str]
+    colors: dict[str, str]
+    precedence: list[str]
+    jitter: float
+    point_size: float
+    line_width: float
+    plot_width: float
+    plot_height: float
+    box_mode: BoxMode | None = 'stats'
+    gene_plots: bool | None = True
+    atlas: bool | None = False
+    atlas_columns: conint(ge=1) | None = None
+    stats: bool | None = False
+    stats_annotations: bool | None = False
+    render_profile: str | None = 'publication'
+    render_profiles: dict[str, RenderProfiles] | None = None
@@ -0,0 +1,445 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import contextlib
+import hashlib
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+from urllib.parse import urlsplit
+from loguru import logger
+from jeddinformatics import convert_and_plot, highchart_json_to_csv, oncodb_to_csv, plot_data
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_CACHE_MB = 128
+# renders queued or running at once, anything past it is turned away with a 503 rather than waiting unbounded
+DEFAULT_MAX_PENDING = 64
+MAX_BODY_BYTES = 64 << 20
+KINDS = ("oncodb", "highcharts")
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+    "html": "text/html; charset=utf-8",
+}
+# upper bounds in seconds of the request latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+SERVICE_PROFILE = "service"
+# seconds a started worker holds on to each call while waiting for the rest to start
+READY_POLL_INTERVAL = 0.1
+ROUTES = ("/render", "/metrics", "/health")
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderRequest(NamedTuple):
+    kind: str
+    data: bytes
+    format: str
+    gene: str
+    cancer_type: str
+    is_gene: bool
+    config: dict
+
+    @property
+    def key(self) -> str:
+        """
+        Addresses the rendered image by everything that goes into it, so equal requests share one render.
+        """
+        described = {field: value for field, value in self._asdict().items() if field != "data"}
+        digest = hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(self.data)
+        return digest.hexdigest()
+
+
+def load_validator():
+    # compiled once, every request's config overrides are checked against the same schema as config.json
+    from jsonschema.validators import validator_for
+
+    with open(convert_and_plot.schema_file_path, "r") as schema_file:
+        schema = json.load(schema_file)
+    return validator_for(schema)(schema)
+
+
+def payload_bytes(data: object) -> tuple[str, bytes]:
+    """
+    Returns the kind of export 'data' looks like and its bytes, a Highcharts config can be given as an object.
+    """
+    if isinstance(data, (dict, list)):
+        return "highcharts", json.dumps(data, separators=(",", ":")).encode("utf-8")
+    if not isinstance(data, str):
+        raise HttpError(400, "'data' must be the text of an OncoDB TXT export or a Highcharts JSON config")
+    return ("highcharts" if data.lstrip().startswith("{") else "oncodb"), data.encode("utf-8")
+
+
+def parse_render_request(body: bytes, base_config: dict, validator) -> RenderRequest:
+    """
+    Parses the JSON body of a /render request:
+    {"data": ..., "kind": "oncodb"|"highcharts", "format": "png", "gene": ..., "cancer_type": ..., "is_gene": ...,
+    "config": {...}}. Only 'data' is required, 'config' is merged over the service's config.
+    """
+    try:
+        request = json.loads(body)
+    except ValueError as e:
+        raise HttpError(400, f"the body isn't JSON: {e}")
+    if not isinstance(request, dict) or "data" not in request:
+        raise HttpError(400, "expected a JSON object with the export in 'data'")
+    kind, data = payload_bytes(request["data"])
+    kind = request.get("kind", kind)
+    if kind not in KINDS:
+        raise HttpError(400, f"unknown kind '{kind}', expected one of {', '.join(KINDS)}")
+    overrides = request.get("config", {})
+    if not isinstance(overrides, dict):
+        raise HttpError(400, "'config' must be an object of config.json fields")
+    config = {**base_config, **overrides}
+    errors = sorted(validator.iter_errors(config), key=lambda error: list(error.path))
+    if errors:
+        raise HttpError(400, f"invalid config: {errors[0].message}")
+    try:
+        format = request.get("format") or plot_data.render_profile(config)["formats"][0]
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    if format not in CONTENT_TYPES:
+        raise HttpError(400, f"unknown format '{format}', expected one of {', '.join(CONTENT_TYPES)}")
+    return RenderRequest(
+        kind=kind,
+        data=data,
+        format=format,
+        gene=request.get("gene"),
+        cancer_type=request.get("cancer_type", ""),
+        # OncoDB exports are gene expression and UALCAN's Highcharts plots protein expression
+        is_gene=bool(request.get("is_gene", kind == "oncodb")),
+        config=config,
+    )
+
+
+def init_render_worker() -> None:
+    # starts the renderer before the first request instead of on it
+    figure = plot_data.go.Figure()
+    if plot_data.default_exporter.scope:
+        plot_data.default_exporter.scope.transform(figure.to_plotly_json(), format="png", width=10, height=10)
+
+
+def worker_ready() -> int:
+    time.sleep(READY_POLL_INTERVAL)
+    return os.getpid()
+
+
+def render(request: RenderRequest) -> bytes:
+    """
+    Plots the export in 'request' like the gene plot of a leaf and returns the image, runs in a pool worker.
+    """
+    profile = {**plot_data.render_profile(request.config), "formats": [request.format]}
+    config = {
+        **request.config,
+        "gene_plots": True,
+        "render_profile": SERVICE_PROFILE,
+        "render_profiles": {**request.config.get("render_profiles", {}), SERVICE_PROFILE: profile},
+    }
+    with tempfile.TemporaryDirectory(prefix="jeddinformatics-render-") as directory:
+        input = os.path.join(directory, "data.txt" if request.kind == "oncodb" else "data.json")
+        with open(input, "wb") as input_file:
+            input_file.write(request.data)
+        if request.kind == "oncodb":
+            dataset = oncodb_to_csv.read_onco(input, gene=request.gene)
+        else:
+            dataset = highchart_json_to_csv.read_highchart(input)
+        output = os.path.join(directory, "data.csv")
+        convert_and_plot.process_dataset(dataset, output, config, request.cancer_type, request.is_gene)
+        with open(convert_and_plot.replace_file_extension(output, request.format), "rb") as image_file:
+            return image_file.read()
+
+
+class ResultCache:
+    """
+    Rendered images by request key, the least recently used are evicted past 'budget' bytes (0 turns it off).
+    """
+
+    def __init__(self, budget: int = DEFAULT_CACHE_MB << 20):
+        self.budget = budget
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> bytes:
+        image = self.entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def put(self, key: str, image: bytes) -> None:
+        if key in self.entries or len(image) > self.budget:
+            return
+        self.entries[key] = image
+        self.bytes += len(image)
+        while self.bytes > self.budget:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+
+class Metrics:
+    """
+    Request latencies per route as a histogram, and responses per route and status, in Prometheus' text format.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list] = {}
+        self.responses: dict[tuple[str, int], int] = {}
+
+    def observe(self, route: str, status: int, seconds: float) -> None:
+        buckets, total = self.latencies.setdefault(route, [[0] * len(LATENCY_BUCKETS), 0.0])
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[index] += 1
+        self.latencies[route][1] = total + seconds
+        self.responses[route, status] = self.responses.get((route, status), 0) + 1
+
+    def lines(self) -> list[str]:
+        lines = [
+            "# HELP jeddinformatics_request_duration_seconds Time from reading a request to writing its response.",
+            "# TYPE jeddinformatics_request_duration_seconds histogram",
+        ]
+        for route, (buckets, total) in sorted(self.latencies.items()):
+            count = sum(count for (counted, _), count in self.responses.items() if counted == route)
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'jeddinformatics_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {bucket}')
+            lines.append(f'jeddinformatics_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {count}')
+            lines.append(f'jeddinformatics_request_duration_seconds_sum{{route="{route}"}} {total:.6f}')
+            lines.append(f'jeddinformatics_request_duration_seconds_count{{route="{route}"}} {count}')
+        lines.append("# TYPE jeddinformatics_responses_total counter")
+        for (route, status), count in sorted(self.responses.items()):
+            lines.append(f'jeddinformatics_responses_total{{route="{route}",status="{status}"}} {count}')
+        return lines
+
+
+async def wait_for_render(future: asyncio.Future) -> bytes:
+    # shielded so a client hanging up doesn't cancel a render other requests may be waiting on
+    try:
+        return await asyncio.shield(future)
+    except BrokenProcessPool as e:
+        raise HttpError(500, f"a render worker died: {e}")
+    except Exception as e:
+        raise HttpError(422, f"couldn't plot the export: {e}")
+
+
+class RenderService:
+    """
+    Renders plots for HTTP requests in a pool of 'workers' warm processes.
+
+    Images are cached by request key, concurrent requests for the same key wait on a single render and at
+    most 'max_pending' distinct renders are queued or running at a time.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        workers: int = DEFAULT_WORKERS,
+        cache_mb: float = DEFAULT_CACHE_MB,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.config = config
+        self.validator = load_validator()
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker)
+        self.cache = ResultCache(int(cache_mb * (1 << 20)))
+        self.max_pending = max_pending
+        self.in_flight: dict[str, asyncio.Future] = {}
+        self.metrics = Metrics()
+
+    async def render(self, request: RenderRequest) -> tuple[bytes, str]:
+        """
+        Returns the image for 'request' and whether it was a cache 'hit', a 'miss' or 'shared' with a render
+        already running for an equal request.
+        """
+        key = request.key
+        image = self.cache.get(key)
+        if image is not None:
+            return image, "hit"
+        if key in self.in_flight:
+            return await wait_for_render(self.in_flight[key]), "shared"
+        if len(self.in_flight) >= self.max_pending:
+            raise HttpError(503, f"{len(self.in_flight)} renders are already pending, try again later")
+        future = asyncio.get_running_loop().run_in_executor(self.pool, render, request)
+        self.in_flight[key] = future
+        try:
+            image = await wait_for_render(future)
+        finally:
+            self.in_flight.pop(key, None)
+        self.cache.put(key, image)
+        return image, "miss"
+
+    def metrics_text(self) -> str:
+        lines = self.metrics.lines()
+        lines += [
+            "# TYPE jeddinformatics_render_cache_hits_total counter",
+            f"jeddinformatics_render_cache_hits_total {self.cache.hits}",
+            "# TYPE jeddinformatics_render_cache_misses_total counter",
+            f"jeddinformatics_render_cache_misses_total {self.cache.misses}",
+            "# TYPE jeddinformatics_render_cache_evictions_total counter",
+            f"jeddinformatics_render_cache_evictions_total {self.cache.evictions}",
+            "# TYPE jeddinformatics_render_cache_bytes gauge",
+            f"jeddinformatics_render_cache_bytes {self.cache.bytes}",
+            "# TYPE jeddinformatics_renders_pending gauge",
+            f"jeddinformatics_renders_pending {len(self.in_flight)}",
+            "# TYPE jeddinformatics_render_workers gauge",
+            f"jeddinformatics_render_workers {self.workers}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[int, str, bytes, dict]:
+        """
+        Returns the status, content type, body and extra headers of the response to a request.
+        """
+        if path == "/health":
+            return 200, "text/plain; charset=utf-8", b"ok\n", {}
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4; charset=utf-8", self.metrics_text().encode("utf-8"), {}
+        if path != "/render":
+            raise HttpError(404, f"no such path '{path}', expected /render, /metrics or /health")
+        if method != "POST":
+            raise HttpError(405, "/render only accepts POST")
+        # parsing and hashing a large export would hold up every other connection
+        loop = asyncio.get_running_loop()
+        request = await loop.run_in_executor(None, parse_render_request, body, self.config, self.validator)
+        image, cache = await self.render(request)
+        return 200, CONTENT_TYPES[request.format], image, {"X-Cache": cache, "ETag": f'"{request.key}"'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves the HTTP/1.1 requests of one connection, keeping it open between them unless asked not to.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                keep_alive = await self.respond(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(
+        self, request_line: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bool:
+        start = time.perf_counter()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        route = "unknown"
+        keep_alive = False
+        try:
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                raise HttpError(400, "malformed request line")
+            method, target, version = parts
+            route = urlsplit(target).path
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            length = int(headers.get("content-length", "0") or 0)
+            if length > MAX_BODY_BYTES:
+                keep_alive = False
+                raise HttpError(413, f"the body is over {MAX_BODY_BYTES >> 20} MB")
+            body = await reader.readexactly(length) if length else b""
+            status, content_type, payload, extra = await self.dispatch(method, route, body)
+        except HttpError as e:
+            status, content_type, payload, extra = e.status, "text/plain; charset=utf-8", f"{e}\n".encode("utf-8"), {}
+        except ValueError as e:
+            keep_alive = False
+            status, content_type, payload, extra = 400, "text/plain; charset=utf-8", f"{e}\n".encode("utf-8"), {}
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *(f"{name}: {value}" for name, value in extra.items()),
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+        # unknown paths are counted together so scanning them can't grow the metrics without bound
+        route = route if route in ROUTES else "other"
+        self.metrics.observe(route, status, time.perf_counter() - start)
+        return keep_alive
+
+    async def start(self) -> None:
+        """
+        Waits until every render worker has started its renderer, which the first requests would pay for otherwise.
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        ready: set[int] = set()
+        while len(ready) < self.workers:
+            # a worker that is already up is kept busy for a moment so those still starting get a call each
+            ready.update(
+                await asyncio.gather(*(loop.run_in_executor(self.pool, worker_ready) for _ in range(self.workers)))
+            )
+        logger.info(f"started {len(ready)} render workers in {time.perf_counter() - start:.1f}s")
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_server(service: RenderService, host: str, port: int) -> None:
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    with contextlib.suppress(NotImplementedError):
+        # stopped by a service manager like Ctrl+C, so the render workers are shut down rather than orphaned
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    addresses = ", ".join(f"http://{socket.getsockname()[0]}:{socket.getsockname()[1]}" for socket in server.sockets)
+    logger.success(f"serving plots on {addresses} with {service.workers} render workers")
+    async with server:
+        await server.serve_forever()
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = DEFAULT_WORKERS,
+    cache_mb: float = DEFAULT_CACHE_MB,
+    max_pending: int = DEFAULT_MAX_PENDING,
+) -> None:
+    """
+    Serves POST /render, GET /metrics and GET /health until interrupted, see RenderService.
+    """
+    config = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+    service = RenderService(config, workers, cache_mb, max_pending)
+    try:
+        asyncio.run(run_server(service, host, port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("stopped serving")
+    finally:
+        service.close()
@@ -0,0 +1,195 @@
+import os
+import json
+import hashlib
+from typing import Iterator, NamedTuple
+from loguru import logger
+import pandas as pd
+from jeddinformatics import aggregate, build_cache
+
+# rows read from a partial aggregate at a time while merging
+PARTIAL_CHUNKSIZE = 1 << 18
+PARTIAL_COLUMNS = ["leaf", *aggregate.LONG_COLUMNS]
+
+
+class Shard(NamedTuple):
+    """The 'number'th (from 1) of 'count' slices of a tree, written 'number/count' on the command line."""
+
+    number: int
+    count: int
+
+    @property
+    def name(self) -> str:
+        return f"shard-{self.number}-of-{self.count}"
+
+
+def relative_key(root_directory: str, path: str) -> str:
+    # the same on every machine whatever the tree is mounted as
+    return os.path.relpath(path, root_directory).replace(os.sep, "/")
+
+
+def shard_number(relative_path: str, count: int) -> int:
+    """
+    Returns which of 'count' shards (from 1) a data file belongs to.
+
+    Hashed with sha256 rather than hash(), which is salted per process, so every machine agrees.
+    """
+    digest = hashlib.sha256(relative_path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def select_leaves(root_directory: str, leaves: list, shard: Shard) -> list:
+    """
+    Returns the leaves in 'shard', in their original order. Leaves are assigned by data file so the genes of
+    a wide export stay together and the file is only parsed by one shard.
+    """
+    return [
+        leaf for leaf in leaves if shard_number(relative_key(root_directory, leaf.file_path), shard.count) == shard.number
+    ]
+
+
+def cache_file_name(shard: Shard = None) -> str:
+    # every shard keeps its own build cache so machines sharing a tree don't overwrite each other's
+    if shard is None:
+        return build_cache.CACHE_FILE_NAME
+    base, extension = os.path.splitext(build_cache.CACHE_FILE_NAME)
+    return f"{base}.{shard.name}{extension}"
+
+
+def partial_base_name(shard: Shard) -> str:
+    return f"{aggregate.BASE_NAME}.{shard.name}"
+
+
+def partial_paths(root_directory: str, shard: Shard) -> list[str]:
+    """
+    Returns the partial aggregate and its manifest, the outputs of a shard besides its leaves.
+    """
+    base = os.path.join(root_directory, partial_base_name(shard))
+    return [f"{base}.csv", f"{base}.json"]
+
+
+class PartialAggregateWriter(aggregate.AggregateWriter):
+    """
+    Writes a shard's part of the aggregate: the long layout as CSV with the leaf each row came from in an
+    extra first column, and a manifest of every leaf written, including those without any rows.
+
+    The rows are in the order of the shard's leaves, which is the order of a single node run with the other
+    shards' leaves left out, so merging the partials back together is a single ordered pass.
+    """
+
+    def __init__(self, root_directory: str, shard: Shard, leaf_keys: list[str]):
+        super().__init__(root_directory, "long", ["csv"], base_name=partial_base_name(shard))
+        self.shard = shard
+        self.leaf_keys = leaf_keys
+        self.manifest_path = partial_paths(root_directory, shard)[1]
+        self.written: list[str] = []
+
+    def rows_for(
+        self, index: int, dataset: pd.DataFrame, gene_or_protein: str, cancer_type: str, source_database: str
+    ) -> pd.DataFrame:
+        rows = super().rows_for(index, dataset, gene_or_protein, cancer_type, source_database)
+        rows.insert(0, "leaf", self.leaf_keys[index])
+        self.written.append(self.leaf_keys[index])
+        return rows
+
+    def close(self) -> None:
+        if self.aborted:
+            return
+        super().close()
+        with open(self.manifest_path, "w") as manifest_file:
+            json.dump({"shard": list(self.shard), "leaves": self.written}, manifest_file, indent=2)
+        logger.debug(f"wrote {self.manifest_path}")
+
+
+def read_manifests(root_directory: str, count: int = None) -> tuple[int, dict[str, int]]:
+    """
+    Finds the partial aggregates under 'root_directory' and returns the number of shards along with the
+    shard each written leaf is in. Raises ValueError if a shard's partial is missing or from another split.
+    """
+    prefix = f"{aggregate.BASE_NAME}.shard-"
+    manifests = sorted(name for name in os.listdir(root_directory) if name.startswith(prefix) and name.endswith(".json"))
+    counts = {int(name[len(prefix):-len(".json")].split("-of-")[1]) for name in manifests}
+    if count is None:
+        if len(counts) != 1:
+            raise ValueError(
+                f"expected the partial aggregates of one split in {root_directory}, found shards of {sorted(counts) or 'none'}"
+            )
+        count = counts.pop()
+    leaf_shards: dict[str, int] = {}
+    missing = []
+    for number in range(1, count + 1):
+        manifest_path = partial_paths(root_directory, Shard(number, count))[1]
+        if not os.path.exists(manifest_path):
+            missing.append(f"{number}/{count}")
+            continue
+        with open(manifest_path, "r") as manifest_file:
+            leaf_shards.update((leaf, number) for leaf in json.load(manifest_file)["leaves"])
+    if missing:
+        raise ValueError(f"shard(s) {', '.join(missing)} haven't finished, no partial aggregate in {root_directory}")
+    return count, leaf_shards
+
+
+def iter_partial(path: str) -> Iterator[tuple[str, pd.DataFrame]]:
+    """
+    Yields each leaf of a partial aggregate along with its rows, reading the file a chunk at a time.
+    """
+    if os.path.getsize(path) == 0:
+        # none of the shard's leaves had any rows so not even the header was written
+        return
+    reader = pd.read_csv(
+        path,
+        chunksize=PARTIAL_CHUNKSIZE,
+        dtype={column: str for column in PARTIAL_COLUMNS if column != "value"} | {"value": "float64"},
+        keep_default_na=False,
+        na_values={"value": [""]},
+        # the default parser can be off in the last digit, which would show in all_csv_data
+        float_precision="round_trip",
+    )
+    carry = None
+    with reader:
+        for chunk in reader:
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            # a leaf's rows are contiguous, only the last one can carry on into the next chunk
+            boundary = int((chunk["leaf"].to_numpy() == chunk["leaf"].iat[-1]).argmax())
+            yield from chunk.iloc[:boundary].groupby("leaf", sort=False)
+            carry = chunk.iloc[boundary:]
+    if carry is not None and len(carry):
+        yield from carry.groupby("leaf", sort=False)
+
+
+def dataset_from_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    # back to the 'Series Name'/'Y' dataset the rows were made from
+    return pd.DataFrame(
+        {"Series Name": pd.Categorical(rows["series"].to_numpy()), "Y": rows["value"].to_numpy(dtype="float64")}
+    )
+
+
+def merge_partials(root_directory: str, leaf_keys: list[str]) -> Iterator[tuple[int, pd.DataFrame]]:
+    """
+    Yields the index and dataset of every leaf in 'leaf_keys' (in that order) from the shards' partial aggregates.
+
+    Raises ValueError before yielding anything if a leaf wasn't written by any shard, e.g. when the tree
+    changed after the shards ran.
+    """
+    count, leaf_shards = read_manifests(root_directory)
+    unwritten = [key for key in leaf_keys if key not in leaf_shards]
+    if unwritten:
+        raise ValueError(f"{len(unwritten)} leaves aren't in any of the {count} shards, e.g. {unwritten[:3]}")
+    streams = {
+        number: iter_partial(partial_paths(root_directory, Shard(number, count))[0]) for number in range(1, count + 1)
+    }
+    heads: dict[int, tuple[str, pd.DataFrame]] = {}
+    for index, key in enumerate(leaf_keys):
+        number = leaf_shards[key]
+        if number not in heads:
+            heads[number] = next(streams[number], (None, None))
+        leaf, rows = heads[number]
+        if leaf == key:
+            del heads[number]
+            yield index, dataset_from_rows(rows)
+        else:
+            # written by the shard without any rows
+            yield index, dataset_from_rows(pd.DataFrame({"series": [], "value": []}))
+    for number, stream in streams.items():
+        if heads.get(number, (None, None))[0] is not None or next(stream, None) is not None:
+            raise ValueError(f"the partial aggregate of shard {number}/{count} isn't in the order of the tree's leaves")
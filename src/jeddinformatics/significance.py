@@ -0,0 +1,317 @@
+import os
+import math
+from typing import Callable, NamedTuple
+from loguru import logger
+import numpy as np
+import pandas as pd
+from jeddinformatics import aggregate, plot_data, profiling
+
+STATS_FILE_NAME = "all_stats.csv"
+STATS_COLUMNS = [
+    "gene",
+    "cancer",
+    "source",
+    "reference",
+    "series",
+    "n_reference",
+    "n_series",
+    "mean_reference",
+    "mean_series",
+    "mean_difference",
+    "fold_change",
+    "mannwhitney_u",
+    "mannwhitney_p",
+    "mannwhitney_q",
+    "welch_t",
+    "welch_df",
+    "welch_p",
+    "welch_q",
+]
+# the continued fraction of the incomplete beta function converges in far fewer steps for any realistic df
+BETA_MAX_ITERATIONS = 1000
+BETA_EPSILON = 1e-15
+BETA_TINY = 1e-300
+
+erfc = np.vectorize(math.erfc, otypes=[float])
+lgamma = np.vectorize(math.lgamma, otypes=[float])
+
+
+def output_path(root_directory: str) -> str:
+    return os.path.join(root_directory, STATS_FILE_NAME)
+
+
+def normal_two_sided_p(z: np.ndarray) -> np.ndarray:
+    return np.minimum(erfc(np.abs(z) / math.sqrt(2)), 1.0)
+
+
+def beta_continued_fraction(x: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the continued fraction of the incomplete beta function for every element at once with the
+    modified Lentz method, stopping once every element has converged.
+    """
+
+    def guard(value: np.ndarray) -> np.ndarray:
+        return np.where(np.abs(value) < BETA_TINY, BETA_TINY, value)
+
+    c = np.ones_like(x)
+    d = 1 / guard(1 - (a + b) * x / (a + 1))
+    fraction = d
+    for m in range(1, BETA_MAX_ITERATIONS + 1):
+        even = m * (b - m) * x / ((a - 1 + 2 * m) * (a + 2 * m))
+        d = 1 / guard(1 + even * d)
+        c = guard(1 + even / c)
+        fraction = fraction * d * c
+        odd = -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 1 + 2 * m))
+        d = 1 / guard(1 + odd * d)
+        c = guard(1 + odd / c)
+        delta = d * c
+        fraction = fraction * delta
+        if np.all(np.abs(delta - 1) < BETA_EPSILON):
+            break
+    return fraction
+
+
+def regularized_beta(x: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Returns the regularized incomplete beta function I_x(a, b) elementwise, NaN where it isn't defined.
+    """
+    x, a, b = (np.asarray(array, dtype="float64") for array in np.broadcast_arrays(x, a, b))
+    valid = (x >= 0) & (x <= 1) & (a > 0) & (b > 0)
+    x, a, b = np.where(valid, x, 0.5), np.where(valid, a, 1.0), np.where(valid, b, 1.0)
+    # the fraction converges quickly below the mean of the distribution, above it I_x(a, b) = 1 - I_1-x(b, a)
+    swap = x > (a + 1) / (a + b + 2)
+    x, a, b = np.where(swap, 1 - x, x), np.where(swap, b, a), np.where(swap, a, b)
+    with np.errstate(divide="ignore"):
+        front = np.exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * np.log(x) + b * np.log1p(-x)) / a
+    value = front * beta_continued_fraction(x, a, b)
+    return np.where(valid, np.where(swap, 1 - value, value), np.nan)
+
+
+def student_t_two_sided_p(t: np.ndarray, df: np.ndarray) -> np.ndarray:
+    return regularized_beta(df / (df + t * t), df / 2, 0.5)
+
+
+def mann_whitney(
+    values: np.ndarray, comparison: np.ndarray, compared: np.ndarray, count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Runs a two-sided Mann-Whitney U test for each of 'count' comparisons in one pass.
+
+    'values' holds the values of every comparison, 'comparison' says which comparison each belongs to and
+    'compared' whether it is in the compared series rather than the reference. A single sort by comparison and
+    value ranks everything, ties get their average rank. Returns U of the compared series and the p-value
+    from the normal approximation with tie and continuity correction, NaN where a series is empty or every
+    value is tied.
+    """
+    order = np.lexsort((values, comparison))
+    sorted_values, sorted_comparison = values[order], comparison[order]
+    sizes = np.bincount(comparison, minlength=count).astype("float64")
+    n_compared = np.bincount(comparison, weights=compared, minlength=count)
+    n_reference = sizes - n_compared
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    # a run of equal values within a comparison is one block of ties
+    block_starts = np.flatnonzero(
+        np.concatenate([[True], (np.diff(sorted_values) != 0) | (np.diff(sorted_comparison) != 0)])
+    )
+    block_sizes = np.diff(np.append(block_starts, len(values))).astype("float64")
+    block_ranks = block_starts - offsets[sorted_comparison[block_starts]] + (block_sizes + 1) / 2
+    ranks = np.repeat(block_ranks, block_sizes.astype(np.intp))
+    rank_sums = np.bincount(sorted_comparison, weights=ranks * compared[order], minlength=count)
+    ties = np.bincount(
+        sorted_comparison[block_starts], weights=block_sizes**3 - block_sizes, minlength=count
+    )
+    u = rank_sums - n_compared * (n_compared + 1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.sqrt(n_reference * n_compared / 12 * ((sizes + 1) - ties / (sizes * (sizes - 1))))
+        z = (np.abs(u - n_reference * n_compared / 2) - 0.5) / sigma
+    p = np.where((n_reference > 0) & (n_compared > 0) & (sigma > 0), normal_two_sided_p(np.maximum(z, 0)), np.nan)
+    return np.where((n_reference > 0) & (n_compared > 0), u, np.nan), p
+
+
+def welch(
+    values: np.ndarray, comparison: np.ndarray, compared: np.ndarray, count: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs a two-sided Welch t-test (compared minus reference) for each of 'count' comparisons in one pass,
+    laid out like mann_whitney. Returns t, the Welch-Satterthwaite degrees of freedom and p, NaN where a
+    series has fewer than two values or neither varies.
+    """
+    group = comparison * 2 + compared
+    sizes = np.bincount(group, minlength=2 * count).astype("float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.bincount(group, weights=values, minlength=2 * count) / sizes
+        variances = np.bincount(group, weights=(values - means[group]) ** 2, minlength=2 * count) / (sizes - 1)
+        errors = (variances / sizes).reshape(count, 2)
+        sizes, means = sizes.reshape(count, 2), means.reshape(count, 2)
+        squared_error = errors.sum(axis=1)
+        t = (means[:, 1] - means[:, 0]) / np.sqrt(squared_error)
+        df = squared_error**2 / (errors[:, 0] ** 2 / (sizes[:, 0] - 1) + errors[:, 1] ** 2 / (sizes[:, 1] - 1))
+    valid = (sizes.min(axis=1) > 1) & (squared_error > 0)
+    t, df = np.where(valid, t, np.nan), np.where(valid, df, np.nan)
+    return t, df, student_t_two_sided_p(t, df)
+
+
+def benjamini_hochberg(p: np.ndarray) -> np.ndarray:
+    """
+    Returns the Benjamini-Hochberg adjusted p-values (q-values) of 'p', NaNs are left out of the family.
+    """
+    p = np.asarray(p, dtype="float64")
+    q = np.full(p.shape, np.nan)
+    tested = np.flatnonzero(np.isfinite(p))
+    order = tested[np.argsort(p[tested], kind="stable")]
+    adjusted = p[order] * len(order) / np.arange(1, len(order) + 1)
+    q[order] = np.minimum(np.minimum.accumulate(adjusted[::-1])[::-1], 1.0)
+    return q
+
+
+class Comparison(NamedTuple):
+    series_name: object
+    reference: np.ndarray
+    values: np.ndarray
+
+
+def leaf_comparisons(dataset: pd.DataFrame, precedence: list[str] = [], is_gene: bool = False) -> tuple[object, list]:
+    """
+    Pairs the series of a leaf's dataset like its plot orders them: the first series, if it is named in
+    'precedence' (normal tissue in the default config), is the reference every other series is compared to.
+
+    Returns the reference's name and a Comparison per other series, or None and nothing without a reference.
+    Values are on the plotted scale (log2 for gene expression) and only the finite ones are tested, like the
+    boxes only show those.
+    """
+    series = [
+        (name, values[np.isfinite(values)]) for name, values in plot_data.prepare_series(dataset, precedence, is_gene)
+    ]
+    if not series or series[0][0] not in precedence:
+        return None, []
+    reference_name, reference = series[0]
+    return reference_name, [Comparison(name, reference, values) for name, values in series[1:]]
+
+
+def batch_tests(comparisons: list[Comparison]) -> pd.DataFrame:
+    """
+    Returns the means, fold change and both tests of every comparison, computed for all of them together.
+    """
+    count = len(comparisons)
+    lengths = np.array([[len(item.reference), len(item.values)] for item in comparisons], dtype=np.intp).reshape(-1, 2)
+    values = np.concatenate([array for item in comparisons for array in (item.reference, item.values)] or [[]])
+    comparison = np.repeat(np.arange(count), lengths.sum(axis=1))
+    compared = np.concatenate([np.repeat([0, 1], pair) for pair in lengths] or [np.zeros(0, dtype=np.intp)])
+    with profiling.span("stats", comparisons=count):
+        u, u_p = mann_whitney(values, comparison, compared, count)
+        t, df, t_p = welch(values, comparison, compared, count)
+        group = comparison * 2 + compared
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = (
+                np.bincount(group, weights=values, minlength=2 * count) / np.bincount(group, minlength=2 * count)
+            ).reshape(count, 2)
+    return pd.DataFrame(
+        {
+            "n_reference": lengths[:, 0],
+            "n_series": lengths[:, 1],
+            "mean_reference": means[:, 0],
+            "mean_series": means[:, 1],
+            "mean_difference": means[:, 1] - means[:, 0],
+            "mannwhitney_u": u,
+            "mannwhitney_p": u_p,
+            "welch_t": t,
+            "welch_df": df,
+            "welch_p": t_p,
+        }
+    )
+
+
+def leaf_annotations(dataset: pd.DataFrame, precedence: list[str] = [], is_gene: bool = False) -> dict[object, str]:
+    """
+    Returns the text to put above each compared series' box: its Mann-Whitney p-value against the reference.
+    These are unadjusted since the FDR correction needs every leaf, the q-values are in all_stats.csv.
+    """
+    _, comparisons = leaf_comparisons(dataset, precedence, is_gene)
+    if not comparisons:
+        return {}
+    tests = batch_tests(comparisons)
+    return {
+        item.series_name: f"p = {p:.2g}" for item, p in zip(comparisons, tests["mannwhitney_p"]) if np.isfinite(p)
+    }
+
+
+class StatsWriter:
+    """
+    Passes every leaf's dataset on to 'writer' (the aggregate) and pairs up its series as it goes, then on
+    close tests every comparison of every gene, cancer type and source in one vectorized batch and writes
+    them to all_stats.csv, with q-values corrected for the false discovery rate across the whole table.
+
+    'is_gene' says for each leaf index whether it is gene expression, which is tested on the log2 scale.
+    Only the finite values of each series are kept until close, in leaf order whatever order they arrive in.
+    """
+
+    def __init__(
+        self,
+        root_directory: str,
+        config: dict,
+        is_gene: list[bool],
+        writer: aggregate.AggregateWriter = None,
+        translation_func: Callable[[str, object], str] = plot_data.default_translation,
+    ):
+        self.path = output_path(root_directory)
+        self.config = config
+        self.is_gene = is_gene
+        self.writer = writer
+        self.translation_func = translation_func
+        self.rows: dict[int, list[tuple[list, Comparison]]] = {}
+        self.aborted = False
+
+    def add(
+        self,
+        index: int,
+        dataset: pd.DataFrame,
+        gene_or_protein: str = "",
+        cancer_type: str = "",
+        source_database: str = "",
+    ) -> None:
+        if self.writer is not None:
+            self.writer.add(index, dataset, gene_or_protein, cancer_type, source_database)
+        if self.aborted or dataset is None:
+            return
+        reference_name, comparisons = leaf_comparisons(dataset, self.config["precedence"], self.is_gene[index])
+        if reference_name is None:
+            logger.debug(f"no reference series for {gene_or_protein} in {cancer_type} from {source_database}")
+        mappings = self.config["mappings"]
+
+        def label(series_name: object) -> str:
+            return plot_data.series_label(series_name, cancer_type, self.translation_func, mappings)
+
+        self.rows[index] = [
+            ([gene_or_protein, cancer_type, source_database, label(reference_name), label(item.series_name)], item)
+            for item in comparisons
+        ]
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        if self.aborted:
+            return
+        indices = sorted(self.rows)
+        leaves = [self.rows[index] for index in indices]
+        self.rows = {}
+        described = [row for leaf in leaves for row, _ in leaf]
+        is_gene = np.array([self.is_gene[index] for index, leaf in zip(indices, leaves) for _ in leaf], dtype=bool)
+        tests = batch_tests([item for leaf in leaves for _, item in leaf])
+        table = pd.concat(
+            [pd.DataFrame(described, columns=["gene", "cancer", "source", "reference", "series"]), tests], axis=1
+        )
+        # gene expression is tested in log2, so the difference of the means is the log2 of the geometric fold
+        # change, protein Z-values have no fold change
+        table["fold_change"] = np.where(is_gene, np.exp2(table["mean_difference"]), np.nan)
+        table["mannwhitney_q"] = benjamini_hochberg(table["mannwhitney_p"])
+        table["welch_q"] = benjamini_hochberg(table["welch_p"])
+        temporary = aggregate.temporary_path(self.path)
+        table[STATS_COLUMNS].to_csv(temporary, index=False)
+        os.replace(temporary, self.path)
+        logger.info(f"tested {len(table)} comparisons into {self.path}")
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.abort()
+        self.aborted = True
+        self.rows = {}
@@ -0,0 +1,157 @@
+import os
+from typing import NamedTuple
+from jeddinformatics import build_cache, plot_data
+
+# themes are drawn into '<root>/themes/<name>', mirroring the tree
+THEMES_DIRECTORY = "themes"
+
+
+class Theme(NamedTuple):
+    """
+    A config to plot with and the folder its plots go into, beside the data when 'directory' is None.
+
+    The themes given with '--theme' mirror the tree under 'directory', so a leaf's plot in the theme
+    'slides' is '<root>/themes/slides/<the leaf's folders>/data.png'.
+    """
+
+    name: str
+    config: dict
+    root_directory: str = None
+    directory: str = None
+
+    def output_path(self, path: str) -> str:
+        """Returns where this theme writes the output that goes to 'path' beside the data."""
+        if self.directory is None:
+            return path
+        return os.path.join(self.directory, os.path.relpath(path, self.root_directory))
+
+    def output_directory(self, path: str) -> str:
+        # creates the mirrored folder of 'path' on first use
+        output = self.output_path(path)
+        if self.directory is not None:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        return output
+
+
+def new_theme(root_directory: str, name: str, config: dict) -> Theme:
+    return Theme(name, config, root_directory, os.path.join(root_directory, THEMES_DIRECTORY, name))
+
+
+def cache_file_name(theme: Theme, file_name: str) -> str:
+    # every theme keeps its build cache in its own folder, relative to the root like the main one
+    return os.path.join(THEMES_DIRECTORY, theme.name, file_name)
+
+
+def image_formats(config: dict) -> list[str]:
+    return plot_data.render_profile(config)["formats"]
+
+
+class ThemePlan(NamedTuple):
+    """What is out of date in one theme, against the theme's own build cache."""
+
+    theme: Theme
+    cache: build_cache.BuildCache
+    leaf_digests: dict[str, str]
+    stale_leaves: set[str]
+    merged_digests: dict[str, str]
+    stale_merged: set[str]
+
+
+def merged_digest(cache: build_cache.BuildCache, inputs: list[str], csv_digests: dict[str, str]) -> str:
+    # a merged plot is out of date when any of its CSVs changed
+    return cache.combined_digest([f"{cache.key(csv)}={csv_digests.get(csv) or cache.file_digest(csv)}" for csv in inputs])
+
+
+def plan_theme(
+    theme: Theme, cache: build_cache.BuildCache, leaves: list, merged_cancer_sources: dict[str, list[str]]
+) -> ThemePlan:
+    """
+    Works out which of 'leaves' and merged plots 'theme' has to draw again, the plots it is missing or that
+    were drawn from other data or with another version of its config.
+    """
+    formats = image_formats(theme.config)
+    merged_outputs = ["merged", "atlas"] if theme.config.get("atlas", False) else ["merged"]
+    file_digests: dict[str, str] = {}
+    leaf_digests: dict[str, str] = {}
+    csv_digests: dict[str, str] = {}
+    stale_leaves = set()
+    for leaf in leaves:
+        if leaf.file_path not in file_digests:
+            file_digests[leaf.file_path] = cache.file_digest(leaf.file_path)
+        digest = leaf_digests[leaf.key] = csv_digests[leaf.data_path] = file_digests[leaf.file_path]
+        outputs = [theme.output_path(leaf.output_path(format)) for format in formats]
+        if not theme.config.get("gene_plots", True):
+            outputs = []
+        if not cache.is_fresh(leaf.key, digest, outputs):
+            stale_leaves.add(leaf.key)
+    merged_digests = {
+        source: merged_digest(cache, inputs, csv_digests) for source, inputs in merged_cancer_sources.items()
+    }
+    stale_merged = {
+        source
+        for source in merged_cancer_sources
+        if not cache.is_fresh(
+            source,
+            merged_digests[source],
+            [theme.output_path(os.path.join(source, f"{name}.{format}")) for name in merged_outputs for format in formats],
+        )
+    }
+    return ThemePlan(theme, cache, leaf_digests, stale_leaves, merged_digests, stale_merged)
+
+
+def update_theme_cache(plan: ThemePlan, tasks: list, completed: list[bool], failures: list[str]) -> None:
+    """
+    Records the plots 'plan' drew successfully in its build cache and saves it.
+    """
+    for (leaf, _), done in zip(tasks, completed):
+        if done and leaf.key in plan.stale_leaves:
+            plan.cache.update(leaf.key, plan.leaf_digests[leaf.key])
+    if not failures:
+        for source in plan.stale_merged:
+            plan.cache.update(source, plan.merged_digests[source])
+    os.makedirs(plan.theme.directory, exist_ok=True)
+    plan.cache.save()
+
+
+class Targets(NamedTuple):
+    """The themes each leaf (by key) and merged plot (by folder) has to be drawn in, the base theme included."""
+
+    leaves: dict[str, list[Theme]]
+    merged: dict[str, list[Theme]]
+
+
+def plan_targets(
+    base: Theme,
+    leaves: list,
+    rebuild: list[bool],
+    merged_cancer_sources: dict[str, list[str]],
+    stale_merged: set[str],
+    theme_plans: list[ThemePlan],
+) -> Targets:
+    """
+    Combines what is out of date beside the data ('rebuild' and 'stale_merged', drawn with 'base') with what
+    is out of date in each theme.
+    """
+    leaf_targets = {
+        leaf.key: ([base] if needs_rebuild else []) + [plan.theme for plan in theme_plans if leaf.key in plan.stale_leaves]
+        for leaf, needs_rebuild in zip(leaves, rebuild)
+    }
+    merged_targets = {
+        source: ([base] if source in stale_merged else [])
+        + [plan.theme for plan in theme_plans if source in plan.stale_merged]
+        for source in merged_cancer_sources
+    }
+    return Targets(leaf_targets, merged_targets)
+
+
+def unit_themes(targets: Targets, unit: list) -> list[list[Theme]]:
+    # None leaves process_unit to draw the rebuilt leaves beside the data, like a run without themes
+    if targets is None:
+        return None
+    return [targets.leaves.get(leaf.key, []) for leaf, _ in unit]
+
+
+def merged_themes(targets: Targets, source: str) -> list[Theme]:
+    if targets is None:
+        return None
+    return targets.merged.get(source, [])
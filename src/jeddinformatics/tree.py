@@ -0,0 +1,298 @@
+import os
+import json
+from loguru import logger
+import numpy as np
+import pandas as pd
+from jeddinformatics import convert_and_plot
+from jeddinformatics import aggregate
+from jeddinformatics import build_cache
+from jeddinformatics import dataset_cache
+from jeddinformatics import intermediate
+from jeddinformatics import plot_data
+from jeddinformatics import walker
+
+INDEX_FILE_NAME = ".jeddinformatics_index.json"
+# bumped whenever the layout of the index file changes, older indexes are rebuilt
+INDEX_VERSION = 1
+LEVELS = ["expression", "source", "cancer", "gene"]
+INDEX_COLUMNS = ["file", "is_gene", "gene_column", "wide"]
+
+
+def default_patterns() -> list[str]:
+    # the same patterns as the build, in the same order
+    return convert_and_plot.load_patterns(
+        convert_and_plot.local_or_default(".dirignore")
+    ) + convert_and_plot.load_patterns(convert_and_plot.local_or_default(".fileignore"))
+
+
+def relevant_entries(entries: list[str]) -> list[str]:
+    """
+    Returns the entries of a directory listing that decide what the index holds, the data.csv or data.jbin
+    written beside a data.json or data.txt is an output so creating it doesn't make the index stale.
+    """
+    if any(name in entries for name in walker.SOURCE_FILE_NAMES):
+        return [entry for entry in entries if entry not in intermediate.FILE_NAMES]
+    return entries
+
+
+def leaf_record(root_directory: str, leaf: convert_and_plot.Leaf, expression: str) -> dict:
+    return {
+        "expression": expression,
+        "source": leaf.source_database,
+        "cancer": leaf.cancer_type,
+        "gene": leaf.gene_or_protein,
+        "file": os.path.relpath(leaf.file_path, root_directory),
+        "is_gene": leaf.is_gene,
+        "gene_column": leaf.gene_column,
+        "wide": leaf.wide,
+    }
+
+
+def scan_tree(root_directory: str, matcher: walker.IgnoreMatcher) -> dict:
+    """
+    Walks 'root_directory' once and returns the index of every leaf under it, along with the directory
+    listings and data.txt signatures it was built from.
+
+    data.csv and data.jbin files are only indexed when they aren't the output of a data.json or data.txt, i.e.
+    when they were copied into the tree on their own, like find_leaves.
+    """
+    listings: dict[str, tuple[int, list[str]]] = {}
+    sources: dict[str, tuple[int, int]] = {}
+    records = []
+    output_folders: set[str] = set()
+    for data_file in walker.walk_data_files(root_directory, matcher, listings=listings):
+        if data_file.name in intermediate.FILE_NAMES:
+            if convert_and_plot.is_standalone_data(data_file.file_path, output_folders):
+                output_folders.add(os.path.dirname(data_file.file_path))
+                leaf = convert_and_plot.Leaf(
+                    file_path=data_file.file_path,
+                    gene_or_protein=data_file.folder,
+                    cancer_type=data_file.cancer_type,
+                    source_database=data_file.source_database,
+                    is_gene=data_file.is_gene,
+                )
+                records.append(leaf_record(root_directory, leaf, data_file.expression))
+            continue
+        if data_file.name == "data.txt":
+            # the header decides whether it's a wide export so it's part of what the index depends on
+            sources[os.path.relpath(data_file.file_path, root_directory)] = dataset_cache.file_signature(
+                data_file.file_path
+            )
+        for leaf in convert_and_plot.leaves_for_file(data_file):
+            output_folders.add(os.path.dirname(leaf.output_path("csv")))
+            expression = data_file.source_database if leaf.wide else data_file.expression
+            records.append(leaf_record(root_directory, leaf, expression))
+    return {
+        "version": INDEX_VERSION,
+        "package": build_cache.package_version(),
+        "patterns": build_cache.hash_strings(*matcher_patterns(matcher)),
+        "directories": {relative: [modified, relevant_entries(entries)] for relative, (modified, entries) in listings.items()},
+        "sources": {relative: list(signature) for relative, signature in sources.items()},
+        "leaves": records,
+    }
+
+
+def matcher_patterns(matcher: walker.IgnoreMatcher) -> list[str]:
+    return [rule.pattern for rule in matcher.rules]
+
+
+def read_index(path: str) -> dict:
+    try:
+        with open(path, "r") as index_file:
+            index = json.load(index_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"tree index '{path}' couldn't be read with {e}, scanning the tree again")
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def write_index(path: str, index: dict) -> None:
+    # written in place rather than renamed over, replacing it would change the root's modification time
+    try:
+        with open(path, "w") as index_file:
+            json.dump(index, index_file)
+    except OSError as e:
+        logger.warning(f"tree index '{path}' couldn't be written with {e}")
+
+
+def sources_are_current(root_directory: str, sources: dict[str, list[int]]) -> bool:
+    try:
+        return all(
+            list(dataset_cache.file_signature(os.path.join(root_directory, relative))) == signature
+            for relative, signature in sources.items()
+        )
+    except OSError:
+        return False
+
+
+def listing_is_current(root_directory: str, relative: str, listing: list, matcher: walker.IgnoreMatcher) -> bool:
+    directory = os.path.join(root_directory, relative)
+    try:
+        modified = os.stat(directory).st_mtime_ns
+        if modified == listing[0]:
+            return True
+        files, subdirectories = walker.list_directory(directory, relative, matcher)
+    except OSError:
+        return False
+    if relevant_entries([entry.name for entry in files] + [path for _, path in subdirectories]) != listing[1]:
+        return False
+    listing[0] = modified
+    return True
+
+
+def index_is_current(root_directory: str, index: dict, matcher: walker.IgnoreMatcher) -> bool:
+    """
+    Checks a persisted index against the tree with stat calls only where possible.
+
+    A directory whose modification time changed is listed again and is still current when the entries that
+    matter are the same (the root for one changes on every build that writes the aggregate), its recorded
+    time is updated in 'index' so the next check is stat only again. Returns False as soon as something the
+    index depends on was added, removed or edited.
+    """
+    return (
+        index.get("package") == build_cache.package_version()
+        and index.get("patterns") == build_cache.hash_strings(*matcher_patterns(matcher))
+        and sources_are_current(root_directory, index["sources"])
+        and all(
+            listing_is_current(root_directory, relative, listing, matcher)
+            for relative, listing in index["directories"].items()
+        )
+    )
+
+
+def is_current(data_path: str, source_path: str) -> bool:
+    try:
+        return os.stat(data_path).st_mtime_ns >= os.stat(source_path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def load_leaf(leaf: convert_and_plot.Leaf) -> pd.DataFrame:
+    """
+    Loads the dataset of a leaf from what it was converted into when that isn't older than the source file (a
+    data.jbin before a data.csv, it's mapped rather than parsed) and from the source file otherwise, going
+    through the dataset cache like the build does.
+    """
+    if os.path.basename(leaf.file_path) in intermediate.FILE_NAMES:
+        return dataset_cache.default_cache.get(leaf.file_path, lambda: plot_data.read_dataset(leaf.file_path))
+    for extension in reversed(intermediate.FORMATS.values()):
+        data_path = leaf.output_path(extension)
+        if is_current(data_path, leaf.file_path):
+            return dataset_cache.default_cache.get(data_path, lambda: plot_data.read_dataset(data_path))
+    return dataset_cache.default_cache.get(leaf.file_path, lambda: convert_and_plot.parse_leaf(leaf), key=leaf.key)
+
+
+class ExpressionTree:
+    """
+    Index of the leaves under a data tree by expression type, source, cancer type and gene or protein.
+
+    'index' has one row per leaf with the file it's read from, nothing is parsed until a leaf is asked for
+    through load or query and parsed datasets are kept in the dataset cache, so asking again is free until
+    the file changes.
+    """
+
+    def __init__(self, root_directory: str, records: list[dict]):
+        self.root_directory = root_directory
+        self.index = pd.DataFrame(records, columns=LEVELS + INDEX_COLUMNS).set_index(LEVELS).sort_index()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self) -> str:
+        return f"ExpressionTree({self.root_directory!r}, {len(self)} leaves)"
+
+    def leaf(self, key: tuple[str, str, str, str], row) -> convert_and_plot.Leaf:
+        expression, source, cancer, gene = key
+        return convert_and_plot.Leaf(
+            file_path=os.path.join(self.root_directory, row.file),
+            gene_or_protein=gene,
+            cancer_type=cancer,
+            source_database=source,
+            is_gene=bool(row.is_gene),
+            gene_column=row.gene_column if isinstance(row.gene_column, str) else None,
+            wide=bool(row.wide),
+        )
+
+    def select(
+        self,
+        expression: str | list[str] = None,
+        source: str | list[str] = None,
+        cancer: str | list[str] = None,
+        gene: str | list[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns the rows of the index matching every filter given, each one a name or a list of names.
+        """
+        mask = np.ones(len(self.index), dtype=bool)
+        for level, names in zip(LEVELS, (expression, source, cancer, gene)):
+            if names is None:
+                continue
+            if isinstance(names, str):
+                names = [names]
+            mask &= self.index.index.get_level_values(level).isin(names)
+        return self.index[mask]
+
+    def load(self, expression: str, source: str, cancer: str, gene: str) -> pd.DataFrame:
+        """
+        Returns the dataset of one leaf, raises a KeyError when the tree doesn't have it.
+        """
+        selected = self.select(expression, source, cancer, gene)
+        if selected.empty:
+            raise KeyError((expression, source, cancer, gene))
+        key, row = next(selected.iterrows())
+        return load_leaf(self.leaf(key, row))
+
+    def query(
+        self,
+        expression: str | list[str] = None,
+        source: str | list[str] = None,
+        cancer: str | list[str] = None,
+        gene: str | list[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns every value of the leaves matching the filters (see select) as one long DataFrame with a sorted
+        index of expression, source, cancer, gene and series, reading only the files of those leaves.
+        """
+        frames = []
+        for row in self.select(expression, source, cancer, gene).itertuples():
+            key = row.Index
+            dataset = load_leaf(self.leaf(key, row))
+            rows = aggregate.long_rows(dataset, gene_or_protein=key[3], cancer_type=key[2], source_database=key[1])
+            rows.insert(0, "expression", key[0])
+            frames.append(rows)
+        if not frames:
+            frames.append(pd.DataFrame(columns=["expression"] + aggregate.LONG_COLUMNS))
+        # sorted so lookups with .loc don't have to scan past the lexsort depth
+        return pd.concat(frames, ignore_index=True).set_index(LEVELS + ["series"]).sort_index(kind="stable")
+
+
+def open_tree(
+    root_directory: str = ".", patterns: list[str] = None, refresh: bool = False, persist: bool = True
+) -> ExpressionTree:
+    """
+    Returns the ExpressionTree of 'root_directory'.
+
+    The index is kept in INDEX_FILE_NAME at the root so opening the tree again only has to stat what it was
+    built from, it's rebuilt when anything it depends on changed or with 'refresh'. 'patterns' defaults to
+    the .dirignore and .fileignore patterns the build uses, 'persist' turns off reading and writing the
+    index file, e.g. for a tree that isn't writable.
+    """
+    matcher = walker.IgnoreMatcher(default_patterns() if patterns is None else patterns)
+    path = os.path.join(root_directory, INDEX_FILE_NAME)
+    index = read_index(path) if persist and not refresh else None
+    if index is not None:
+        listings = json.dumps(index["directories"], sort_keys=True)
+        if index_is_current(root_directory, index, matcher):
+            logger.debug(f"using the tree index in '{path}'")
+            if persist and json.dumps(index["directories"], sort_keys=True) != listings:
+                write_index(path, index)
+            return ExpressionTree(root_directory, index["leaves"])
+        logger.info(f"tree index '{path}' is out of date, scanning the tree again")
+    index = scan_tree(root_directory, matcher)
+    if persist:
+        write_index(path, index)
+    return ExpressionTree(root_directory, index["leaves"])
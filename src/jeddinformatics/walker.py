@@ -0,0 +1,208 @@
+import os
+import re
+from typing import Iterator, NamedTuple
+from loguru import logger
+
+SOURCE_FILE_NAMES = ("data.json", "data.txt")
+# data.csv and data.jbin are either converted from a source file beside them or data of their own
+DATA_FILE_NAMES = (*SOURCE_FILE_NAMES, "data.csv", "data.jbin")
+
+
+class IgnoreRule(NamedTuple):
+    pattern: str
+    regex: re.Pattern
+    negate: bool
+    directory_only: bool
+
+
+def translate_segment(segment: str) -> str:
+    """
+    Translates one path segment of a glob into a regex, '*' and '?' never match a '/'.
+    """
+    regex = ""
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        index += 1
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "\\" and index < len(segment):
+            regex += re.escape(segment[index])
+            index += 1
+        elif char == "[":
+            end = segment.find("]", index + 1 if segment[index:index + 1] in ("!", "]") else index)
+            if end == -1:
+                regex += "\\["
+                continue
+            body = segment[index:end]
+            index = end + 1
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex += "[" + body.replace("\\", "\\\\").replace("[", "\\[") + "]"
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+def parse_rule(line: str) -> IgnoreRule:
+    """
+    Parses a line of an ignore file with gitignore semantics, None for blank lines and comments.
+
+    A leading '!' re-includes what an earlier pattern ignored, a trailing '/' only matches directories and
+    a pattern with a '/' anywhere else is relative to the root of the walk, otherwise it matches a name at
+    any depth. '*' and '?' stay within a path segment while '**' spans any number of them.
+    """
+    pattern = line.strip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith(("\\!", "\\#")):
+        pattern = pattern[1:]
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    anchored = "/" in pattern
+    segments = pattern.lstrip("/").split("/")
+    regex = "" if anchored else "(?:.*/)?"
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == "**":
+            regex += ".*" if last else "(?:.*/)?"
+        else:
+            regex += translate_segment(segment) + ("" if last else "/")
+    return IgnoreRule(line.strip(), re.compile(regex), negate, directory_only)
+
+
+class IgnoreMatcher:
+    """
+    Ignore patterns compiled once and matched against paths relative to the root of the walk.
+
+    All of the rules are also joined into a single regex so the common case, a path that nothing matches,
+    is settled by one match call. Only paths it matches go through the rules one by one, the last rule that
+    matches decides like in a .gitignore.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.rules = [rule for rule in map(parse_rule, patterns) if rule is not None]
+        self.any_rule = re.compile("|".join(f"(?:{rule.regex.pattern})" for rule in self.rules) or "(?!)")
+
+    def match(self, relative_path: str, is_directory: bool = False) -> str:
+        """
+        Returns the pattern that ignores 'relative_path' ('/' separated), None if it isn't ignored.
+        """
+        if not self.any_rule.fullmatch(relative_path):
+            return None
+        for rule in reversed(self.rules):
+            if rule.directory_only and not is_directory:
+                continue
+            if rule.regex.fullmatch(relative_path):
+                return None if rule.negate else rule.pattern
+        return None
+
+    def ignores(self, relative_path: str, is_directory: bool = False) -> bool:
+        """
+        Whether 'relative_path' or any directory above it is ignored, i.e. whether a walk would skip it.
+        """
+        parts = relative_path.split("/")
+        return any(
+            self.match("/".join(parts[:depth]), is_directory or depth < len(parts)) is not None
+            for depth in range(1, len(parts) + 1)
+        )
+
+
+class DataFile(NamedTuple):
+    """
+    A data file found by the walk along with the folder names above it, from the nearest up.
+
+    In the expected layout these are the gene or protein, the cancer type, the source database and
+    whether it is gene or protein expression. Missing levels (a file too close to the filesystem root)
+    are empty strings.
+    """
+
+    file_path: str
+    name: str
+    folder: str
+    cancer_type: str
+    source_database: str
+    expression: str
+
+    @property
+    def is_gene(self) -> bool:
+        return self.expression.lower().find("gene") != -1
+
+
+def data_file(file_path: str, name: str) -> DataFile:
+    components = [""] * 4 + file_path.split(os.sep)[:-1]
+    return DataFile(file_path, name, components[-1], components[-2], components[-3], components[-4])
+
+
+def walk_data_files(
+    root_directory: str,
+    matcher: IgnoreMatcher,
+    names: tuple[str, ...] = DATA_FILE_NAMES,
+    listings: dict[str, tuple[int, list[str]]] = None,
+) -> Iterator[DataFile]:
+    """
+    Yields the files called one of 'names' under 'root_directory' that 'matcher' doesn't ignore.
+
+    Each directory's files come before its subdirectories and both are sorted by name, so the order is the
+    same on every run. Ignored directories are never opened and symlinked directories aren't followed.
+    'listings', when given, gets the modification time and list_directory's entries of every directory walked
+    by its path relative to 'root_directory' ('' for the root), which is enough to tell later if the walk
+    would find something different.
+    """
+    yield from _walk(root_directory, "", matcher, names, listings)
+
+
+def list_directory(
+    directory: str, relative: str, matcher: IgnoreMatcher, names: tuple[str, ...] = DATA_FILE_NAMES
+) -> tuple[list[os.DirEntry], list[tuple[str, str]]]:
+    """
+    Lists 'directory' (at 'relative' under the root, '' or ending in '/') and returns the data files called
+    one of 'names' along with the path and relative path of each subdirectory to walk, sorted by name.
+    """
+    with os.scandir(directory) as scan:
+        entries = sorted(scan, key=lambda entry: entry.name)
+    files = []
+    subdirectories = []
+    for entry in entries:
+        relative_path = f"{relative}{entry.name}"
+        try:
+            is_directory = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        pattern = matcher.match(relative_path, is_directory)
+        if pattern is not None:
+            logger.debug(f"skipping {entry.path} because it matched ignored pattern: {pattern}")
+            continue
+        if is_directory:
+            subdirectories.append((entry.path, f"{relative_path}/"))
+        elif entry.name in names:
+            files.append(entry)
+    return files, subdirectories
+
+
+def _walk(
+    directory: str,
+    relative: str,
+    matcher: IgnoreMatcher,
+    names: tuple[str, ...],
+    listings: dict[str, tuple[int, list[str]]] = None,
+) -> Iterator[DataFile]:
+    try:
+        modified = os.stat(directory).st_mtime_ns if listings is not None else None
+        files, subdirectories = list_directory(directory, relative, matcher, names)
+    except OSError as e:
+        logger.warning(f"couldn't list {directory} with {e}, skipping it")
+        return
+    if listings is not None:
+        listings[relative] = (modified, [entry.name for entry in files] + [path for _, path in subdirectories])
+    for entry in files:
+        yield data_file(entry.path, entry.name)
+    for path, relative_path in subdirectories:
+        yield from _walk(path, relative_path, matcher, names, listings)
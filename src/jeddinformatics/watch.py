@@ -0,0 +1,304 @@
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+from typing import Callable, NamedTuple, Union
+from loguru import logger
+from jeddinformatics import aggregate, build_cache, convert_and_plot, dataset_cache, intermediate, plot_data, walker
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# a file is only picked up once it has been closed after writing or moved in, not on every partial write
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+REMOVED_MASK = IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+# struct inotify_event without its name: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct("iIII")
+
+SOURCE_FILE_NAMES = walker.SOURCE_FILE_NAMES
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 2.0
+# changes to more files than this are rebuilt with the pool, fewer stay in the already warm main process
+PARALLEL_THRESHOLD = 8
+
+
+class Change(NamedTuple):
+    path: str
+    is_directory: bool = False
+    removed: bool = False
+
+
+def output_name(name: str) -> bool:
+    # everything that a run writes at the root of the tree
+    return name.startswith(aggregate.BASE_NAME) or name == build_cache.CACHE_FILE_NAME
+
+
+class InotifyWatcher:
+    """
+    Watches every directory under 'root_directory' through inotify, called through ctypes so nothing extra
+    needs installing. Directories created later are watched as they appear and any data files already
+    in them (copied in before the watch was added) are reported as changes.
+    """
+
+    def __init__(self, root_directory: str, matcher: walker.IgnoreMatcher):
+        self.root_directory = root_directory
+        self.matcher = matcher
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.directories: dict[int, str] = {}
+        self.add_tree(root_directory)
+
+    def add_directory(self, path: str) -> None:
+        descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if descriptor < 0:
+            error = ctypes.get_errno()
+            # usually fs.inotify.max_user_watches running out on a very large tree
+            logger.warning(f"couldn't watch {path}: {os.strerror(error)}")
+            return
+        self.directories[descriptor] = path
+
+    def add_tree(self, directory: str) -> list[Change]:
+        """
+        Watches 'directory' and every directory under it that isn't ignored, returns the data files found.
+        """
+        found = []
+        for dir_path, dir_names, file_names in os.walk(directory):
+            relative = os.path.relpath(dir_path, self.root_directory).replace(os.sep, "/")
+            if relative != "." and (
+                self.matcher.match(relative, is_directory=True) is not None or output_name(os.path.basename(dir_path))
+            ):
+                dir_names.clear()
+                continue
+            self.add_directory(dir_path)
+            found.extend(Change(os.path.join(dir_path, name)) for name in file_names if name in walker.DATA_FILE_NAMES)
+            dir_names.sort()
+        return found
+
+    def read(self, timeout: float = None) -> list[Change]:
+        """
+        Returns the changes seen within 'timeout' seconds (empty if there were none), None waits for one.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        changes = []
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify dropped events, treating the whole tree as changed")
+                changes.append(Change(self.root_directory, is_directory=True, removed=True))
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(descriptor, None)
+                continue
+            directory = self.directories.get(descriptor)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            is_directory = bool(mask & IN_ISDIR) or not name
+            if is_directory and mask & (IN_CREATE | IN_MOVED_TO):
+                changes.extend(self.add_tree(path))
+            changes.append(Change(path, is_directory, bool(mask & REMOVED_MASK)))
+        return changes
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """
+    Rescans the tree every 'interval' seconds and compares the modification time and size of each data file,
+    for platforms (or filesystems, like network mounts) without inotify.
+    """
+
+    def __init__(self, root_directory: str, matcher: walker.IgnoreMatcher, interval: float = DEFAULT_POLL_INTERVAL):
+        self.root_directory = root_directory
+        self.matcher = matcher
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for data_file in walker.walk_data_files(self.root_directory, self.matcher):
+            try:
+                snapshot[data_file.file_path] = dataset_cache.file_signature(data_file.file_path)
+            except OSError:
+                continue
+        return snapshot
+
+    def read(self, timeout: float = None) -> list[Change]:
+        while True:
+            time.sleep(self.interval if timeout is None else timeout)
+            snapshot = self.scan()
+            changes = [Change(path) for path, signature in snapshot.items() if self.snapshot.get(path) != signature]
+            changes.extend(Change(path, removed=True) for path in self.snapshot.keys() - snapshot.keys())
+            self.snapshot = snapshot
+            if changes or timeout is not None:
+                return changes
+
+    def close(self) -> None:
+        pass
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+def make_watcher(root_directory: str, matcher: walker.IgnoreMatcher, poll_interval: float = None) -> Watcher:
+    """
+    Returns an inotify watcher, or a polling one when 'poll_interval' is set or inotify isn't available.
+    """
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(root_directory, matcher)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), polling every {DEFAULT_POLL_INTERVAL}s instead")
+            poll_interval = DEFAULT_POLL_INTERVAL
+    return PollingWatcher(root_directory, matcher, poll_interval)
+
+
+def is_relevant(
+    change: Change, root_directory: str, matcher: walker.IgnoreMatcher, output_folders: set[str] = frozenset()
+) -> bool:
+    """
+    Whether 'change' can affect the outputs, as opposed to being one of the outputs being written.
+
+    'output_folders' are the folders the last build converted its leaves into (see
+    convert_and_plot.output_folders), a data.csv or data.jbin written there is an output, as is one beside
+    the data file it was converted from.
+    """
+    name = os.path.basename(change.path)
+    relative = os.path.relpath(change.path, root_directory).replace(os.sep, "/")
+    if change.path == root_directory:
+        return True
+    if output_name(name) or matcher.ignores(relative, change.is_directory):
+        return False
+    if change.is_directory:
+        # a new directory's data files are reported on their own, a removed one takes its leaves with it
+        return change.removed
+    if name in SOURCE_FILE_NAMES:
+        return True
+    if name not in intermediate.FILE_NAMES:
+        return False
+    return convert_and_plot.is_standalone_data(change.path, output_folders)
+
+
+def wait_for_changes(
+    watcher: Watcher, relevant: Callable[[Change], bool], debounce: float = DEFAULT_DEBOUNCE, max_delay: float = None
+) -> set[str]:
+    """
+    Waits for a relevant change, then keeps collecting changes until the tree has been quiet for 'debounce'
+    seconds (or 'max_delay' has passed, 10 times 'debounce' by default) so a bulk copy is rebuilt in one go.
+    Returns the paths that changed, which only decide whether the rebuild is worth starting the pool for.
+    """
+    changed: set[str] = set()
+    while not changed:
+        changed.update(change.path for change in watcher.read() if relevant(change))
+    deadline = time.monotonic() + (max_delay if max_delay is not None else 10 * debounce)
+    while time.monotonic() < deadline:
+        changes = watcher.read(debounce)
+        if not changes:
+            break
+        changed.update(change.path for change in changes if relevant(change))
+    return changed
+
+
+class ConfigLoader:
+    """
+    Keeps the validated config and only loads and validates config.json again once the file changes.
+    """
+
+    def __init__(self, config_file_path: str):
+        self.path = config_file_path
+        self.signature = None
+        self.config = None
+
+    def get(self):
+        try:
+            signature = dataset_cache.file_signature(self.path)
+        except OSError:
+            signature = None
+        if self.config is not None and signature == self.signature:
+            return self.config
+        try:
+            self.config = convert_and_plot.load_config(self.path)
+            self.signature = signature
+        except Exception as e:
+            if self.config is None:
+                raise
+            logger.error(f"keeping the previous config, {self.path} couldn't be loaded: {e}")
+        return self.config
+
+
+def rebuild(config_loader: ConfigLoader, root_directory: str, options: convert_and_plot.BuildOptions) -> set[str]:
+    """
+    Runs process_files and returns the output folders of the leaves it found, None if it failed.
+    """
+    try:
+        leaves = convert_and_plot.process_files(root_directory, options, config=config_loader.get())
+    except Exception as e:
+        # the failed outputs aren't recorded in the build cache, so the next change tries them again
+        logger.error(f"rebuild failed: {e}")
+        return None
+    return convert_and_plot.output_folders(leaves)
+
+
+def watch(
+    root_directory: str = ".",
+    options: convert_and_plot.BuildOptions = convert_and_plot.BuildOptions(),
+    debounce: float = DEFAULT_DEBOUNCE,
+    poll_interval: float = None,
+) -> None:
+    """
+    Builds 'root_directory' like process_files and then rebuilds it whenever a data file is added, changed
+    or removed, until interrupted.
+
+    The process stays up between rebuilds so the config, the schema model, the image renderer and the
+    parsed datasets stay loaded. Each rebuild walks the whole tree again and the build cache decides what is
+    redone (the leaves whose data changed along with their merged.png and the aggregate), the files are only
+    hashed again when their modification time or size changed. 'options' are passed on to process_files,
+    'force' only to the first build.
+    """
+    config_loader = ConfigLoader(convert_and_plot.local_or_default("config.json"))
+    matcher = walker.IgnoreMatcher(
+        convert_and_plot.load_patterns(convert_and_plot.local_or_default(".dirignore"))
+        + convert_and_plot.load_patterns(convert_and_plot.local_or_default(".fileignore"))
+    )
+    # watching starts before the first build so files copied in while it runs aren't missed
+    watcher = make_watcher(root_directory, matcher, poll_interval)
+    try:
+        # the outputs written by a rebuild are only read after it, so they're checked against its own folders
+        output_folders = rebuild(config_loader, root_directory, options) or set()
+        while True:
+            logger.info(f"watching {root_directory} for changes")
+            changed = wait_for_changes(
+                watcher, lambda change: is_relevant(change, root_directory, matcher, output_folders), debounce
+            )
+            logger.info(f"{len(changed)} changed: {', '.join(sorted(changed)[:5])}{', ...' if len(changed) > 5 else ''}")
+            jobs = options.jobs if len(changed) > PARALLEL_THRESHOLD else 1
+            output_folders = rebuild(config_loader, root_directory, options._replace(jobs=jobs, force=False)) or output_folders
+    except KeyboardInterrupt:
+        logger.info("stopped watching")
+    finally:
+        watcher.close()
+        plot_data.default_exporter.close()
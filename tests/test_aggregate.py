@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from jeddinformatics import aggregate
+
+LEAVES = [
+    ("RAN", "Ovarian Cancer", "ONCODB", pd.DataFrame({"Series Name": ["OV", "Normal"], "Y": [1.5, 0.5]})),
+    ("XPO1", "Ovarian Cancer", "ONCODB", pd.DataFrame({"Series Name": ["OV"], "Y": [2.0]})),
+    ("RAN", "Uterine Cancer", "UALCAN", pd.DataFrame({"Series Name": ["UCEC", "UCEC", "Normal"], "Y": [3.0, None, 4.0]})),
+]
+
+
+def write_leaves(writer: aggregate.AggregateWriter, order: list[int]) -> None:
+    # the leaves finish in 'order', like they do from a process pool
+    for index in order:
+        gene, cancer, source, dataset = LEAVES[index]
+        writer.add(index, dataset, gene, cancer, source)
+
+
+class TestAggregateWriter(unittest.TestCase):
+    def test_long_rows_keep_leaf_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            writer = aggregate.AggregateWriter(root, "long", ["csv"])
+            write_leaves(writer, [2, 0, 1])
+            writer.close()
+            rows = pd.read_csv(os.path.join(root, "all_csv_data.csv"))
+            self.assertEqual(list(rows.columns), aggregate.LONG_COLUMNS)
+            self.assertEqual(rows["gene"].tolist(), ["RAN", "RAN", "XPO1", "RAN", "RAN", "RAN"])
+            self.assertEqual(rows["series"].tolist(), ["OV", "Normal", "OV", "UCEC", "UCEC", "Normal"])
+            self.assertEqual(rows["source"].tolist()[-1], "UALCAN")
+            self.assertTrue(pd.isna(rows["value"][4]))
+
+    def test_wide_layout_is_a_column_pair_per_leaf(self):
+        with tempfile.TemporaryDirectory() as root:
+            writer = aggregate.AggregateWriter(root, "wide", ["csv", "xlsx"])
+            write_leaves(writer, [1, 2, 0])
+            writer.close()
+            expected = pd.concat(
+                [aggregate.wide_columns(dataset, cancer, gene) for gene, cancer, _, dataset in LEAVES], axis=1
+            )
+            pd.testing.assert_frame_equal(pd.read_csv(os.path.join(root, "all_csv_data.csv")), expected)
+            self.assertEqual(list(expected.columns[:2]), ["Ovarian Cancer RAN X", "Ovarian Cancer RAN Y"])
+            workbook = pd.read_excel(os.path.join(root, "all_csv_data.xlsx"))
+            self.assertEqual(list(workbook.columns), list(expected.columns))
+
+    def test_xlsx_carries_on_in_a_new_sheet(self):
+        with tempfile.TemporaryDirectory() as root, mock.patch.object(aggregate, "XLSX_MAX_ROWS", 4):
+            writer = aggregate.AggregateWriter(root, "long", ["xlsx"])
+            write_leaves(writer, [0, 1, 2])
+            writer.close()
+            sheets = pd.read_excel(os.path.join(root, "all_csv_data.xlsx"), sheet_name=None)
+            self.assertEqual([len(sheet) for sheet in sheets.values()], [3, 3])
+            rows = pd.concat(sheets.values(), ignore_index=True)
+            self.assertEqual(list(rows.columns), aggregate.LONG_COLUMNS)
+            self.assertEqual(rows["value"].tolist()[:3], [1.5, 0.5, 2.0])
+            self.assertTrue(pd.isna(rows["value"][4]))
+
+    def test_parquet_is_partitioned_by_source_and_cancer(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrow isn't installed")
+        with tempfile.TemporaryDirectory() as root:
+            writer = aggregate.AggregateWriter(root, "long", ["parquet"])
+            write_leaves(writer, [0, 1, 2])
+            writer.close()
+            path = os.path.join(root, "all_csv_data.parquet")
+            self.assertTrue(os.path.exists(os.path.join(path, "source=ONCODB", "cancer=Ovarian Cancer", "part-0.parquet")))
+            self.assertTrue(os.path.exists(os.path.join(path, "source=UALCAN", "cancer=Uterine Cancer", "part-0.parquet")))
+            rows = pd.read_parquet(path)
+            self.assertEqual(len(rows), 6)
+            ovarian = rows[rows["cancer"].astype(str) == "Ovarian Cancer"]
+            self.assertEqual(ovarian["gene"].tolist(), ["RAN", "RAN", "XPO1"])
+            with self.assertRaises(ValueError):
+                aggregate.AggregateWriter(root, "wide", ["parquet"])
+
+    def test_outputs_are_only_replaced_on_success(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "all_csv_data.csv")
+            with open(path, "w") as previous:
+                previous.write("previous\n")
+            for layout in aggregate.LAYOUTS:
+                writer = aggregate.AggregateWriter(root, layout, ["csv"])
+                write_leaves(writer, [0, 1])
+                writer.abort()
+                with open(path) as output:
+                    self.assertEqual(output.read(), "previous\n")
+                self.assertEqual(sorted(os.listdir(root)), ["all_csv_data.csv"])
+            writer = aggregate.AggregateWriter(root, "long", ["csv"])
+            write_leaves(writer, [0])
+            with mock.patch.object(aggregate.CsvSink, "close", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    writer.close()
+            with open(path) as output:
+                self.assertEqual(output.read(), "previous\n")
+            self.assertEqual(sorted(os.listdir(root)), ["all_csv_data.csv"])
+            writer = aggregate.AggregateWriter(root, "long", ["csv"])
+            write_leaves(writer, [0, 1, 2])
+            with open(path) as output:
+                self.assertEqual(output.read(), "previous\n")
+            writer.close()
+            self.assertEqual(len(pd.read_csv(path)), 6)
+            self.assertEqual(sorted(os.listdir(root)), ["all_csv_data.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from jeddinformatics import build_cache, convert_and_plot
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+
+def write_leaf(root: str, gene: str, values: list[float]) -> str:
+    folder = os.path.join(root, "Gene Expression", "ONCODB", "OV", gene)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "data.txt")
+    with open(path, "w") as data_file:
+        data_file.write(f"Sample\t{gene}_expression_value\n")
+        data_file.writelines(f"OV\t{value}\n" for value in values)
+    return path
+
+
+def build(root: str, config: dict = CONFIG, **options) -> build_cache.BuildCache:
+    """Runs process_files on 'root' and returns the build cache it planned with."""
+    caches = []
+
+    class RecordingCache(build_cache.BuildCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            caches.append(self)
+
+    with mock.patch.object(build_cache, "BuildCache", RecordingCache):
+        options = convert_and_plot.BuildOptions(render_profile="html", aggregate_formats=["csv"], **options)
+        convert_and_plot.process_files(root, options, config=config)
+    return caches[0]
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.sources = [write_leaf(self.root, gene, values) for gene, values in (("RAN", [1.5, 2.5]), ("XPO1", [0.5]))]
+        cache = build(self.root)
+        # two leaves, their merged plot and the aggregate
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+
+    def test_unchanged_tree_is_all_hits(self):
+        cache = build(self.root)
+        self.assertEqual((cache.hits, cache.misses), (4, 0))
+
+    def test_edited_source_is_rebuilt_with_what_it_goes_into(self):
+        write_leaf(self.root, "RAN", [1.5, 3.5])
+        cache = build(self.root)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        self.assertEqual(build(self.root).misses, 0)
+
+    def test_config_and_version_invalidate_everything(self):
+        cache = build(self.root, config={**CONFIG, "jitter": CONFIG.get("jitter", 0) + 0.1})
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        # fields that don't change the outputs don't count
+        cache = build(self.root, config={**CONFIG, "jitter": CONFIG.get("jitter", 0) + 0.1, "$schema": "elsewhere"})
+        self.assertEqual((cache.hits, cache.misses), (4, 0))
+        with mock.patch.object(build_cache, "package_version", return_value="0.0.0-other"):
+            cache = build(self.root)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+
+    def test_force_bypasses_the_cache(self):
+        cache = build(self.root, force=True)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        # and still records the build for the next run
+        self.assertEqual(build(self.root).misses, 0)
+
+    def test_corrupt_cache_file_is_ignored(self):
+        with open(os.path.join(self.root, build_cache.CACHE_FILE_NAME), "w") as cache_file:
+            cache_file.write('{"Gene Expression/ONCODB/OV/RAN/data.txt": ')
+        cache = build(self.root)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        self.assertEqual(build(self.root).misses, 0)
+
+    def test_missing_output_is_rebuilt(self):
+        os.remove(convert_and_plot.replace_file_extension(self.sources[1], "html"))
+        cache = build(self.root)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
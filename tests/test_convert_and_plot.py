@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from jeddinformatics import build_cache, convert_and_plot, plot_data
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+CHART = {
+    "series": [
+        {"name": "box", "data": []},
+        {"name": "Normal", "data": [{"y": 0.1}, {"y": 1 / 3}, {"y": 2.5e-7}]},
+        {"name": "Ovarian Cancer", "data": [[0, 1.25], [0, -4.75], [0, 12345.6789]]},
+    ]
+}
+ONCODB = "Sample\tRAN_expression_value\nOV\t1.5\nOV\t0.1\nNormal\t0.5\nNormal\t-2.75\n"
+
+
+def write_tree(root: str) -> list[str]:
+    sources = []
+    for expression, gene, file_name, content in (
+        ("Gene Expression", "RAN", "data.txt", ONCODB),
+        ("Protein Expression", "XPO1", "data.json", json.dumps(CHART)),
+    ):
+        folder = os.path.join(root, expression, "UALCAN", "OV", gene)
+        os.makedirs(folder)
+        sources.append(os.path.join(folder, file_name))
+        with open(sources[-1], "w") as data_file:
+            data_file.write(content)
+    return sources
+
+
+def write_larger_tree(root: str) -> None:
+    # plain leaves in two cancer types, a wide export, a data.json and a data.csv of its own
+    for cancer_type in ("OV", "BRCA"):
+        for gene in ("RAN", "XPO1", "TP53"):
+            folder = os.path.join(root, "Gene Expression", "ONCODB", cancer_type, gene)
+            os.makedirs(folder)
+            with open(os.path.join(folder, "data.txt"), "w") as data_file:
+                data_file.write(f"Sample\t{gene}_expression_value\n{cancer_type}\t1.5\nNormal\t{len(gene)}\n")
+    wide = os.path.join(root, "Gene Expression", "UALCAN", "OV")
+    os.makedirs(os.path.join(wide, "KRAS"))
+    with open(os.path.join(wide, "data.txt"), "w") as data_file:
+        data_file.write("Sample\tEGFR_expression_value\tMYC_expression_value\nOV\t1.5\t2.5\nNormal\t0.5\t-1\n")
+    with open(os.path.join(wide, "KRAS", "data.csv"), "w") as data_file:
+        data_file.write("Series Name,Y\nNormal,0.25\nOvarian Cancer,4.5\n")
+    folder = os.path.join(root, "Protein Expression", "UALCAN", "OV", "XPO1")
+    os.makedirs(folder)
+    with open(os.path.join(folder, "data.json"), "w") as data_file:
+        json.dump(CHART, data_file)
+
+
+def tree_files(root: str) -> set[str]:
+    return {
+        os.path.relpath(os.path.join(folder, name), root)
+        for folder, _, names in os.walk(root)
+        for name in names
+        if name != build_cache.CACHE_FILE_NAME
+    }
+
+
+def figures(func, *args, **kwargs) -> list[dict]:
+    """Runs 'func' and returns the figures it exported, as plotly JSON."""
+    with mock.patch.object(plot_data, "export_figure") as export_figure:
+        func(*args, **kwargs)
+    return [call.args[0].to_plotly_json() for call in export_figure.call_args_list]
+
+
+class TestConvertAndPlot(unittest.TestCase):
+    def test_plot_from_memory_matches_plot_from_csv(self):
+        with tempfile.TemporaryDirectory() as root:
+            for source in write_tree(root):
+                gene = os.path.basename(os.path.dirname(source))
+                leaf = convert_and_plot.Leaf(source, gene, "OV", "UALCAN", source.endswith(".txt"))
+                with self.subTest(os.path.basename(source)):
+                    from_memory = figures(convert_and_plot.process_leaf, leaf, CONFIG)
+                    from_csv = figures(
+                        convert_and_plot.process_csv, leaf.data_path, CONFIG, leaf.cancer_type, leaf.is_gene
+                    )
+                    self.assertEqual(len(from_memory), 1)
+                    self.assertEqual(from_memory, from_csv)
+
+    def test_no_csv_still_feeds_the_aggregate(self):
+        aggregates = {}
+        for write_csv in (True, False):
+            with tempfile.TemporaryDirectory() as root:
+                sources = write_tree(root)
+                options = convert_and_plot.BuildOptions(write_csv=write_csv, render_profile="html", aggregate_formats=["csv"])
+                convert_and_plot.process_files(root, options, config=CONFIG)
+                for source in sources:
+                    self.assertEqual(os.path.exists(convert_and_plot.replace_file_extension(source, "csv")), write_csv)
+                    self.assertTrue(os.path.exists(convert_and_plot.replace_file_extension(source, "html")))
+                with open(os.path.join(root, "all_csv_data.csv")) as aggregate_file:
+                    aggregates[write_csv] = aggregate_file.read()
+        self.assertIn("12345.6789", aggregates[False])
+        self.assertEqual(aggregates[False], aggregates[True])
+
+    def test_parallel_run_matches_serial_run(self):
+        outputs = {}
+        for jobs in (1, 3):
+            with tempfile.TemporaryDirectory() as root:
+                write_larger_tree(root)
+                options = convert_and_plot.BuildOptions(jobs=jobs, render_profile="html", aggregate_formats=["csv"])
+                convert_and_plot.process_files(root, options, config=CONFIG)
+                with open(os.path.join(root, "all_csv_data.csv")) as aggregate_file:
+                    outputs[jobs] = (tree_files(root), aggregate_file.read())
+        files, aggregate_csv = outputs[1]
+        self.assertEqual(len([name for name in files if name.endswith("merged.html")]), 4)
+        self.assertEqual(len([name for name in files if name.endswith("data.html")]), 9)
+        self.assertEqual(outputs[3], (files, aggregate_csv))
+
+    def test_parallel_run_carries_on_past_a_failure(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_larger_tree(root)
+            broken = os.path.join(root, "Gene Expression", "ONCODB", "BRCA", "TP53", "data.txt")
+            with open(broken, "w") as data_file:
+                data_file.write("no expression column here\n")
+            with self.assertRaisesRegex(RuntimeError, "1 task"):
+                options = convert_and_plot.BuildOptions(jobs=3, render_profile="html", aggregate_formats=["csv"])
+                convert_and_plot.process_files(root, options, config=CONFIG)
+            files = tree_files(root)
+        merged = {name for name in files if name.endswith("merged.html")}
+        # only the failed leaf's own cancer type is left without a merged plot, and there's no aggregate
+        self.assertNotIn(os.path.join("Gene Expression", "ONCODB", "BRCA", "merged.html"), merged)
+        self.assertEqual(len(merged), 3)
+        self.assertIn(os.path.join("Gene Expression", "ONCODB", "BRCA", "RAN", "data.html"), files)
+        self.assertNotIn("all_csv_data.csv", files)
+
+
+if __name__ == "__main__":
+    unittest.main()
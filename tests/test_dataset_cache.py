@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from jeddinformatics import convert_and_plot, dataset_cache, oncodb_to_csv
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+
+def dataset(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"Y": [float(row) for row in range(rows)]})
+
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = []
+        for name in "abcd":
+            self.paths.append(os.path.join(directory.name, f"{name}.csv"))
+            with open(self.paths[-1], "w") as data_file:
+                data_file.write(name)
+
+    def test_least_recently_used_are_evicted_by_size(self):
+        size = dataset_cache.dataset_size(dataset(100))
+        cache = dataset_cache.DatasetCache(budget=3 * size)
+        a, b, c, d = self.paths
+        for path in (a, b, c):
+            cache.get(path, lambda: dataset(100))
+        cache.get(a, lambda: self.fail("a is cached"))
+        # b is now the least recently used
+        cache.get(d, lambda: dataset(100))
+        self.assertEqual(list(cache.entries), [c, a, d])
+        self.assertEqual((cache.bytes, cache.evictions), (3 * size, 1))
+        # one dataset taking the space of two
+        cache.get(b, lambda: dataset(200))
+        self.assertEqual(list(cache.entries), [d, b])
+        self.assertEqual(cache.evictions, 3)
+        # bigger than the whole budget, isn't kept
+        cache.get(c, lambda: dataset(400))
+        self.assertNotIn(c, cache.entries)
+
+    def test_changed_file_is_parsed_again(self):
+        cache = dataset_cache.DatasetCache()
+        path = self.paths[0]
+        first = cache.get(path, lambda: dataset(1))
+        self.assertIs(cache.get(path, lambda: dataset(2)), first)
+        with open(path, "a") as data_file:
+            data_file.write("grown")
+        self.assertEqual(len(cache.get(path, lambda: dataset(2))), 2)
+        # same size, newer modification time
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(len(cache.get(path, lambda: dataset(3))), 3)
+        self.assertEqual(cache.lookup(path).shape, (3, 1))
+
+    def test_counters(self):
+        cache = dataset_cache.DatasetCache(budget=0)
+        cache.get(self.paths[0], lambda: dataset(1))
+        cache.get(self.paths[0], lambda: dataset(1))
+        # a budget of 0 turns the cache off
+        self.assertEqual(cache.take_counters(), {"hits": 0, "misses": 2, "evictions": 0})
+        cache = dataset_cache.DatasetCache()
+        cache.get(self.paths[0], lambda: dataset(1))
+        cache.get(self.paths[0], lambda: dataset(1))
+        self.assertIsNone(cache.lookup(self.paths[1]))
+        counters = cache.take_counters()
+        self.assertEqual(counters, {"hits": 1, "misses": 2, "evictions": 0})
+        self.assertEqual(cache.take_counters(), {"hits": 0, "misses": 0, "evictions": 0})
+        cache.add_counters(counters)
+        cache.add_counters(counters)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_build_reads_go_through_the_cache(self):
+        root = os.path.dirname(self.paths[0])
+        for gene in ("RAN", "XPO1"):
+            folder = os.path.join(root, "Gene Expression", "ONCODB", "OV", gene)
+            os.makedirs(folder)
+            with open(os.path.join(folder, "data.txt"), "w") as data_file:
+                data_file.write(f"Sample\t{gene}_expression_value\nOV\t1.5\nNormal\t0.5\n")
+
+        def build(config):
+            options = convert_and_plot.BuildOptions(render_profile="html", aggregate_formats=["csv"])
+            convert_and_plot.process_files(root, options, config=config)
+            return dataset_cache.default_cache.hits, dataset_cache.default_cache.misses
+
+        self.addCleanup(dataset_cache.default_cache.clear)
+        dataset_cache.default_cache.clear()
+        self.assertEqual(build(CONFIG), (0, 2))
+        # a new config rebuilds both leaves from the datasets parsed by the first build
+        with mock.patch.object(oncodb_to_csv, "iter_onco", side_effect=AssertionError("parsed again")):
+            self.assertEqual(build({**CONFIG, "jitter": 0.25}), (2, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
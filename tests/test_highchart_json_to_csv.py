@@ -0,0 +1,90 @@
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from array import array
+
+import numpy as np
+
+from jeddinformatics import highchart_json_to_csv
+
+POINTS = {
+    "dicts": '[{"x": 0, "y": 1.5}, {"y": -2.25e-3, "name": "a"}, {"y": null}, {"x": 3}]',
+    "pairs": "[[0, 1.5], [1, -2.5], [2, null], [], [3, 12345.678]]",
+    "bare": "[1.5, -2, null, 1e10, 0.000123456789, 42]",
+    "nested": '[{"y": 1, "marker": {"radius": 2}}, {"y": 2, "custom": {"a": [1, {"b": 2}]}}, 3, [4, 5]]',
+    "strings": '[{"y": 1, "name": "a},b"}, {"name": "],{", "y": 2}, {"y": 3, "name": ","}, {"y": 4}]',
+    "spaced": ' [ { "y" : 1 } ,\n  { "y" : 2.5 } \n, 3 , [ 0 , 4 ] ] ',
+    "empty": "[ ]",
+}
+
+
+def read_values(text: str, chunk_size: int) -> list[float]:
+    values = array("d")
+    highchart_json_to_csv.read_values(highchart_json_to_csv.JsonStream(io.StringIO(text), chunk_size), values)
+    return list(values)
+
+
+def expected_values(text: str) -> list[float]:
+    return [float(highchart_json_to_csv.point_value(point)) for point in json.loads(text)]
+
+
+class TestJsonStream(unittest.TestCase):
+    def test_points_match_json_load_at_any_chunk_size(self):
+        for name, text in POINTS.items():
+            for chunk_size in (1, 2, 3, 5, 7, 16, 1 << 16):
+                with self.subTest(name, chunk_size=chunk_size):
+                    np.testing.assert_array_equal(read_values(text, chunk_size), expected_values(text))
+
+    def test_numbers_split_across_chunks(self):
+        # every cut through "-12345.6789e-3" has to read back the whole number
+        text = "[" + ", ".join(["-12345.6789e-3"] * 4) + ", 7]"
+        for chunk_size in range(1, len("-12345.6789e-3") + 3):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(read_values(text, chunk_size), [-12.3456789] * 4 + [7.0])
+
+    def test_value_at_the_end_of_the_file(self):
+        stream = highchart_json_to_csv.JsonStream(io.StringIO("12345"), chunk_size=2)
+        self.assertEqual(stream.value(), 12345)
+        self.assertEqual(stream.peek(), "")
+
+    def test_series_match_json_load(self):
+        chart = {
+            "chart": {"type": "boxplot", "title": {"text": "a},b"}},
+            "series": [
+                {"name": "box", "data": [[1, 2, 3, 4, 5]]},
+                {"name": "Normal", "type": "scatter", "data": [{"x": 0, "y": 1.25}, {"x": 0, "y": None}]},
+                {"data": [[1, 2.5], [1, 3.75]], "name": "Tumor", "marker": {"symbol": "circle"}},
+                {"name": "Normal", "data": [0.5, 1e-7]},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.json")
+            with open(path, "w") as json_file:
+                json.dump(chart, json_file, indent=1)
+            series = list(highchart_json_to_csv.iter_highchart_series(path))
+            dataset = highchart_json_to_csv.read_highchart(path)
+        self.assertEqual([name for name, _ in series], ["Normal", "Tumor", "Normal"])
+        for (_, values), source in zip(series, chart["series"][1:]):
+            np.testing.assert_array_equal(values, [highchart_json_to_csv.point_value(point) for point in source["data"]])
+        self.assertEqual(dataset["Series Name"].tolist(), ["Normal", "Normal", "Tumor", "Tumor", "Normal", "Normal"])
+        self.assertEqual(list(dataset["Series Name"].cat.categories), ["Normal", "Tumor"])
+
+    def test_unnamed_series_raises(self):
+        chart = {"series": [{"name": "box", "data": []}, {"name": "Normal", "data": [1]}, {"data": [2]}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.json")
+            with open(path, "w") as json_file:
+                json.dump(chart, json_file)
+            with self.assertRaisesRegex(ValueError, f"series 2 has no 'name' in {re.escape(path)}"):
+                highchart_json_to_csv.read_highchart(path)
+
+    def test_malformed_array_raises(self):
+        with self.assertRaises(ValueError):
+            read_values("[1, 2; 3]", 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from jeddinformatics import intermediate
+
+DATASET = pd.DataFrame({"Series Name": ["OV", "OV", "Normal", "OV"], "Y": [1.5, 2.25, 0.5, np.nan]})
+
+
+class TestIntermediate(unittest.TestCase):
+    def test_binary_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "Gene Expression", "ONCODB", "Ovarian Cancer", "RAN", "data.jbin")
+            os.makedirs(os.path.dirname(path))
+            intermediate.write_dataset(DATASET, path)
+            dataset = intermediate.read_dataset(path)
+            self.assertEqual(dataset["Series Name"].tolist(), DATASET["Series Name"].tolist())
+            np.testing.assert_array_equal(dataset["Y"].to_numpy(), DATASET["Y"].to_numpy())
+            self.assertIsInstance(dataset["Series Name"].dtype, pd.CategoricalDtype)
+            metadata = intermediate.read_metadata(path)
+            self.assertEqual((metadata["gene"], metadata["cancer"], metadata["source"]), ("RAN", "Ovarian Cancer", "ONCODB"))
+            self.assertEqual(metadata["rows"], 4)
+
+    def test_values_are_mapped_not_copied(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "data.jbin")
+            intermediate.write_binary(DATASET, path)
+            values = intermediate.read_binary(path)["Y"].to_numpy()
+            self.assertFalse(values.flags.writeable)
+            self.assertFalse(values.flags.owndata)
+
+    def test_to_csv_matches_a_csv_run(self):
+        with tempfile.TemporaryDirectory() as root:
+            csv_path = os.path.join(root, "expected.csv")
+            DATASET.to_csv(csv_path, index=False)
+            binary_path = os.path.join(root, "data.jbin")
+            intermediate.write_binary(DATASET, binary_path)
+            with open(csv_path, "rb") as expected, open(intermediate.binary_to_csv(binary_path), "rb") as written:
+                self.assertEqual(written.read(), expected.read())
+
+    def test_empty_dataset(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "data.jbin")
+            intermediate.write_binary(DATASET.iloc[:0], path)
+            self.assertEqual(len(intermediate.read_binary(path)), 0)
+
+    def test_configure_picks_the_extension(self):
+        try:
+            intermediate.configure("binary")
+            self.assertEqual((intermediate.extension(), intermediate.data_format()), ("jbin", "binary"))
+        finally:
+            intermediate.configure()
+        self.assertEqual(intermediate.extension(), "csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
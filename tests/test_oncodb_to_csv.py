@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from jeddinformatics import intermediate, oncodb_to_csv
+
+# the samples of the first rows don't show up again later, every chunk of 2 rows has its own categories
+WIDE = (
+    "Sample\tRAN_expression_value\tXPO1_expression_value\n"
+    "OV\t1.5\t2\n"
+    "OV\t2.5\t\n"
+    "Normal\t0.5\t4\n"
+    "Tumor\t3.25\t1\n"
+    "Normal\t0.75\t0.5\n"
+)
+
+
+def write_export(root: str, text: str = WIDE) -> str:
+    path = os.path.join(root, "data.txt")
+    with open(path, "w") as data_file:
+        data_file.write(text)
+    return path
+
+
+class TestOncodbToCsv(unittest.TestCase):
+    def test_chunked_read_matches_a_single_read(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = write_export(root)
+            whole = oncodb_to_csv.read_onco(path)
+            chunked = oncodb_to_csv.read_onco(path, chunksize=2)
+            self.assertIsInstance(chunked["Series Name"].dtype, pd.CategoricalDtype)
+            pd.testing.assert_series_equal(chunked["Series Name"].astype(str), whole["Series Name"].astype(str))
+            pd.testing.assert_series_equal(chunked["Y"], whole["Y"])
+            genes = oncodb_to_csv.read_onco_genes(path, chunksize=2)
+            self.assertEqual(genes["RAN"]["Series Name"].tolist(), ["OV", "OV", "Normal", "Tumor", "Normal"])
+            self.assertEqual(genes["XPO1"]["Y"].isna().tolist(), [False, True, False, False, False])
+
+    def test_conversion_is_written_chunk_by_chunk(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = write_export(root)
+            expected = os.path.join(root, "expected.csv")
+            oncodb_to_csv.read_onco(path).to_csv(expected, index=False)
+            output = os.path.join(root, "data.csv")
+            self.assertEqual(oncodb_to_csv.convert_onco_to_csv(path, output, chunksize=2), 5)
+            with open(expected) as expected_file, open(output) as output_file:
+                self.assertEqual(output_file.read(), expected_file.read())
+            binary = os.path.join(root, "data.jbin")
+            dataset = oncodb_to_csv.convert_onco(path, binary, chunksize=2)
+            self.assertEqual(intermediate.read_dataset(binary)["Series Name"].tolist(), dataset["Series Name"].tolist())
+            with open(intermediate.binary_to_csv(binary, os.path.join(root, "binary.csv"))) as output_file:
+                with open(expected) as expected_file:
+                    self.assertEqual(output_file.read(), expected_file.read())
+
+    def test_wide_genes_are_written_only_when_asked_for(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = write_export(root)
+            output = os.path.join(root, "RAN.csv")
+            datasets = oncodb_to_csv.convert_onco_genes(path, ["RAN", "XPO1"], {"RAN": output}, chunksize=2)
+            self.assertEqual(sorted(datasets), ["RAN", "XPO1"])
+            self.assertEqual(pd.read_csv(output)["Y"].tolist(), datasets["RAN"]["Y"].tolist())
+            self.assertFalse(os.path.exists(os.path.join(root, "XPO1.csv")))
+
+    def test_a_failed_conversion_keeps_the_old_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = write_export(root, "Sample\tRAN_expression_value\nOV\t1.5\nOV\tnot a number\n")
+            output = os.path.join(root, "data.csv")
+            with open(output, "w") as output_file:
+                output_file.write("old")
+            with self.assertRaises(ValueError):
+                oncodb_to_csv.convert_onco_to_csv(path, output, chunksize=1)
+            with open(output) as output_file:
+                self.assertEqual(output_file.read(), "old")
+            self.assertEqual(sorted(os.listdir(root)), ["data.csv", "data.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+
+from jeddinformatics import convert_and_plot, plot_data, scheduler
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+# values and what plotly.js draws for them: q1, median, q3, lower fence, upper fence and the outliers
+BOXES = {
+    "odd": ([1, 2, 3, 4, 100], (1.75, 3, 28, 1, 28, [100])),
+    "even": ([4, 1, 3, 2], (1.5, 2.5, 3.5, 1, 4, [])),
+    "single": ([5], (5, 5, 5, 5, 5, [])),
+    "pair": ([3, 1], (1, 2, 3, 1, 3, [])),
+    "ties": ([2, 2, 9, 2, 2], (2, 2, 3.75, 2, 3.75, [9])),
+    "missing": ([np.nan, 1, 2, np.inf, 3, 4, 100, -np.inf], (1.75, 3, 28, 1, 28, [100])),
+    # q1 - 1.5 * IQR is exactly 1 and q3 + 1.5 * IQR exactly 9, values on a fence aren't outliers
+    "on_fences": ([1, 4, 4, 4, 6, 6, 6, 9], (4, 5, 6, 1, 9, [])),
+    "past_fences": ([0.5, 4, 4, 4, 6, 6, 6, 9.5], (4, 5, 6, 4, 6, [0.5, 9.5])),
+    # q1 - 1.5 * IQR comes out a rounding error above -0.8, plotly.js still counts -0.8 as on the fence
+    "rounding": ([0.1, 0.1, 0.7, 0.7, -0.8, 2.5], (0.1, 0.4, 0.7, -0.8, 0.7, [2.5])),
+}
+
+
+def kaleido_scope():
+    try:
+        from kaleido.scopes.plotly import PlotlyScope
+    except ImportError:
+        return None
+    return PlotlyScope(
+        plotlyjs=os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js"), mathjax=False
+    )
+
+
+class TestBoxStats(unittest.TestCase):
+    def test_known_plotly_results(self):
+        for case, (values, expected) in BOXES.items():
+            with self.subTest(case):
+                stats = plot_data.box_stats(np.array(values, dtype="float64"))
+                np.testing.assert_allclose(
+                    [stats.q1, stats.median, stats.q3, stats.lowerfence, stats.upperfence], expected[:5], rtol=1e-12
+                )
+                self.assertEqual(stats.outliers.tolist(), expected[5])
+
+    def test_nothing_finite_is_no_box(self):
+        self.assertIsNone(plot_data.box_stats(np.array([np.nan, np.inf])))
+        self.assertIsNone(plot_data.box_stats(np.array([])))
+
+
+@unittest.skipIf(kaleido_scope() is None, "kaleido isn't installed")
+class TestBoxRendering(unittest.TestCase):
+    """
+    Draws boxes with plotly.js and reads the box outline and the outlier points back out of the SVG.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.scope = kaleido_scope()
+
+    def drawn(self, traces: list[go.Box], values: list[float]) -> tuple[str, list[str]]:
+        finite = [value for value in values if np.isfinite(value)]
+        figure = go.Figure(traces)
+        figure.update_layout(
+            width=300, height=600, showlegend=False, yaxis_range=[min(finite) - 1, max(finite) + 1], boxmode="overlay"
+        )
+        svg = self.scope.transform(figure.to_plotly_json(), format="svg").decode()
+        box = re.search(r'<path class="box" d="([^"]*)"', svg).group(1)
+        points = sorted(re.findall(r'<path class="point" transform="translate\([^,]*,([^)]*)\)"', svg), key=float)
+        return box, points
+
+    def test_stats_match_plotly(self):
+        for case, (values, _) in BOXES.items():
+            with self.subTest(case):
+                plotly_box = go.Box(y=values, name="OV", boxpoints="outliers", jitter=0, pointpos=0)
+                config = {**CONFIG, "box_mode": "stats", "jitter": 0}
+                stats_traces = plot_data.box_traces(np.array(values, dtype="float64"), "OV", config, "black")
+                self.assertEqual(self.drawn(stats_traces, values), self.drawn([plotly_box], values))
+
+    def test_stats_and_raw_modes_draw_the_same_box(self):
+        for profile in ("publication", "draft"):
+            for case, (values, _) in BOXES.items():
+                with self.subTest(case, profile=profile):
+                    config = {**CONFIG, "jitter": 0, "render_profile": profile}
+                    array = np.array(values, dtype="float64")
+                    raw = plot_data.box_traces(array, "OV", {**config, "box_mode": "raw"}, "black")
+                    stats = plot_data.box_traces(array, "OV", {**config, "box_mode": "stats"}, "black")
+                    self.assertEqual(self.drawn(stats, values), self.drawn(raw, values))
+
+
+# the format, scale and outlier points of each built in render profile
+PROFILES = {
+    "publication": (["png"], 4, True),
+    "draft": (["png"], 1, False),
+    "vector": (["svg", "pdf"], 1, True),
+    "html": (["html"], 1, True),
+}
+
+
+def exports(config, **size) -> list[plot_data.ExportJob]:
+    exporter = mock.Mock(spec=plot_data.ImageExporter)
+    plot_data.export_figure(go.Figure(), os.path.join("OV", "RAN", "data.png"), config, exporter, **size)
+    return [plot_data.ExportJob(*call.args, **call.kwargs) for call in exporter.export.call_args_list]
+
+
+class TestRenderProfiles(unittest.TestCase):
+    def test_built_in_profiles(self):
+        self.assertEqual(set(PROFILES), set(plot_data.RENDER_PROFILES))
+        for name, (formats, scale, points) in PROFILES.items():
+            with self.subTest(name):
+                config = {**CONFIG, "render_profile": name}
+                self.assertEqual(plot_data.render_profile(config), {"formats": formats, "scale": scale, "points": points})
+                jobs = exports(config)
+                self.assertEqual([job.output for job in jobs], [os.path.join("OV", "RAN", f"data.{f}") for f in formats])
+                self.assertEqual(
+                    {(job.width, job.height, job.scale) for job in jobs},
+                    {(CONFIG["plot_width"], CONFIG["plot_height"], scale)},
+                )
+        # the atlas is exported at its own size
+        jobs = exports({**CONFIG, "render_profile": "draft"}, width=1200, height=900)
+        self.assertEqual((jobs[0].width, jobs[0].height, jobs[0].scale), (1200, 900, 1))
+
+    def test_default_and_overrides(self):
+        config = {key: value for key, value in CONFIG.items() if key != "render_profile"}
+        self.assertEqual(plot_data.render_profile(config), plot_data.RENDER_PROFILES["publication"])
+        # a profile of the config's replaces the built in one, what it leaves out comes from publication
+        config = {**config, "render_profile": "draft", "render_profiles": {"draft": {"scale": 2}, "svg": {"formats": ["svg"]}}}
+        self.assertEqual(plot_data.render_profile(config), {"formats": ["png"], "scale": 2, "points": True})
+        # the command line picks a profile over the config's
+        overridden = convert_and_plot.override_config(config, render_profile="svg")
+        self.assertEqual(plot_data.render_profile(overridden), {"formats": ["svg"], "scale": 4, "points": True})
+        self.assertEqual(convert_and_plot.override_config(config, render_profile=None)["render_profile"], "draft")
+        self.assertEqual([job.scale for job in exports(config)], [2])
+
+    def test_unknown_profile(self):
+        expected = "unknown render profile 'poster', expected one of draft, html, publication, vector"
+        with self.assertRaisesRegex(ValueError, expected):
+            plot_data.render_profile({**CONFIG, "render_profile": "poster"})
+        with tempfile.TemporaryDirectory() as root:
+            with self.assertRaisesRegex(ValueError, "unknown render profile 'poster'"):
+                convert_and_plot.process_files(root, convert_and_plot.BuildOptions(render_profile="poster"), config=CONFIG)
+            # nothing was built
+            self.assertEqual(os.listdir(root), [])
+
+
+class TestAtlas(unittest.TestCase):
+    def test_grid_shape(self):
+        shapes = {1: (1, 1), 2: (1, 2), 3: (2, 2), 4: (2, 2), 5: (2, 3), 9: (3, 3), 10: (3, 4)}
+        for count, shape in shapes.items():
+            self.assertEqual(plot_data.atlas_grid(count), shape)
+        self.assertEqual(plot_data.atlas_grid(5, columns=2), (3, 2))
+        # more columns than facets and no facets at all still make a grid
+        self.assertEqual(plot_data.atlas_grid(3, columns=8), (1, 3))
+        self.assertEqual(plot_data.atlas_grid(0), (1, 1))
+
+    def test_facets_and_empty_cells(self):
+        genes = ["RAN", "XPO1", "TP53", "EMPTY", "KRAS"]
+        inputs = [os.path.join("OV", gene, "data.csv") for gene in genes]
+        datasets = [
+            pd.DataFrame({"Series Name": ["Normal", "Ovarian Cancer"] * 2, "Y": [0.5, 1.5, 0.25, 2.5]})
+            if gene != "EMPTY"
+            else pd.DataFrame({"Series Name": pd.Series([], dtype="object"), "Y": pd.Series([], dtype="float64")})
+            for gene in genes
+        ]
+        config = {**CONFIG, "atlas_columns": None}
+        with mock.patch.object(plot_data, "export_figure") as export_figure:
+            plot_data.plot_atlas(
+                config, inputs, "atlas.png", convert_and_plot.translate_in_mapping, "OV", is_gene=True, datasets=datasets
+            )
+        figure, output = export_figure.call_args.args[:2]
+        self.assertEqual(output, "atlas.png")
+        # 5 facets in a 2 by 3 grid, the last cell is left empty
+        self.assertEqual(
+            export_figure.call_args.kwargs,
+            {
+                "width": CONFIG["plot_width"] * plot_data.ATLAS_FACET_SCALE * 3,
+                "height": CONFIG["plot_height"] * plot_data.ATLAS_FACET_SCALE * 2,
+            },
+        )
+        self.assertEqual([annotation.text for annotation in figure.layout.annotations], genes)
+        axes = {}
+        for trace in figure.data:
+            axes.setdefault(trace.xaxis, []).append(trace)
+        # a gene without data is a facet without boxes, the sixth cell has no facet at all
+        self.assertEqual(sorted(axes), ["x", "x2", "x3", "x5"])
+        per_facet = len(axes["x"])
+        self.assertGreater(per_facet, 0)
+        self.assertTrue(all(len(traces) == per_facet for traces in axes.values()))
+        # the y axis title is only on the first column
+        self.assertTrue(figure.layout.yaxis.title.text and figure.layout.yaxis4.title.text)
+        self.assertIsNone(figure.layout.yaxis2.title.text)
+
+    def test_atlas_per_source(self):
+        with tempfile.TemporaryDirectory() as root:
+            sources = [("ONCODB", "OV"), ("ONCODB", "BRCA"), ("UALCAN", "OV")]
+            for source, cancer_type in sources:
+                for gene in ("RAN", "XPO1", "TP53"):
+                    folder = os.path.join(root, "Gene Expression", source, cancer_type, gene)
+                    os.makedirs(folder)
+                    with open(os.path.join(folder, "data.txt"), "w") as data_file:
+                        data_file.write(f"Sample\t{gene}_expression_value\n{cancer_type}\t1.5\nNormal\t0.5\n")
+            options = convert_and_plot.BuildOptions(render_profile="html", atlas=True, aggregate_formats=["csv"])
+            convert_and_plot.process_files(root, options, config=CONFIG)
+            atlases = sorted(
+                os.path.relpath(os.path.join(folder, name), root)
+                for folder, _, names in os.walk(root)
+                for name in names
+                if name.startswith("atlas.")
+            )
+            expected = [os.path.join("Gene Expression", source, cancer_type, "atlas.html") for source, cancer_type in sources]
+            self.assertEqual(atlases, sorted(expected))
+
+
+class TestImageExporter(unittest.TestCase):
+    def test_failures_surface_with_their_own_plot(self):
+        with tempfile.TemporaryDirectory() as root:
+            leaves = []
+            for gene in ("RAN", "XPO1"):
+                folder = os.path.join(root, "Gene Expression", "ONCODB", "OV", gene)
+                os.makedirs(folder)
+                with open(os.path.join(folder, "data.txt"), "w") as data_file:
+                    data_file.write(f"Sample\t{gene}_expression_value\nOV\t1.5\n")
+                leaves.append(convert_and_plot.Leaf(os.path.join(folder, "data.txt"), gene, "OV", "ONCODB", True))
+            config = {**CONFIG, "render_profile": "html"}
+            # written by the time its leaf is done, nothing is held back for a later leaf
+            convert_and_plot.process_leaf(leaves[0], config)
+            self.assertTrue(os.path.exists(leaves[0].output_path("html")))
+            with mock.patch.object(plot_data.default_exporter, "_write", side_effect=OSError("disk full")):
+                with self.assertRaisesRegex(OSError, "disk full"):
+                    convert_and_plot.process_leaf(leaves[1], config)
+
+    def test_worker_export_counters_reach_the_parent(self):
+        exporter = plot_data.default_exporter
+        exporter.take_counters()
+        with tempfile.TemporaryDirectory() as root:
+            output = os.path.join(root, "box.html")
+
+            def export():
+                exporter.export(go.Figure(go.Box(y=[1, 2, 3])), output, 400, 300, format="html")
+
+            # what a pool worker does with each task, the parent adds the counts up again
+            _, telemetry = scheduler.run_task(export)
+            self.assertEqual(exporter.exported, 0)
+            self.assertEqual(telemetry["exports"]["exported"], 1)
+            self.assertEqual(telemetry["exports"]["bytes_written"], os.path.getsize(output))
+            scheduler.add_telemetry(telemetry)
+            self.assertEqual(exporter.exported, 1)
+            self.assertIn("exported 1 images", exporter.summary())
+        exporter.take_counters()
+
+
+if __name__ == "__main__":
+    unittest.main()
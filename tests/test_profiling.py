@@ -0,0 +1,73 @@
+import glob
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+from jeddinformatics import convert_and_plot, profiling
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(profiling.configure)
+        self.root = directory.name
+        for gene in ("RAN", "XPO1", "TP53"):
+            folder = os.path.join(self.root, "Gene Expression", "ONCODB", "OV", gene)
+            os.makedirs(folder)
+            with open(os.path.join(folder, "data.txt"), "w") as data_file:
+                data_file.write(f"Sample\t{gene}_expression_value\nOV\t1.5\nNormal\t0.5\n")
+        self.trace_path = os.path.join(self.root, "trace.json")
+
+    def build(self, **options):
+        options = convert_and_plot.BuildOptions(jobs=2, render_profile="html", profile=self.trace_path, **options)
+        convert_and_plot.process_files(self.root, options, config=CONFIG)
+
+    def test_trace_has_the_workers_spans(self):
+        self.build()
+        with open(self.trace_path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+        self.assertIsInstance(events, list)
+        for event in events:
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["ts"], 0)
+            self.assertGreaterEqual(event["dur"], 0)
+        self.assertEqual(min(event["ts"] for event in events), 0)
+        names = {event["name"] for event in events}
+        self.assertTrue({"walk", "plan", "leaf", "parse", "figure_build", "merged_plot"} <= names, names)
+        leaves = [event for event in events if event["name"] == "leaf"]
+        self.assertEqual(sorted(event["args"]["gene"] for event in leaves), ["RAN", "TP53", "XPO1"])
+        # the leaves were built in the pool, not in the process that wrote the trace
+        self.assertNotIn(os.getpid(), {event["pid"] for event in leaves})
+        # nested spans inherit their leaf's tags
+        parses = [event for event in events if event["name"] == "parse"]
+        self.assertTrue(all(event["args"].get("cancer") == "OV" for event in parses))
+
+    def test_cprofile_can_be_loaded(self):
+        self.build(cprofile=True)
+        profile_path = os.path.join(self.root, "trace.prof")
+        stats = pstats.Stats(profile_path)
+        functions = {function for _, _, function in stats.stats}
+        # parsed and drawn in the workers
+        self.assertTrue({"iter_onco", "box_traces"} <= functions)
+        # the workers' own profiles are merged in and removed
+        self.assertEqual(glob.glob(f"{profile_path}.*"), [])
+
+    def test_summary(self):
+        spans = [
+            profiling.Span("leaf", 0, 2_000_000, 1, 1, {"gene": "RAN"}),
+            profiling.Span("leaf", 0, 4_000_000, 1, 1, {"gene": "XPO1"}),
+            profiling.Span("walk", 0, 1_000_000, 1, 1, {}),
+        ]
+        lines = profiling.summary(spans).splitlines()
+        self.assertTrue(lines[1].startswith("leaf") and "0.006s" in lines[1] and "3.00ms" in lines[1])
+        self.assertTrue(lines[2].startswith("walk"))
+        self.assertEqual(lines[-2:], ["       4.00ms  gene: XPO1", "       2.00ms  gene: RAN"])
+
+
+if __name__ == "__main__":
+    unittest.main()
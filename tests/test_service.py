@@ -0,0 +1,66 @@
+import json
+import asyncio
+import unittest
+
+from jeddinformatics import convert_and_plot, service
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+
+class TestService(unittest.TestCase):
+    def test_request_parsing(self):
+        validator = service.load_validator()
+
+        def parse(**request):
+            return service.parse_render_request(json.dumps(request).encode("utf-8"), CONFIG, validator)
+
+        oncodb = parse(data="Sample\tXPO1_expression_value\nOV\t1.5\n")
+        self.assertEqual((oncodb.kind, oncodb.is_gene, oncodb.format), ("oncodb", True, "png"))
+        highcharts = parse(data={"series": []}, format="svg", config={"jitter": 0.1})
+        self.assertEqual((highcharts.kind, highcharts.is_gene, highcharts.config["jitter"]), ("highcharts", False, 0.1))
+        # the same export and settings address the same image, anything else a different one
+        self.assertEqual(parse(data={"series": []}, format="svg", config={"jitter": 0.1}).key, highcharts.key)
+        self.assertNotEqual(parse(data={"series": []}, format="png", config={"jitter": 0.1}).key, highcharts.key)
+        for request in ({"data": 1}, {"data": "", "config": {"jitter": "wide"}}, {"data": "", "format": "gif"}):
+            with self.assertRaises(service.HttpError) as raised:
+                parse(**request)
+            self.assertEqual(raised.exception.status, 400)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = service.ResultCache(budget=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(cache.get("a"), b"1234")
+        cache.put("c", b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, cache.bytes), (1, 1, 1, 8))
+
+    def test_http_routes_and_metrics(self):
+        render_service = service.RenderService(CONFIG, workers=1)
+
+        async def exchange(request: bytes) -> bytes:
+            server = await asyncio.start_server(render_service.handle, "127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write(request)
+                response = await reader.read()
+                writer.close()
+                return response
+
+        try:
+            self.assertTrue(asyncio.run(exchange(b"GET /health HTTP/1.0\r\n\r\n")).startswith(b"HTTP/1.1 200 OK"))
+            self.assertTrue(asyncio.run(exchange(b"GET /nope HTTP/1.0\r\n\r\n")).startswith(b"HTTP/1.1 404"))
+            body = b"not json"
+            response = asyncio.run(
+                exchange(b"POST /render HTTP/1.0\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            )
+            self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+            metrics = render_service.metrics_text()
+            self.assertIn('jeddinformatics_responses_total{route="other",status="404"} 1', metrics)
+            self.assertIn('jeddinformatics_request_duration_seconds_count{route="/render"} 1', metrics)
+        finally:
+            render_service.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import tempfile
+import unittest
+
+import pandas as pd
+
+from jeddinformatics import shards
+
+
+class TestShards(unittest.TestCase):
+    def test_every_file_is_in_exactly_one_shard(self):
+        paths = [f"Gene Expression/ONCODB/OV/GENE{number}/data.txt" for number in range(50)]
+        numbers = [shards.shard_number(path, 4) for path in paths]
+        self.assertTrue(all(1 <= number <= 4 for number in numbers))
+        self.assertEqual(len(set(numbers)), 4)
+        # the same on every run, hash() would differ between processes
+        self.assertEqual(numbers, [shards.shard_number(path, 4) for path in paths])
+
+    def test_merge_reads_partials_back_in_leaf_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            leaves = {"a": [0.1, 0.2], "b": [], "c": [1 / 3], "d": [-2.5, 4.0, 7.25]}
+            datasets = {
+                key: pd.DataFrame({"Series Name": ["Normal"] * len(values), "Y": values}) for key, values in leaves.items()
+            }
+            order = list(leaves)
+            for number, keys in ((1, ["a", "c"]), (2, ["b", "d"])):
+                writer = shards.PartialAggregateWriter(root, shards.Shard(number, 2), keys)
+                for index, key in enumerate(keys):
+                    writer.add(index, datasets[key], key.upper(), "Ovarian Cancer", "UALCAN")
+                writer.close()
+            merged = list(shards.merge_partials(root, order))
+            self.assertEqual([index for index, _ in merged], [0, 1, 2, 3])
+            for (_, dataset), key in zip(merged, order):
+                self.assertEqual(dataset["Y"].tolist(), leaves[key])
+                self.assertEqual(dataset["Series Name"].astype(str).tolist(), ["Normal"] * len(leaves[key]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import math
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from jeddinformatics import significance
+
+
+class TestSignificance(unittest.TestCase):
+    def test_t_distribution_matches_closed_forms(self):
+        t = np.array([0.0, 0.5, 1.0, 3.0])
+        # one degree of freedom is the Cauchy distribution, two has a closed form too
+        cauchy = 1 - 2 * np.arctan(t) / math.pi
+        two = 1 - t / np.sqrt(2 + t * t)
+        np.testing.assert_allclose(significance.student_t_two_sided_p(t, np.ones(4)), cauchy, rtol=1e-12)
+        np.testing.assert_allclose(significance.student_t_two_sided_p(t, np.full(4, 2.0)), two, rtol=1e-12)
+
+    def test_batch_matches_each_comparison_alone(self):
+        rng = np.random.default_rng(0)
+        comparisons = [
+            significance.Comparison("OV", np.round(rng.normal(0, 1, size), 1), np.round(rng.normal(1, 2, size + 3), 1))
+            for size in (3, 8, 20)
+        ]
+        batch = significance.batch_tests(comparisons)
+        for index, comparison in enumerate(comparisons):
+            alone = significance.batch_tests([comparison])
+            pd.testing.assert_frame_equal(batch.iloc[[index]].reset_index(drop=True), alone)
+        # every compared value above every reference value gives the largest possible U
+        separated = significance.batch_tests([significance.Comparison("OV", np.arange(5.0), np.arange(5.0) + 10)])
+        self.assertEqual(separated["mannwhitney_u"][0], 25)
+
+    def test_benjamini_hochberg(self):
+        q = significance.benjamini_hochberg(np.array([0.01, np.nan, 0.04, 0.03, 0.5]))
+        np.testing.assert_allclose(q, [0.04, np.nan, 0.04 * 4 / 3, 0.04 * 4 / 3, 0.5])
+
+    def test_reference_follows_precedence(self):
+        dataset = pd.DataFrame({"Series Name": ["Primary tumor", "Normal", "Primary tumor"], "Y": [1.0, 2.0, 3.0]})
+        reference, comparisons = significance.leaf_comparisons(dataset, ["NC", "Normal"])
+        self.assertEqual(reference, "Normal")
+        self.assertEqual([comparison.series_name for comparison in comparisons], ["Primary tumor"])
+        self.assertEqual(significance.leaf_comparisons(dataset, ["NC"]), (None, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import os
+import sys
+import subprocess
+import unittest
+
+SRC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIRECTORY, os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, check=True)
+
+
+class TestStartup(unittest.TestCase):
+    def test_cli_does_not_import_heavy_modules(self):
+        result = run_python(
+            "-c",
+            "import sys; from jeddinformatics import cli; "
+            "print(sorted(m for m in ('pandas', 'plotly', 'numpy', 'jsonschema', 'datamodel_code_generator') "
+            "if m in sys.modules))",
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
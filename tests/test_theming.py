@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from jeddinformatics import build_cache, convert_and_plot, plot_data, theming
+
+CONFIG = convert_and_plot.load_config(convert_and_plot.local_or_default("config.json"))
+
+
+class TestTheming(unittest.TestCase):
+    def test_themes_mirror_the_tree(self):
+        theme = theming.new_theme("root", "slides", CONFIG)
+        leaf = os.path.join("root", "Gene Expression", "ONCODB", "OV", "RAN", "data.png")
+        mirrored = os.path.join("root", "themes", "slides", "Gene Expression", "ONCODB", "OV", "RAN", "data.png")
+        self.assertEqual(theme.output_path(leaf), mirrored)
+        self.assertEqual(theming.Theme("", CONFIG).output_path(leaf), leaf)
+
+    def test_only_stale_themes_are_targeted(self):
+        with tempfile.TemporaryDirectory() as root:
+            leaf_folder = os.path.join(root, "Gene Expression", "ONCODB", "OV", "RAN")
+            os.makedirs(leaf_folder)
+            with open(os.path.join(leaf_folder, "data.txt"), "w") as data_file:
+                data_file.write("Sample\tRAN_expression_value\nOV\t1.5\n")
+            leaf = convert_and_plot.Leaf(os.path.join(leaf_folder, "data.txt"), "RAN", "OV", "ONCODB", True)
+            themes = [theming.new_theme(root, name, CONFIG) for name in ("fresh", "stale")]
+            plans = []
+            for theme in themes:
+                cache = build_cache.BuildCache(root, theme.config, file_name=theming.cache_file_name(theme, "cache.json"))
+                if theme.name == "fresh":
+                    cache.update(leaf.key, cache.file_digest(leaf.file_path))
+                    png = theme.output_directory(leaf.output_path("png"))
+                    open(png, "w").close()
+                plans.append(theming.plan_theme(theme, cache, [leaf], {}))
+            base = theming.Theme("", CONFIG)
+            targets = theming.plan_targets(base, [leaf], [False], {}, set(), plans)
+            self.assertEqual([theme.name for theme in targets.leaves[leaf.key]], ["stale"])
+            targets = theming.plan_targets(base, [leaf], [True], {}, set(), plans)
+            self.assertEqual([theme.name for theme in targets.leaves[leaf.key]], ["", "stale"])
+
+    def test_prepared_series_are_shared_by_precedence(self):
+        series = plot_data.PreparedSeries(pd.DataFrame({"Series Name": ["b", "a"], "Y": [1.0, 2.0]}))
+        self.assertIs(series.get(["a"]), series.get(["a"]))
+        self.assertEqual([name for name, _ in series.get(["b"])], ["b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import warnings
+
+from pandas.errors import PerformanceWarning
+
+from jeddinformatics import dataset_cache, tree
+
+ONCODB = "Sample\tRAN_expression_value\nOV\t1.5\nOV\t2.5\nNormal\t0.5\n"
+
+
+def write_leaf(root: str, folder: str, text: str = ONCODB) -> None:
+    os.makedirs(os.path.join(root, folder), exist_ok=True)
+    with open(os.path.join(root, folder, "data.txt"), "w") as data_file:
+        data_file.write(text)
+
+
+class TestExpressionTree(unittest.TestCase):
+    def test_query_reads_only_the_matching_leaves(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_leaf(root, "Gene Expression/ONCODB/Ovarian Cancer/RAN")
+            write_leaf(root, "Gene Expression/ONCODB/Uterine Cancer/RAN")
+            write_leaf(root, "Gene Expression/ONCODB/Uterine Cancer/XPO1", ONCODB.replace("RAN", "XPO1"))
+            expression_tree = tree.open_tree(root, patterns=[])
+            self.assertEqual(len(expression_tree), 3)
+            misses = dataset_cache.default_cache.misses
+            values = expression_tree.query(gene="RAN")
+            self.assertEqual(dataset_cache.default_cache.misses - misses, 2)
+            self.assertEqual(values.index.names, ["expression", "source", "cancer", "gene", "series"])
+            self.assertEqual(sorted(set(values.index.get_level_values("cancer"))), ["Ovarian Cancer", "Uterine Cancer"])
+            with warnings.catch_warnings():
+                # an unsorted index would warn about indexing past the lexsort depth
+                warnings.simplefilter("error", PerformanceWarning)
+                ovarian = values.loc[("Gene Expression", "ONCODB", "Ovarian Cancer", "RAN", "OV"), "value"]
+            self.assertEqual(ovarian.tolist(), [1.5, 2.5])
+            self.assertTrue(expression_tree.query(cancer="Lung Cancer").empty)
+
+    def test_index_is_reused_until_the_tree_changes(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_leaf(root, "Gene Expression/ONCODB/Ovarian Cancer/RAN")
+            self.assertEqual(len(tree.open_tree(root, patterns=[])), 1)
+            self.assertTrue(os.path.exists(os.path.join(root, tree.INDEX_FILE_NAME)))
+            index = tree.read_index(os.path.join(root, tree.INDEX_FILE_NAME))
+            self.assertTrue(tree.index_is_current(root, index, tree.walker.IgnoreMatcher([])))
+            # a CSV written beside its source is an output, a new gene folder isn't
+            with open(os.path.join(root, "Gene Expression/ONCODB/Ovarian Cancer/RAN/data.csv"), "w"):
+                pass
+            self.assertTrue(tree.index_is_current(root, index, tree.walker.IgnoreMatcher([])))
+            write_leaf(root, "Gene Expression/ONCODB/Ovarian Cancer/XPO1", ONCODB.replace("RAN", "XPO1"))
+            self.assertFalse(tree.index_is_current(root, index, tree.walker.IgnoreMatcher([])))
+            self.assertEqual(len(tree.open_tree(root, patterns=[])), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
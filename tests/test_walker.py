@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from jeddinformatics import walker
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+    def test_gitignore_semantics(self):
+        matcher = walker.IgnoreMatcher(["# comment", "", "*.png", "!keep.png", "build/", "/top", "docs/**/*.md"])
+        self.assertEqual(matcher.match("plots/x.png"), "*.png")
+        self.assertIsNone(matcher.match("plots/keep.png"))
+        self.assertEqual(matcher.match("a/build", is_directory=True), "build/")
+        self.assertIsNone(matcher.match("a/build"))
+        self.assertEqual(matcher.match("top", is_directory=True), "/top")
+        self.assertIsNone(matcher.match("a/top", is_directory=True))
+        self.assertEqual(matcher.match("docs/a/b/c.md"), "docs/**/*.md")
+        self.assertEqual(matcher.match("docs/c.md"), "docs/**/*.md")
+        self.assertIsNone(matcher.match("data.txt"))
+
+
+class TestWalkDataFiles(unittest.TestCase):
+    def test_prunes_ignored_directories_in_a_stable_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            for folder in ["Gene Expression/ONCODB/OV/XPO1", "Gene Expression/ONCODB/OV/RAN", "old/venv/lib"]:
+                os.makedirs(os.path.join(root, folder))
+                with open(os.path.join(root, folder, "data.txt"), "w"):
+                    pass
+            found = list(walker.walk_data_files(root, walker.IgnoreMatcher(["*venv*"])))
+        self.assertEqual([data_file.folder for data_file in found], ["RAN", "XPO1"])
+        self.assertEqual(found[0].cancer_type, "OV")
+        self.assertEqual(found[0].source_database, "ONCODB")
+        self.assertTrue(found[0].is_gene)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from jeddinformatics import convert_and_plot, walker, watch
+
+
+class TestWatch(unittest.TestCase):
+    def test_only_inputs_are_relevant(self):
+        with tempfile.TemporaryDirectory() as root:
+            leaf = os.path.join(root, "Gene Expression", "ONCODB", "OV", "XPO1")
+            os.makedirs(leaf)
+            with open(os.path.join(leaf, "data.txt"), "w"):
+                pass
+            matcher = walker.IgnoreMatcher(["*venv*"])
+
+            def relevant(path, **change):
+                return watch.is_relevant(watch.Change(os.path.join(root, path), **change), root, matcher)
+
+            self.assertTrue(relevant("Gene Expression/ONCODB/OV/XPO1/data.txt"))
+            # written by the conversion of the data.txt beside it
+            self.assertFalse(relevant("Gene Expression/ONCODB/OV/XPO1/data.csv"))
+            self.assertTrue(relevant("Gene Expression/ONCODB/OV/RAN/data.csv"))
+            self.assertFalse(relevant("Gene Expression/ONCODB/OV/XPO1/data.png"))
+            self.assertFalse(relevant("all_csv_data.tmp.xlsx"))
+            self.assertFalse(relevant("venv/data.txt"))
+            self.assertFalse(relevant("Gene Expression/ONCODB/OV/RAN", is_directory=True))
+            self.assertTrue(relevant("Gene Expression/ONCODB/OV/RAN", is_directory=True, removed=True))
+
+    def test_wide_export_outputs_are_not_relevant(self):
+        with tempfile.TemporaryDirectory() as root:
+            cancer = os.path.join(root, "Gene Expression", "ONCODB", "OV")
+            os.makedirs(cancer)
+            with open(os.path.join(cancer, "data.txt"), "w") as data_file:
+                data_file.write("Sample\tRAN_expression_value\tXPO1_expression_value\nOV\t1.5\t2.5\n")
+            leaves, _ = convert_and_plot.find_leaves(root, [], [])
+            output_folders = convert_and_plot.output_folders(leaves)
+            matcher = walker.IgnoreMatcher([])
+
+            def relevant(path):
+                return watch.is_relevant(watch.Change(os.path.join(root, path)), root, matcher, output_folders)
+
+            # the gene folders only hold what the export beside them was converted into
+            self.assertFalse(relevant("Gene Expression/ONCODB/OV/RAN/data.csv"))
+            self.assertFalse(relevant("Gene Expression/ONCODB/OV/XPO1/data.jbin"))
+            self.assertTrue(relevant("Gene Expression/ONCODB/OV/TP53/data.csv"))
+            self.assertTrue(relevant("Gene Expression/ONCODB/OV/data.txt"))
+
+    def test_polling_sees_new_and_removed_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            watcher = watch.PollingWatcher(root, walker.IgnoreMatcher([]), interval=0.01)
+            path = os.path.join(root, "XPO1", "data.json")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w") as json_file:
+                json_file.write("{}")
+            self.assertEqual(watcher.read(0.01), [watch.Change(path)])
+            self.assertEqual(watcher.read(0.01), [])
+            os.remove(path)
+            self.assertEqual(watcher.read(), [watch.Change(path, removed=True)])
+
+
+if __name__ == "__main__":
+    unittest.main()